@@ -61,10 +61,22 @@ class TokenDTO(BaseModel):
     user: UserResponseDTO
 
 
+class UserLoadRowResultDTO(BaseModel):
+    row: int
+    username: Optional[str] = None
+    status: str  # created | skipped | rejected
+    detail: Optional[str] = None
+
+
 class LoadUsersResponseDTO(BaseModel):
     total_loaded: int
     message: str
     success: bool
+    total_rows: int = 0
+    skipped: int = 0
+    rejected: int = 0
+    results: list[UserLoadRowResultDTO] = []
+    results_truncated: bool = False
 
 
 class ProductCreateDTO(BaseModel):
@@ -73,6 +85,18 @@ class ProductCreateDTO(BaseModel):
     price: float
     packaging_unit: Optional[str] = "Unidad" 
     units_per_package: int = 1  
+    sku: Optional[str] = Field(None, max_length=64)
+
+
+class ProductUpsertDTO(ProductCreateDTO):
+    sku: str = Field(..., min_length=1, max_length=64)
+
+
+class ProductBulkUpsertResultDTO(BaseModel):
+    received: int
+    inserted: int
+    updated: int
+    unchanged: int
 
 
 class ProductResponseDTO(BaseModel):
@@ -82,6 +106,7 @@ class ProductResponseDTO(BaseModel):
     price: float
     packaging_unit: Optional[str]
     units_per_package: int
+    sku: Optional[str] = None
     created_at: Optional[datetime]
     updated_at: Optional[datetime]
 
@@ -112,6 +137,7 @@ class InventoryItemCreateDTO(BaseModel):
     product_id: int
     packages_count: int  
     quantity: Optional[int] = None  
+    mode: str = Field("increment", pattern="^(increment|set)$")  # Suma a la existencia o la reemplaza
 
 
 class InventoryItemResponseDTO(BaseModel):
@@ -121,6 +147,7 @@ class InventoryItemResponseDTO(BaseModel):
     product_id: int
     packages_count: int
     quantity: int  
+    version: Optional[int] = None
     created_at: datetime
     updated_at: datetime
 
@@ -128,12 +155,56 @@ class InventoryItemResponseDTO(BaseModel):
         from_attributes = True
 
 
+class InventoryQuantityUpdateDTO(BaseModel):
+    id: int
+    quantity: int = Field(..., gt=0)
+    expected_version: int
+
+
+class InventoryQuantityUpdateResultDTO(BaseModel):
+    id: int
+    status: str  # updated | conflict | not_found
+    quantity: Optional[int] = None
+    version: Optional[int] = None
+
+
+class InventoryQuantityBatchResultDTO(BaseModel):
+    updated: int
+    conflicts: int
+    results: list[InventoryQuantityUpdateResultDTO]
+
+
+class InventoryItemBatchErrorDTO(BaseModel):
+    index: int
+    product_id: int
+    detail: str
+
+
+class InventoryItemBatchResultDTO(BaseModel):
+    created: list[InventoryItemResponseDTO]
+    errors: list[InventoryItemBatchErrorDTO]
+
+
+class CountSheetRowErrorDTO(BaseModel):
+    row: int
+    detail: str
+
+
+class CountSheetImportSummaryDTO(BaseModel):
+    total_rows: int
+    accepted: int
+    rejected: int
+    errors: list[CountSheetRowErrorDTO]
+    errors_truncated: bool = False
+
+
 class InventoryDetailDTO(BaseModel):
     id: int
     product_id: int
     product_name: str
     product_price: float
     quantity: int
+    version: Optional[int] = None
 
 
 class WarehouseInventoryDTO(BaseModel):
@@ -144,6 +215,21 @@ class WarehouseInventoryDTO(BaseModel):
     items: list[InventoryDetailDTO]
 
 
+class StockBalanceDTO(BaseModel):
+    product_id: int
+    product_name: str
+    quantity: int
+
+
+class WarehouseStockAsOfDTO(BaseModel):
+    warehouse_id: int
+    as_of: datetime
+    checkpoint_at: Optional[datetime] = None
+    replayed_movements: int
+    total_units: int
+    items: list[StockBalanceDTO]
+
+
 class InventoryCountCreateDTO(BaseModel):
     name: str
     cut_off_date: str  
@@ -162,6 +248,8 @@ class InventoryCountResponseDTO(BaseModel):
     created_at: datetime
     closed_at: Optional[datetime] = None
     items_count: int = 0
+    total_units: int = 0
+    version: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -179,6 +267,15 @@ class InventoryCountDetailDTO(BaseModel):
     created_at: datetime
     closed_at: Optional[datetime]
     items: list[InventoryItemResponseDTO]
+    version: Optional[int] = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class InventoryCountVarianceDTO(BaseModel):
+    product_id: int
+    product_name: str
+    counted_quantity: int
+    system_quantity: int
+    variance: int
@@ -1,12 +1,20 @@
-from typing import List, Optional
+import asyncio
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Tuple
 from datetime import datetime, date
 from app.domain.repositories.repository_interfaces import IInventoryRepository, IWarehouseRepository, IUserRepository, IProductRepository
+from app.domain.exceptions import VersionConflictError
 from app.application.dtos.dtos import (
     InventoryCountCreateDTO, 
     InventoryCountResponseDTO,
     InventoryCountDetailDTO,
     InventoryItemCreateDTO,
-    InventoryItemResponseDTO
+    InventoryItemResponseDTO,
+    InventoryItemBatchErrorDTO,
+    InventoryItemBatchResultDTO,
+    CountSheetRowErrorDTO,
+    CountSheetImportSummaryDTO,
+    InventoryCountVarianceDTO
 )
 from app.infrastructure.persistence.models import InventoryCountModel, InventoryCountStatus, InventoryItemModel
 
@@ -44,7 +52,8 @@ class CreateInventoryCountUseCase:
             created_by=created_count.created_by,
             created_at=created_count.created_at,
             closed_at=created_count.closed_at,
-            items_count=0
+            items_count=0,
+            version=created_count.version
         )
 
 
@@ -53,16 +62,28 @@ class GetInventoryCountsUseCase:
     def __init__(self, inventory_repo: IInventoryRepository):
         self.inventory_repo = inventory_repo
     
-    async def execute(self, warehouse_id: Optional[int] = None, status: Optional[str] = None) -> List[InventoryCountResponseDTO]:
-        counts = await self.inventory_repo.get_counts(warehouse_id=warehouse_id, status=status)
+    async def execute(
+        self,
+        warehouse_id: Optional[int] = None,
+        status: Optional[str] = None,
+        warehouse_ids: Optional[List[int]] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        before_id: Optional[int] = None,
+        limit: int = 50
+    ) -> List[InventoryCountResponseDTO]:
+        rows = await self.inventory_repo.get_counts(
+            warehouse_id=warehouse_id,
+            status=status,
+            warehouse_ids=warehouse_ids,
+            date_from=date_from,
+            date_to=date_to,
+            before_id=before_id,
+            limit=limit
+        )
         
-        result = []
-        for count in counts:
-            items_count = len(count.items) if hasattr(count, 'items') and count.items else 0
-            warehouse_name = count.warehouse.name if count.warehouse else None
-            creator_username = count.creator.username if count.creator else None
-            
-            result.append(InventoryCountResponseDTO(
+        return [
+            InventoryCountResponseDTO(
                 id=count.id,
                 name=count.name,
                 cut_off_date=count.cut_off_date.isoformat(),
@@ -73,10 +94,12 @@ class GetInventoryCountsUseCase:
                 creator_username=creator_username,
                 created_at=count.created_at,
                 closed_at=count.closed_at,
-                items_count=items_count
-            ))
-        
-        return result
+                items_count=items_count,
+                total_units=total_units,
+                version=count.version
+            )
+            for count, warehouse_name, creator_username, items_count, total_units in rows
+        ]
 
 
 class GetInventoryCountDetailUseCase:
@@ -115,48 +138,70 @@ class GetInventoryCountDetailUseCase:
             creator_username=count.creator.username if count.creator else "",
             created_at=count.created_at,
             closed_at=count.closed_at,
-            items=items
+            items=items,
+            version=count.version
         )
 
 
 class CloseInventoryCountUseCase:
-    """Cerrar un conteo de inventario"""
+    """Cerrar un conteo de inventario y conciliar la existencia de la bodega"""
     
     def __init__(self, inventory_repo: IInventoryRepository):
         self.inventory_repo = inventory_repo
     
-    async def execute(self, count_id: int) -> InventoryCountResponseDTO:
-        count = await self.inventory_repo.get_count_by_id(count_id)
+    async def execute(self, count_id: int, expected_version: Optional[int] = None) -> InventoryCountResponseDTO:
+        # Bloqueo exclusivo: espera a que terminen los items en curso y
+        # evita que se agreguen nuevos mientras se concilia
+        count = await self.inventory_repo.get_count_header(count_id, lock="update", with_relations=True)
         if not count:
             raise ValueError(f"Conteo con ID {count_id} no encontrado")
         
+        # El cliente cierra el conteo que vio: si cambió entretanto, se rechaza
+        if expected_version is not None and count.version != expected_version:
+            raise VersionConflictError("Inventory count", count_id, count.version)
+        
         if count.status == InventoryCountStatus.CLOSED:
             raise ValueError("El conteo ya está cerrado")
         
-        count.status = InventoryCountStatus.CLOSED
-        count.closed_at = datetime.utcnow()
-        
-        updated_count = await self.inventory_repo.update_count(count)
-        
-        items_count = len(updated_count.items) if hasattr(updated_count, 'items') and updated_count.items else 0
-        warehouse_name = updated_count.warehouse.name if updated_count.warehouse else None
-        creator_username = updated_count.creator.username if updated_count.creator else None
+        totals = await self.inventory_repo.close_and_reconcile_count(count, datetime.utcnow())
         
         return InventoryCountResponseDTO(
-            id=updated_count.id,
-            name=updated_count.name,
-            cut_off_date=updated_count.cut_off_date.isoformat(),
-            warehouse_id=updated_count.warehouse_id,
-            warehouse_name=warehouse_name,
-            status=updated_count.status.value,
-            created_by=updated_count.created_by,
-            creator_username=creator_username,
-            created_at=updated_count.created_at,
-            closed_at=updated_count.closed_at,
-            items_count=items_count
+            id=count.id,
+            name=count.name,
+            cut_off_date=count.cut_off_date.isoformat(),
+            warehouse_id=count.warehouse_id,
+            warehouse_name=count.warehouse.name if count.warehouse else None,
+            status=count.status.value,
+            created_by=count.created_by,
+            creator_username=count.creator.username if count.creator else None,
+            created_at=count.created_at,
+            closed_at=count.closed_at,
+            items_count=totals["items_count"],
+            total_units=totals["total_units"],
+            version=count.version
         )
 
 
+class GetInventoryCountVariancesUseCase:
+    """Obtener el reporte de diferencias de un conteo cerrado"""
+    
+    def __init__(self, inventory_repo: IInventoryRepository):
+        self.inventory_repo = inventory_repo
+    
+    async def execute(self, count_id: int) -> List[InventoryCountVarianceDTO]:
+        variances = await self.inventory_repo.get_count_variances(count_id)
+        return [
+            InventoryCountVarianceDTO(
+                product_id=v.product_id,
+                product_name=v.product.name if v.product else "",
+                counted_quantity=v.counted_quantity,
+                system_quantity=v.system_quantity,
+                variance=v.variance
+            )
+            for v in variances
+        ]
+
+
 class AddItemToCountUseCase:
     """Agregar un item a un conteo de inventario"""
     
@@ -164,9 +209,15 @@ class AddItemToCountUseCase:
         self.inventory_repo = inventory_repo
         self.product_repo = product_repo
     
-    async def execute(self, count_id: int, dto: InventoryItemCreateDTO) -> InventoryItemResponseDTO:
-        # Verificar que el conteo existe y está abierto
-        count = await self.inventory_repo.get_count_by_id(count_id)
+    async def execute(
+        self,
+        count_id: int,
+        dto: InventoryItemCreateDTO,
+        count: Optional[InventoryCountModel] = None
+    ) -> InventoryItemResponseDTO:
+        # Verificar que el conteo existe y está abierto (reutiliza el ya cargado si se recibe)
+        if count is None:
+            count = await self.inventory_repo.get_count_header(count_id, lock="share")
         if not count:
             raise ValueError(f"Conteo con ID {count_id} no encontrado")
         
@@ -202,3 +253,179 @@ class AddItemToCountUseCase:
             created_at=created_item.created_at,
             updated_at=created_item.updated_at
         )
+
+
+class AddItemsBatchToCountUseCase:
+    """Agregar varios items a un conteo en una sola transacción"""
+    
+    MAX_BATCH_SIZE = 5000
+    
+    def __init__(self, inventory_repo: IInventoryRepository, product_repo: IProductRepository):
+        self.inventory_repo = inventory_repo
+        self.product_repo = product_repo
+    
+    async def execute(
+        self,
+        count_id: int,
+        dtos: List[InventoryItemCreateDTO],
+        count: Optional[InventoryCountModel] = None
+    ) -> InventoryItemBatchResultDTO:
+        if len(dtos) > self.MAX_BATCH_SIZE:
+            raise ValueError(f"El lote no puede tener más de {self.MAX_BATCH_SIZE} items")
+        
+        if count is None:
+            count = await self.inventory_repo.get_count_header(count_id, lock="share")
+        if not count:
+            raise ValueError(f"Conteo con ID {count_id} no encontrado")
+        
+        if count.status == InventoryCountStatus.CLOSED:
+            raise ValueError("No se pueden agregar items a un conteo cerrado")
+        
+        # Todos los productos del lote en una sola consulta
+        products = await self.product_repo.get_many(dto.product_id for dto in dtos)
+        
+        rows = []
+        errors = []
+        now = datetime.utcnow()
+        for index, dto in enumerate(dtos):
+            product = products.get(dto.product_id)
+            if not product:
+                errors.append(InventoryItemBatchErrorDTO(
+                    index=index,
+                    product_id=dto.product_id,
+                    detail=f"Producto con ID {dto.product_id} no encontrado"
+                ))
+                continue
+            if dto.packages_count < 0:
+                errors.append(InventoryItemBatchErrorDTO(
+                    index=index,
+                    product_id=dto.product_id,
+                    detail="La cantidad de empaques no puede ser negativa"
+                ))
+                continue
+            rows.append({
+                "count_id": count_id,
+                "warehouse_id": count.warehouse_id,  # Usar la bodega del conteo
+                "product_id": dto.product_id,
+                "packages_count": dto.packages_count,
+                "quantity": dto.packages_count * product.units_per_package,
+                "created_at": now,
+                "updated_at": now
+            })
+        
+        created_items = await self.inventory_repo.create_many(rows)
+        
+        return InventoryItemBatchResultDTO(
+            created=[
+                InventoryItemResponseDTO(
+                    id=item.id,
+                    count_id=item.count_id,
+                    warehouse_id=item.warehouse_id,
+                    product_id=item.product_id,
+                    packages_count=item.packages_count,
+                    quantity=item.quantity,
+                    created_at=item.created_at,
+                    updated_at=item.updated_at
+                )
+                for item in created_items
+            ],
+            errors=errors
+        )
+
+
+class ImportCountSheetUseCase:
+    """Importar una planilla de conteo procesándola por bloques"""
+    
+    CHUNK_SIZE = 5000
+    MAX_REPORTED_ERRORS = 100
+    
+    def __init__(self, inventory_repo: IInventoryRepository, product_repo: IProductRepository):
+        self.inventory_repo = inventory_repo
+        self.product_repo = product_repo
+        # Productos ya consultados durante la importación (None = no existe)
+        self._products: Dict[int, Optional[int]] = {}
+    
+    async def execute(
+        self,
+        count_id: int,
+        rows: Iterable[Tuple[int, dict]],
+        count: Optional[InventoryCountModel] = None
+    ) -> CountSheetImportSummaryDTO:
+        if count is None:
+            count = await self.inventory_repo.get_count_header(count_id, lock="share")
+        if not count:
+            raise ValueError(f"Conteo con ID {count_id} no encontrado")
+        
+        if count.status == InventoryCountStatus.CLOSED:
+            raise ValueError("No se pueden agregar items a un conteo cerrado")
+        
+        self._total = 0
+        self._accepted = 0
+        self._rejected = 0
+        self._errors: List[CountSheetRowErrorDTO] = []
+        
+        # Leer la planilla (csv/openpyxl) es trabajo síncrono de CPU y disco:
+        # cada bloque se lee en un hilo para no detener el event loop
+        rows = iter(rows)
+        while True:
+            chunk = await asyncio.to_thread(list, islice(rows, self.CHUNK_SIZE))
+            if not chunk:
+                break
+            await self._import_chunk(count, chunk)
+        
+        return CountSheetImportSummaryDTO(
+            total_rows=self._total,
+            accepted=self._accepted,
+            rejected=self._rejected,
+            errors=self._errors,
+            errors_truncated=self._rejected > len(self._errors)
+        )
+    
+    async def _import_chunk(self, count: InventoryCountModel, chunk: List[Tuple[int, dict]]):
+        # Toda la importación corre en la transacción del request: el bloqueo
+        # compartido tomado al inicio impide cerrar el conteo hasta el commit
+        parsed = []
+        for row_number, values in chunk:
+            self._total += 1
+            try:
+                product_id = int(values.get("product_id"))
+                packages_count = int(values.get("packages_count"))
+            except (TypeError, ValueError):
+                self._reject(row_number, "product_id y packages_count deben ser números enteros")
+                continue
+            if packages_count < 0:
+                self._reject(row_number, "La cantidad de empaques no puede ser negativa")
+                continue
+            parsed.append((row_number, product_id, packages_count))
+        
+        # Solo se consultan los productos que aún no están en el mapa
+        missing = {product_id for _, product_id, _ in parsed if product_id not in self._products}
+        if missing:
+            found = await self.product_repo.get_many(missing)
+            for product_id in missing:
+                product = found.get(product_id)
+                self._products[product_id] = product.units_per_package if product else None
+        
+        now = datetime.utcnow()
+        items = []
+        for row_number, product_id, packages_count in parsed:
+            units_per_package = self._products[product_id]
+            if units_per_package is None:
+                self._reject(row_number, f"Producto con ID {product_id} no encontrado")
+                continue
+            items.append({
+                "count_id": count.id,
+                "warehouse_id": count.warehouse_id,
+                "product_id": product_id,
+                "packages_count": packages_count,
+                "quantity": packages_count * units_per_package,
+                "created_at": now,
+                "updated_at": now
+            })
+        
+        self._accepted += await self.inventory_repo.bulk_insert_items(items)
+    
+    def _reject(self, row_number: int, detail: str):
+        self._rejected += 1
+        if len(self._errors) < self.MAX_REPORTED_ERRORS:
+            self._errors.append(CountSheetRowErrorDTO(row=row_number, detail=detail))
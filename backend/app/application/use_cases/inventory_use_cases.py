@@ -1,7 +1,11 @@
 """
 Use cases para la gestión del inventario
 """
-from typing import List
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Tuple
 from app.domain.entities.entities import InventoryItem, Product, Warehouse
 from app.domain.repositories.repository_interfaces import (
     IInventoryRepository,
@@ -12,10 +16,40 @@ from app.application.dtos.dtos import (
     InventoryItemCreateDTO,
     InventoryItemResponseDTO,
     InventoryDetailDTO,
-    WarehouseInventoryDTO
+    WarehouseInventoryDTO,
+    StockBalanceDTO,
+    WarehouseStockAsOfDTO,
+    InventoryQuantityUpdateDTO,
+    InventoryQuantityUpdateResultDTO,
+    InventoryQuantityBatchResultDTO
 )
 
 
+def build_warehouse_inventory_dto(
+    warehouse: Warehouse,
+    rows: List[Tuple[InventoryItem, Product]]
+) -> WarehouseInventoryDTO:
+    """Construye el DTO de inventario de una bodega a partir de filas (item, producto)"""
+    items_detail = [
+        InventoryDetailDTO(
+            id=item.id,
+            product_id=item.product_id,
+            product_name=product.name,
+            product_price=product.price,
+            quantity=item.quantity,
+            version=item.version
+        )
+        for item, product in rows
+    ]
+    return WarehouseInventoryDTO(
+        warehouse_id=warehouse.id,
+        warehouse_name=warehouse.name,
+        warehouse_location=warehouse.location,
+        total_products_count=sum(item.quantity for item, _ in rows),
+        items=items_detail
+    )
+
+
 class AddInventoryItemUseCase:
     """Use case para agregar un producto a una bodega"""
     
@@ -30,6 +64,9 @@ class AddInventoryItemUseCase:
         self.warehouse_repo = warehouse_repo
     
     async def execute(self, dto: InventoryItemCreateDTO) -> InventoryItemResponseDTO:
+        if dto.count_id:
+            return await self._add_to_count(dto)
+        
         # Validar que el producto existe
         product = await self.product_repo.get_by_id(dto.product_id)
         if not product:
@@ -43,38 +80,41 @@ class AddInventoryItemUseCase:
         # Calcular cantidad total en unidades
         calculated_quantity = dto.packages_count * product.units_per_package
         
-        # Verificar si ya existe un registro para este producto-bodega (sin count_id)
-        existing = await self.inventory_repo.get_by_warehouse_and_product(
-            dto.warehouse_id, dto.product_id
+        # Existencia: alta o actualización atómica de la fila producto-bodega
+        result = await self.inventory_repo.upsert_stock(
+            dto.warehouse_id,
+            dto.product_id,
+            calculated_quantity,
+            increment=dto.mode == "increment"
         )
         
-        if existing and not dto.count_id:
-            # Si existe y no es parte de un conteo, actualizar la cantidad
-            existing.quantity += calculated_quantity
-            result = await self.inventory_repo.update(existing.id, existing)
-        else:
-            # Crear nuevo item (ya sea parte de conteo o independiente)
-            from app.infrastructure.persistence.models import InventoryItemModel
-            inventory_model = InventoryItemModel(
-                count_id=dto.count_id,
-                warehouse_id=dto.warehouse_id,
-                product_id=dto.product_id,
-                packages_count=dto.packages_count,
-                quantity=calculated_quantity
-            )
-            result = await self.inventory_repo.create(inventory_model)
-        
         return InventoryItemResponseDTO(
             id=result.id,
-            count_id=result.count_id if hasattr(result, 'count_id') else None,
+            count_id=None,
             warehouse_id=result.warehouse_id,
             product_id=result.product_id,
-            packages_count=result.packages_count if hasattr(result, 'packages_count') else 0,
+            packages_count=dto.packages_count,
             quantity=result.quantity,
+            version=result.version,
             created_at=result.created_at,
             updated_at=result.updated_at
         )
 
+    
+    async def _add_to_count(self, dto: InventoryItemCreateDTO) -> InventoryItemResponseDTO:
+        """
+        Línea de un conteo: no modifica la existencia hasta cerrar el conteo.
+        Se delega en AddItemToCountUseCase para tomar el mismo bloqueo
+        compartido del conteo y rechazar conteos cerrados.
+        """
+        from app.application.use_cases.inventory_count_use_cases import AddItemToCountUseCase
+        
+        count = await self.inventory_repo.get_count_header(dto.count_id, lock="share")
+        if count and count.warehouse_id != dto.warehouse_id:
+            raise ValueError(f"El conteo {dto.count_id} no pertenece a la bodega {dto.warehouse_id}")
+        use_case = AddItemToCountUseCase(self.inventory_repo, self.product_repo)
+        return await use_case.execute(dto.count_id, dto, count)
+
 
 class UpdateInventoryQuantityUseCase:
     """Use case para actualizar la cantidad de un producto en una bodega"""
@@ -82,78 +122,75 @@ class UpdateInventoryQuantityUseCase:
     def __init__(self, inventory_repo: IInventoryRepository):
         self.inventory_repo = inventory_repo
     
-    async def execute(self, inventory_id: int, quantity: int) -> InventoryItemResponseDTO:
+    async def execute(
+        self,
+        inventory_id: int,
+        quantity: int,
+        expected_version: Optional[int] = None
+    ) -> InventoryItemResponseDTO:
         if quantity <= 0:
             raise ValueError("Quantity must be greater than 0")
         
-        # Obtener el item existente
-        result = await self.inventory_repo.get_all()
-        inventory_item = next((item for item in result if item.id == inventory_id), None)
-        
-        if not inventory_item:
+        # Actualización directa por clave, sin leer la fila antes; condicional
+        # a la versión si el cliente la envía (VersionConflictError si cambió)
+        updated = await self.inventory_repo.update_quantity(inventory_id, quantity, expected_version)
+        if not updated:
             raise ValueError(f"Inventory item with id {inventory_id} not found")
         
-        # Actualizar la cantidad
-        inventory_item.quantity = quantity
-        updated = await self.inventory_repo.update(inventory_id, inventory_item)
-        
         return InventoryItemResponseDTO(
             id=updated.id,
+            count_id=None,
             warehouse_id=updated.warehouse_id,
             product_id=updated.product_id,
+            packages_count=0,
             quantity=updated.quantity,
+            version=updated.version,
             created_at=updated.created_at,
             updated_at=updated.updated_at
         )
 
 
+class UpdateInventoryQuantitiesBatchUseCase:
+    """Use case para aplicar (o reintentar) varias actualizaciones condicionales de cantidad"""
+    
+    MAX_BATCH_SIZE = 1000
+    
+    def __init__(self, inventory_repo: IInventoryRepository):
+        self.inventory_repo = inventory_repo
+    
+    async def execute(self, dtos: List[InventoryQuantityUpdateDTO]) -> InventoryQuantityBatchResultDTO:
+        if len(dtos) > self.MAX_BATCH_SIZE:
+            raise ValueError(f"El lote no puede superar {self.MAX_BATCH_SIZE} cambios")
+        ids = [dto.id for dto in dtos]
+        if len(set(ids)) != len(ids):
+            raise ValueError("El lote contiene items repetidos")
+        
+        results = await self.inventory_repo.update_quantities([
+            {"id": dto.id, "quantity": dto.quantity, "expected_version": dto.expected_version}
+            for dto in dtos
+        ])
+        
+        return InventoryQuantityBatchResultDTO(
+            updated=sum(1 for r in results if r["status"] == "updated"),
+            conflicts=sum(1 for r in results if r["status"] == "conflict"),
+            results=[InventoryQuantityUpdateResultDTO(**r) for r in results]
+        )
+
+
 class GetWarehouseInventoryUseCase:
     """Use case para obtener el inventario completo de una bodega con detalles de productos"""
     
-    def __init__(
-        self,
-        inventory_repo: IInventoryRepository,
-        warehouse_repo: IWarehouseRepository,
-        product_repo: IProductRepository
-    ):
+    def __init__(self, inventory_repo: IInventoryRepository):
         self.inventory_repo = inventory_repo
-        self.warehouse_repo = warehouse_repo
-        self.product_repo = product_repo
     
     async def execute(self, warehouse_id: int) -> WarehouseInventoryDTO:
-        # Validar que la bodega existe
-        warehouse = await self.warehouse_repo.get_by_id(warehouse_id)
-        if not warehouse:
+        # Bodega, items y productos en una sola consulta
+        grouped = await self.inventory_repo.get_warehouse_inventory(warehouse_id)
+        if not grouped:
             raise ValueError(f"Warehouse with id {warehouse_id} not found")
         
-        # Obtener todos los items de inventario para la bodega
-        inventory_items = await self.inventory_repo.get_by_warehouse(warehouse_id)
-        
-        # Enriquecer con detalles del producto
-        items_detail = []
-        total_products = 0
-        
-        for item in inventory_items:
-            product = await self.product_repo.get_by_id(item.product_id)
-            if product:
-                items_detail.append(
-                    InventoryDetailDTO(
-                        id=item.id,
-                        product_id=item.product_id,
-                        product_name=product.name,
-                        product_price=product.price,
-                        quantity=item.quantity
-                    )
-                )
-                total_products += item.quantity
-        
-        return WarehouseInventoryDTO(
-            warehouse_id=warehouse.id,
-            warehouse_name=warehouse.name,
-            warehouse_location=warehouse.location,
-            total_products_count=total_products,
-            items=items_detail
-        )
+        warehouse, rows = grouped[0]
+        return build_warehouse_inventory_dto(warehouse, rows)
 
 
 class GetProductQuantityUseCase:
@@ -162,11 +199,9 @@ class GetProductQuantityUseCase:
     def __init__(self, inventory_repo: IInventoryRepository):
         self.inventory_repo = inventory_repo
     
-    async def execute(self, warehouse_id: int, product_id: int) -> int:
-        item = await self.inventory_repo.get_by_warehouse_and_product(warehouse_id, product_id)
-        if item:
-            return item.quantity
-        return 0
+    async def execute(self, warehouse_id: int, product_id: int) -> Optional[InventoryItem]:
+        """Existencia del producto en la bodega (None si no tiene fila)"""
+        return await self.inventory_repo.get_by_warehouse_and_product(warehouse_id, product_id)
 
 
 class RemoveProductFromWarehouseUseCase:
@@ -182,50 +217,82 @@ class RemoveProductFromWarehouseUseCase:
 class GetAllWarehouseInventoryUseCase:
     """Use case para obtener el inventario de todas las bodegas"""
     
+    def __init__(self, inventory_repo: IInventoryRepository):
+        self.inventory_repo = inventory_repo
+    
+    async def execute(self, after_id: Optional[int] = None, limit: Optional[int] = None) -> List[WarehouseInventoryDTO]:
+        grouped = await self.inventory_repo.get_warehouse_inventory(after_id=after_id, limit=limit)
+        return [build_warehouse_inventory_dto(warehouse, rows) for warehouse, rows in grouped]
+
+
+class GetWarehouseStockAsOfUseCase:
+    """Use case para consultar la existencia de una bodega en un instante pasado"""
+    
     def __init__(
         self,
         inventory_repo: IInventoryRepository,
-        warehouse_repo: IWarehouseRepository,
-        product_repo: IProductRepository
+        product_repo: IProductRepository,
+        warehouse_repo: IWarehouseRepository
     ):
         self.inventory_repo = inventory_repo
-        self.warehouse_repo = warehouse_repo
         self.product_repo = product_repo
+        self.warehouse_repo = warehouse_repo
     
-    async def execute(self) -> List[WarehouseInventoryDTO]:
-        # Obtener todas las bodegas
-        warehouses = await self.warehouse_repo.get_all()
+    async def execute(self, warehouse_id: int, as_of: datetime) -> WarehouseStockAsOfDTO:
+        warehouse = await self.warehouse_repo.get_by_id(warehouse_id)
+        if not warehouse:
+            raise ValueError(f"Warehouse with id {warehouse_id} not found")
         
-        result = []
-        for warehouse in warehouses:
-            # Para cada bodega, obtener su inventario
-            inventory_items = await self.inventory_repo.get_by_warehouse(warehouse.id)
-            
-            items_detail = []
-            total_products = 0
-            
-            for item in inventory_items:
-                product = await self.product_repo.get_by_id(item.product_id)
-                if product:
-                    items_detail.append(
-                        InventoryDetailDTO(
-                            id=item.id,
-                            product_id=item.product_id,
-                            product_name=product.name,
-                            product_price=product.price,
-                            quantity=item.quantity
-                        )
-                    )
-                    total_products += item.quantity
-            
-            result.append(
-                WarehouseInventoryDTO(
-                    warehouse_id=warehouse.id,
-                    warehouse_name=warehouse.name,
-                    warehouse_location=warehouse.location,
-                    total_products_count=total_products,
-                    items=items_detail
+        # Checkpoint más cercano + movimientos posteriores, sin recorrer toda la historia
+        checkpoint, balances, replayed = await self.inventory_repo.get_stock_as_of(warehouse_id, as_of)
+        products = await self.product_repo.get_many(balances.keys())
+        
+        return WarehouseStockAsOfDTO(
+            warehouse_id=warehouse_id,
+            as_of=as_of,
+            checkpoint_at=checkpoint.taken_at if checkpoint else None,
+            replayed_movements=replayed,
+            total_units=sum(balances.values()),
+            items=[
+                StockBalanceDTO(
+                    product_id=product_id,
+                    product_name=products[product_id].name if product_id in products else "",
+                    quantity=quantity
                 )
-            )
+                for product_id, quantity in balances.items()
+            ]
+        )
+
+
+class ExportInventoryUseCase:
+    """Use case para exportar el inventario en streaming como NDJSON o CSV"""
+    
+    COLUMNS = [
+        "item_id", "count_id", "warehouse_id", "warehouse_name",
+        "product_id", "product_name", "packages_count", "quantity", "version"
+    ]
+    FORMATS = ("ndjson", "csv")
+    
+    def __init__(self, inventory_repo: IInventoryRepository, batch_size: int = 1000):
+        self.inventory_repo = inventory_repo
+        self.batch_size = batch_size
+    
+    async def execute(self, export_format: str, warehouse_ids: Optional[List[int]] = None) -> AsyncIterator[str]:
+        if export_format not in self.FORMATS:
+            raise ValueError(f"Unsupported export format: {export_format}")
+        
+        if export_format == "csv":
+            yield self._csv_chunk([dict(zip(self.COLUMNS, self.COLUMNS))])
         
-        return result
+        # Un fragmento por lote: la memoria depende del tamaño del lote, no del total
+        async for rows in self.inventory_repo.stream_inventory_rows(warehouse_ids, self.batch_size):
+            if export_format == "csv":
+                yield self._csv_chunk(rows)
+            else:
+                yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+    
+    def _csv_chunk(self, rows: List[dict]) -> str:
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=self.COLUMNS, lineterminator="\n")
+        writer.writerows(rows)
+        return buffer.getvalue()
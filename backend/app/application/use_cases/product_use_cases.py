@@ -1,7 +1,9 @@
 from typing import List, Optional
 from app.domain.entities.entities import Product
 from app.domain.repositories.repository_interfaces import IProductRepository
-from app.application.dtos.dtos import ProductCreateDTO, ProductResponseDTO
+from app.application.dtos.dtos import (
+    ProductCreateDTO, ProductResponseDTO, ProductUpsertDTO, ProductBulkUpsertResultDTO
+)
 
 
 class CreateProductUseCase:
@@ -16,7 +18,8 @@ class CreateProductUseCase:
             description=product_dto.description,
             price=product_dto.price,
             packaging_unit=product_dto.packaging_unit,
-            units_per_package=product_dto.units_per_package
+            units_per_package=product_dto.units_per_package,
+            sku=product_dto.sku
         )
         created_product = await self.product_repository.create(product)
         return ProductResponseDTO.from_orm(created_product)
@@ -41,8 +44,8 @@ class GetAllProductsUseCase:
     def __init__(self, product_repository: IProductRepository):
         self.product_repository = product_repository
     
-    async def execute(self, skip: int = 0, limit: int = 100) -> List[ProductResponseDTO]:
-        products = await self.product_repository.get_all(skip, limit)
+    async def execute(self, skip: int = 0, limit: int = 100, after_id: Optional[int] = None) -> List[ProductResponseDTO]:
+        products = await self.product_repository.get_all(skip, limit, after_id)
         return [ProductResponseDTO.from_orm(product) for product in products]
 
 
@@ -53,14 +56,13 @@ class UpdateProductUseCase:
         self.product_repository = product_repository
     
     async def execute(self, product_id: int, product_dto: ProductCreateDTO) -> ProductResponseDTO:
-        product = Product(
-            name=product_dto.name,
-            description=product_dto.description,
-            price=product_dto.price,
-            packaging_unit=product_dto.packaging_unit,
-            units_per_package=product_dto.units_per_package
-        )
-        updated_product = await self.product_repository.update(product_id, product)
+        # Se reemplazan todos los campos salvo `sku`: si no se envía, se
+        # conserva la clave del ERP en lugar de borrarla
+        values = product_dto.model_dump()
+        if "sku" not in product_dto.model_fields_set:
+            del values["sku"]
+        product = Product(**values)
+        updated_product = await self.product_repository.update(product_id, product, values.keys())
         return ProductResponseDTO.from_orm(updated_product)
 
 
@@ -72,3 +74,42 @@ class DeleteProductUseCase:
     
     async def execute(self, product_id: int) -> bool:
         return await self.product_repository.delete(product_id)
+
+
+class BulkUpsertProductsUseCase:
+    """Caso de uso para sincronizar el catálogo de productos por SKU"""
+    
+    CHUNK_SIZE = 1000
+    
+    def __init__(self, product_repository: IProductRepository):
+        self.product_repository = product_repository
+    
+    async def execute(self, product_dtos: List[ProductUpsertDTO]) -> ProductBulkUpsertResultDTO:
+        # Un mismo SKU no puede aparecer dos veces en un INSERT ... ON CONFLICT: gana el último
+        by_sku = {}
+        for dto in product_dtos:
+            by_sku[dto.sku] = Product(
+                sku=dto.sku,
+                name=dto.name,
+                description=dto.description,
+                price=dto.price,
+                packaging_unit=dto.packaging_unit,
+                units_per_package=dto.units_per_package
+            )
+        products = list(by_sku.values())
+        
+        inserted = 0
+        updated = 0
+        for start in range(0, len(products), self.CHUNK_SIZE):
+            chunk_inserted, chunk_updated = await self.product_repository.upsert_many(
+                products[start:start + self.CHUNK_SIZE]
+            )
+            inserted += chunk_inserted
+            updated += chunk_updated
+        
+        return ProductBulkUpsertResultDTO(
+            received=len(product_dtos),
+            inserted=inserted,
+            updated=updated,
+            unchanged=len(products) - inserted - updated
+        )
@@ -1,9 +1,14 @@
-from typing import List, Optional
+import asyncio
+from itertools import islice
+from typing import AsyncIterable, AsyncIterator, Callable, Iterable, List, Optional, Set, Tuple, Union
+from pydantic import ValidationError
 from app.domain.entities.entities import User
 from app.domain.repositories.repository_interfaces import IUserRepository
-from app.application.dtos.dtos import UserCreateDTO, UserResponseDTO, LoadUsersResponseDTO
+from app.application.dtos.dtos import (
+    UserCreateDTO, UserResponseDTO, LoadUsersResponseDTO, UserLoadRowResultDTO
+)
 from app.infrastructure.persistence.models import UserModel, UserRole
-from app.infrastructure.security.password import hash_password
+from app.infrastructure.security.password import hash_password_async
 import httpx
 
 
@@ -17,7 +22,7 @@ class CreateUserUseCase:
         # Hashear el password si se proporciona
         hashed_password = ""
         if user_dto.password:
-            hashed_password = hash_password(user_dto.password)
+            hashed_password = await hash_password_async(user_dto.password)
         
         # Crear UserModel con rol USER por defecto
         user_model = UserModel(
@@ -56,8 +61,8 @@ class GetAllUsersUseCase:
     def __init__(self, user_repository: IUserRepository):
         self.user_repository = user_repository
     
-    async def execute(self, skip: int = 0, limit: int = 100) -> List[UserResponseDTO]:
-        users = await self.user_repository.get_all(skip, limit)
+    async def execute(self, skip: int = 0, limit: int = 100, after_id: Optional[int] = None) -> List[UserResponseDTO]:
+        users = await self.user_repository.get_all(skip, limit, after_id)
         return [UserResponseDTO.from_orm(user) for user in users]
 
 
@@ -95,71 +100,183 @@ class DeleteUserUseCase:
 
 
 class LoadUsersUseCase:
-    def __init__(self, user_repository: IUserRepository):
+    """
+    Alta masiva de usuarios por bloques.
+    
+    Las filas vienen de cualquier fuente iterable (archivo, API externa);
+    sin fuente se usa randomuser.me. Cada bloque se valida, se hashea y se
+    inserta con un solo INSERT ... ON CONFLICT DO NOTHING, de modo que los
+    usuarios existentes (mismo username o email) se informan como omitidos
+    en lugar de abortar la carga. El commit lo hace quien abre la unidad de
+    trabajo, una vez terminada la carga.
+    """
+    
+    CHUNK_SIZE = 1000
+    MAX_REPORTED_RESULTS = 1000
+    DEFAULT_PASSWORD = "password123"
+    RANDOM_USERS_URL = "https://randomuser.me/api/?results=100"
+    # Columnas obligatorias en la tabla que los archivos de personal suelen no traer
+    BLANK_DEFAULTS = ("phone", "gender", "nationality", "nat")
+    
+    def __init__(
+        self,
+        user_repository: IUserRepository,
+        on_row: Optional[Callable[[UserLoadRowResultDTO], None]] = None
+    ):
         self.user_repository = user_repository
+        # Recibe el resultado de cada fila (p. ej. para escribir un reporte completo)
+        self.on_row = on_row
     
-    async def execute(self) -> LoadUsersResponseDTO:
-        try:
-            from app.infrastructure.security import hash_password
-            from app.infrastructure.persistence.models import UserModel, UserRole
-            
-            users_data = await self._fetch_users_from_api()
-            
-            total_saved = 0
-            for user_data in users_data:
-                try:
-                    # Crear UserModel con password y role
-                    user_model = UserModel(
-                        first_name=user_data.first_name,
-                        last_name=user_data.last_name,
-                        email=user_data.email,
-                        phone=user_data.phone,
-                        gender=user_data.gender,
-                        nationality=user_data.nationality,
-                        nat=user_data.nat,
-                        username=user_data.username,
-                        picture_url=user_data.picture_url,
-                        hashed_password=hash_password("password123"),  # Password por defecto
-                        role=UserRole.USER  # Rol de usuario normal
-                    )
-                    await self.user_repository.create(user_model)
-                    total_saved += 1
-                except Exception:
-                    continue
-            
-            return LoadUsersResponseDTO(
-                total_loaded=total_saved,
-                message=f"Se cargaron {total_saved} usuarios exitosamente. Password por defecto: 'password123'",
-                success=True
-            )
-        except Exception as e:
-            return LoadUsersResponseDTO(
-                total_loaded=0,
-                message=f"Error al cargar usuarios: {str(e)}",
-                success=False
-            )
-    
-    async def _fetch_users_from_api(self) -> List[User]:
-        url = "https://randomuser.me/api/?results=100"
+    async def execute(
+        self,
+        rows: Optional[Union[Iterable[Tuple[int, dict]], AsyncIterable[Tuple[int, dict]]]] = None
+    ) -> LoadUsersResponseDTO:
+        if rows is None:
+            rows = await self._fetch_users_from_api()
+        
+        self._default_hash: Optional[str] = None
+        self._seen_usernames: Set[str] = set()
+        self._seen_emails: Set[str] = set()
+        self._total = 0
+        self._created = 0
+        self._skipped = 0
+        self._rejected = 0
+        self._results: List[UserLoadRowResultDTO] = []
+        
+        async for chunk in _chunks(rows, self.CHUNK_SIZE):
+            await self._load_chunk(chunk)
+        
+        return LoadUsersResponseDTO(
+            total_loaded=self._created,
+            message=(
+                f"Se cargaron {self._created} usuarios exitosamente. "
+                f"Password por defecto: '{self.DEFAULT_PASSWORD}'"
+            ),
+            success=True,
+            total_rows=self._total,
+            skipped=self._skipped,
+            rejected=self._rejected,
+            results=self._results,
+            results_truncated=self._skipped + self._rejected > len(self._results)
+        )
+    
+    async def _load_chunk(self, chunk: List[Tuple[int, dict]]):
+        valid = []
+        for row_number, values in chunk:
+            self._total += 1
+            username = values.get("username")
+            try:
+                dto = UserCreateDTO(**{
+                    **{column: "" for column in self.BLANK_DEFAULTS},
+                    **{key: value for key, value in values.items() if value is not None}
+                })
+            except ValidationError as e:
+                error = e.errors()[0]
+                field = ".".join(str(part) for part in error["loc"])
+                self._report(row_number, username, "rejected", f"{field}: {error['msg']}")
+                continue
+            if dto.username in self._seen_usernames or dto.email in self._seen_emails:
+                self._report(row_number, dto.username, "skipped", "Username o email repetido en la carga")
+                continue
+            self._seen_usernames.add(dto.username)
+            self._seen_emails.add(dto.email)
+            valid.append((row_number, dto))
+        
+        if not valid:
+            return
         
+        # La contraseña por defecto se hashea una sola vez por carga, antes del
+        # gather: dentro de él todas las filas la pedirían a la vez. Las
+        # contraseñas propias se hashean en paralelo en el pool de bcrypt
+        if any(not dto.password for _, dto in valid):
+            await self._get_default_hash()
+        own_hashes = iter(await asyncio.gather(*(
+            hash_password_async(dto.password) for _, dto in valid if dto.password
+        )))
+        hashes = [next(own_hashes) if dto.password else self._default_hash for _, dto in valid]
+        users = [
+            {
+                "first_name": dto.first_name,
+                "last_name": dto.last_name,
+                "email": dto.email,
+                "phone": dto.phone,
+                "gender": dto.gender,
+                "nationality": dto.nationality,
+                "nat": dto.nat,
+                "username": dto.username,
+                "picture_url": dto.picture_url,
+                "hashed_password": hashed_password,
+                "role": UserRole.USER
+            }
+            for (_, dto), hashed_password in zip(valid, hashes)
+        ]
+        
+        inserted = set(await self.user_repository.create_many_skip_existing(users))
+        for row_number, dto in valid:
+            if dto.username in inserted:
+                self._created += 1
+                self._report(row_number, dto.username, "created")
+            else:
+                self._report(row_number, dto.username, "skipped", "Ya existe un usuario con ese username o email")
+    
+    async def _get_default_hash(self) -> str:
+        if self._default_hash is None:
+            self._default_hash = await hash_password_async(self.DEFAULT_PASSWORD)
+        return self._default_hash
+    
+    def _report(self, row_number: int, username: Optional[str], status: str, detail: Optional[str] = None):
+        if status == "skipped":
+            self._skipped += 1
+        elif status == "rejected":
+            self._rejected += 1
+        result = UserLoadRowResultDTO(row=row_number, username=username, status=status, detail=detail)
+        if self.on_row:
+            self.on_row(result)
+        # En la respuesta solo se detallan las filas no creadas
+        if status != "created" and len(self._results) < self.MAX_REPORTED_RESULTS:
+            self._results.append(result)
+    
+    async def _fetch_users_from_api(self) -> List[Tuple[int, dict]]:
         async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(url)
+            response = await client.get(self.RANDOM_USERS_URL)
             response.raise_for_status()
             data = response.json()
             
-            users = []
-            for result in data.get("results", []):
-                user = User(
-                    first_name=result["name"]["first"],
-                    last_name=result["name"]["last"],
-                    email=result["email"],
-                    phone=result["phone"],
-                    gender=result["gender"],
-                    nationality=result["location"]["country"],
-                    nat=result["nat"],
-                    username=result["login"]["username"],
-                    picture_url=result["picture"]["large"]
-                )
-                users.append(user)
-            
-            return users
+            return [
+                (index, {
+                    "first_name": result["name"]["first"],
+                    "last_name": result["name"]["last"],
+                    "email": result["email"],
+                    "phone": result["phone"],
+                    "gender": result["gender"],
+                    "nationality": result["location"]["country"],
+                    "nat": result["nat"],
+                    "username": result["login"]["username"],
+                    "picture_url": result["picture"]["large"]
+                })
+                for index, result in enumerate(data.get("results", []), start=1)
+            ]
+
+
+async def _chunks(rows, size: int) -> AsyncIterator[List]:
+    """
+    Agrupa en bloques las filas de fuentes síncronas o asíncronas. Las
+    síncronas (archivos csv/json) se leen en un hilo, un bloque a la vez,
+    para no detener el event loop mientras se parsea el archivo.
+    """
+    if hasattr(rows, "__aiter__"):
+        chunk = []
+        async for row in rows:
+            chunk.append(row)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+        return
+    rows = iter(rows)
+    while True:
+        chunk = await asyncio.to_thread(list, islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
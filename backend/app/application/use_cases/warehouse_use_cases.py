@@ -39,8 +39,8 @@ class GetAllWarehousesUseCase:
     def __init__(self, warehouse_repository: IWarehouseRepository):
         self.warehouse_repository = warehouse_repository
     
-    async def execute(self, skip: int = 0, limit: int = 100) -> List[WarehouseResponseDTO]:
-        warehouses = await self.warehouse_repository.get_all(skip, limit)
+    async def execute(self, skip: int = 0, limit: int = 100, after_id: Optional[int] = None) -> List[WarehouseResponseDTO]:
+        warehouses = await self.warehouse_repository.get_all(skip, limit, after_id)
         return [WarehouseResponseDTO.from_orm(warehouse) for warehouse in warehouses]
 
 
@@ -32,6 +32,7 @@ class Product:
     price: float = 0.0
     packaging_unit: Optional[str] = "Unidad"
     units_per_package: int = 1
+    sku: Optional[str] = None
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
@@ -51,5 +52,6 @@ class InventoryItem:
     warehouse_id: int = 0
     product_id: int = 0
     quantity: int = 0
+    version: int = 1
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
\ No newline at end of file
@@ -0,0 +1,17 @@
+"""
+Excepciones del dominio
+"""
+from typing import Optional
+
+
+class VersionConflictError(Exception):
+    """La versión esperada de un registro no coincide con la actual (escritura concurrente)"""
+    
+    def __init__(self, entity: str, entity_id: int, current_version: Optional[int] = None):
+        self.entity = entity
+        self.entity_id = entity_id
+        self.current_version = current_version
+        super().__init__(
+            f"{entity} with id {entity_id} was modified concurrently "
+            f"(current version: {current_version})"
+        )
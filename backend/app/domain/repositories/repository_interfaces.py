@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from datetime import date, datetime
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
 from app.domain.entities.entities import User, Product, Warehouse, InventoryItem
 
 
@@ -9,12 +10,16 @@ class IUserRepository(ABC):
     async def create(self, user: User) -> User:
         pass
     
+    @abstractmethod
+    async def create_many_skip_existing(self, users: List[dict]) -> List[str]:
+        pass
+    
     @abstractmethod
     async def get_by_id(self, user_id: int) -> Optional[User]:
         pass
     
     @abstractmethod
-    async def get_all(self, skip: int = 0, limit: int = 100) -> List[User]:
+    async def get_all(self, skip: int = 0, limit: int = 100, after_id: Optional[int] = None) -> List[User]:
         pass
     
     @abstractmethod
@@ -25,6 +30,10 @@ class IUserRepository(ABC):
     async def update(self, user_id: int, user: User) -> User:
         pass
     
+    @abstractmethod
+    async def update_password(self, user_id: int, hashed_password: str) -> None:
+        pass
+    
     @abstractmethod
     async def delete(self, user_id: int) -> bool:
         pass
@@ -36,16 +45,24 @@ class IProductRepository(ABC):
     async def create(self, product: Product) -> Product:
         pass
     
+    @abstractmethod
+    async def upsert_many(self, products: List[Product]) -> Tuple[int, int]:
+        pass
+    
     @abstractmethod
     async def get_by_id(self, product_id: int) -> Optional[Product]:
         pass
     
     @abstractmethod
-    async def get_all(self, skip: int = 0, limit: int = 100) -> List[Product]:
+    async def get_many(self, product_ids: Iterable[int]) -> Dict[int, Product]:
+        pass
+    
+    @abstractmethod
+    async def get_all(self, skip: int = 0, limit: int = 100, after_id: Optional[int] = None) -> List[Product]:
         pass
     
     @abstractmethod
-    async def update(self, product_id: int, product: Product) -> Product:
+    async def update(self, product_id: int, product: Product, fields: Optional[Iterable[str]] = None) -> Product:
         pass
     
     @abstractmethod
@@ -64,7 +81,7 @@ class IWarehouseRepository(ABC):
         pass
     
     @abstractmethod
-    async def get_all(self, skip: int = 0, limit: int = 100) -> List[Warehouse]:
+    async def get_all(self, skip: int = 0, limit: int = 100, after_id: Optional[int] = None) -> List[Warehouse]:
         pass
     
     @abstractmethod
@@ -81,10 +98,26 @@ class IInventoryRepository(ABC):
     async def create(self, inventory_item: InventoryItem) -> InventoryItem:
         pass
     
+    @abstractmethod
+    async def create_many(self, rows: List[dict]) -> List[InventoryItem]:
+        pass
+    
+    @abstractmethod
+    async def bulk_insert_items(self, rows: List[dict]) -> int:
+        pass
+    
+    @abstractmethod
+    async def upsert_stock(self, warehouse_id: int, product_id: int, quantity: int, increment: bool = True) -> InventoryItem:
+        pass
+    
     @abstractmethod
     async def get_by_id(self, inventory_id: int) -> Optional[InventoryItem]:
         pass
     
+    @abstractmethod
+    async def get_many(self, inventory_ids: Iterable[int]) -> Dict[int, InventoryItem]:
+        pass
+    
     @abstractmethod
     async def get_by_warehouse_and_product(self, warehouse_id: int, product_id: int) -> Optional[InventoryItem]:
         pass
@@ -94,17 +127,55 @@ class IInventoryRepository(ABC):
         pass
     
     @abstractmethod
-    async def get_all(self, skip: int = 0, limit: int = 100) -> List[InventoryItem]:
+    async def get_warehouse_inventory(
+        self,
+        warehouse_id: Optional[int] = None,
+        after_id: Optional[int] = None,
+        limit: Optional[int] = None
+    ) -> List[Tuple[Warehouse, List[Tuple[InventoryItem, Product]]]]:
+        pass
+    
+    @abstractmethod
+    async def get_busiest_warehouse_ids(self, limit: int, window: int = 10000) -> List[int]:
+        pass
+    
+    @abstractmethod
+    def stream_inventory_rows(
+        self,
+        warehouse_ids: Optional[List[int]] = None,
+        batch_size: int = 1000
+    ) -> AsyncIterator[List[dict]]:
+        pass
+    
+    @abstractmethod
+    async def get_all(self, skip: int = 0, limit: int = 100, after_id: Optional[int] = None) -> List[InventoryItem]:
         pass
     
     @abstractmethod
     async def update(self, inventory_id: int, inventory_item: InventoryItem) -> InventoryItem:
         pass
     
+    @abstractmethod
+    async def update_quantity(
+        self,
+        inventory_id: int,
+        quantity: int,
+        expected_version: Optional[int] = None
+    ) -> Optional[InventoryItem]:
+        pass
+    
+    @abstractmethod
+    async def update_quantities(self, changes: List[dict]) -> List[dict]:
+        pass
+    
     @abstractmethod
     async def delete(self, inventory_id: int) -> bool:
         pass
     
+    @abstractmethod
+    async def get_stock_as_of(self, warehouse_id: int, as_of: datetime):
+        pass
+    
     # Métodos para conteos de inventario
     @abstractmethod
     async def create_count(self, count):
@@ -115,9 +186,30 @@ class IInventoryRepository(ABC):
         pass
     
     @abstractmethod
-    async def get_counts(self, warehouse_id: Optional[int] = None, status: Optional[str] = None):
+    async def get_count_header(self, count_id: int, lock: Optional[str] = None, with_relations: bool = False):
+        pass
+    
+    @abstractmethod
+    async def close_and_reconcile_count(self, count, closed_at: datetime) -> dict:
+        pass
+    
+    @abstractmethod
+    async def get_count_variances(self, count_id: int):
+        pass
+    
+    @abstractmethod
+    async def get_counts(
+        self,
+        warehouse_id: Optional[int] = None,
+        status: Optional[str] = None,
+        warehouse_ids: Optional[List[int]] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        before_id: Optional[int] = None,
+        limit: int = 50
+    ):
         pass
     
     @abstractmethod
-    async def update_count(self, count):
+    async def update_count(self, count, relations: Optional[List[str]] = None):
         pass
\ No newline at end of file
@@ -0,0 +1,12 @@
+"""
+Módulo de archivos - lectura de planillas de conteo y archivos de usuarios
+"""
+from app.infrastructure.files.count_sheet_reader import iter_count_sheet_rows, CountSheetFormatError
+from app.infrastructure.files.user_source_reader import iter_user_rows, UserSourceFormatError
+
+__all__ = [
+    "iter_count_sheet_rows",
+    "CountSheetFormatError",
+    "iter_user_rows",
+    "UserSourceFormatError"
+]
@@ -0,0 +1,87 @@
+"""
+Lectura incremental de planillas de conteo (CSV o XLSX).
+
+Las filas se entregan una a una desde el archivo, sin cargarlo completo
+en memoria. Columnas requeridas: product_id, packages_count.
+"""
+import csv
+import io
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+REQUIRED_COLUMNS = ("product_id", "packages_count")
+
+
+class CountSheetFormatError(ValueError):
+    """El archivo no tiene un formato de planilla de conteo válido"""
+
+
+def iter_count_sheet_rows(file: BinaryIO, filename: str) -> Iterator[Tuple[int, dict]]:
+    """
+    Recorre las filas de datos de la planilla
+
+    Args:
+        file: Archivo binario abierto
+        filename: Nombre original, define el formato por su extensión
+
+    Yields:
+        (número de fila en el archivo, {columna: valor})
+    """
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        rows = _iter_csv(file)
+    elif name.endswith(".xlsx"):
+        rows = _iter_xlsx(file)
+    else:
+        raise CountSheetFormatError("Formato no soportado, use .csv o .xlsx")
+
+    header = _read_header(next(rows, None))
+    for row_number, values in enumerate(rows, start=2):
+        if not any(value not in (None, "") for value in values):
+            continue
+        yield row_number, {column: _cell(values, index) for column, index in header.items()}
+
+
+def _read_header(values) -> dict:
+    if values is None:
+        raise CountSheetFormatError("El archivo está vacío")
+    names = [str(value).strip().lower() if value is not None else "" for value in values]
+    missing = [column for column in REQUIRED_COLUMNS if column not in names]
+    if missing:
+        raise CountSheetFormatError(f"Faltan columnas requeridas: {', '.join(missing)}")
+    return {column: names.index(column) for column in REQUIRED_COLUMNS}
+
+
+def _cell(values, index: int) -> Optional[str]:
+    if index >= len(values) or values[index] is None:
+        return None
+    return str(values[index]).strip()
+
+
+def _iter_csv(file: BinaryIO):
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        yield from csv.reader(text)
+    finally:
+        text.detach()
+
+
+def _iter_xlsx(file: BinaryIO):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise CountSheetFormatError("La importación de .xlsx requiere el paquete openpyxl")
+
+    # read_only recorre la hoja en streaming sin construir el libro completo
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        for values in workbook.active.iter_rows(values_only=True):
+            yield [_xlsx_value(value) for value in values]
+    finally:
+        workbook.close()
+
+
+def _xlsx_value(value):
+    # Excel guarda los enteros como float (12.0)
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
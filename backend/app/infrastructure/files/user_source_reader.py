@@ -0,0 +1,115 @@
+"""
+Lectura incremental de archivos de usuarios para el alta masiva (CSV o JSON).
+
+- .csv: una fila de encabezados y una fila por usuario.
+- .jsonl / .ndjson: un objeto JSON por línea.
+- .json: un arreglo de objetos (se carga completo; para archivos grandes
+  conviene .jsonl o .csv).
+
+Columnas requeridas: username, email, first_name, last_name. Opcionales:
+phone, gender, nationality, nat, picture_url, password.
+"""
+import csv
+import io
+import json
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+REQUIRED_COLUMNS = ("username", "email", "first_name", "last_name")
+OPTIONAL_COLUMNS = ("phone", "gender", "nationality", "nat", "picture_url", "password")
+
+
+class UserSourceFormatError(ValueError):
+    """El archivo no tiene un formato de usuarios válido"""
+
+
+def iter_user_rows(file: BinaryIO, filename: str) -> Iterator[Tuple[int, dict]]:
+    """
+    Recorre los usuarios del archivo
+
+    Args:
+        file: Archivo binario abierto
+        filename: Nombre original, define el formato por su extensión
+
+    Yields:
+        (número de fila o línea en el archivo, {columna: valor})
+    """
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        yield from _iter_csv(file)
+    elif name.endswith((".jsonl", ".ndjson")):
+        yield from _iter_jsonl(file)
+    elif name.endswith(".json"):
+        yield from _iter_json(file)
+    else:
+        raise UserSourceFormatError("Formato no soportado, use .csv, .json o .jsonl")
+
+
+def _iter_csv(file: BinaryIO):
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.reader(text)
+        header = next(reader, None)
+        if header is None:
+            raise UserSourceFormatError("El archivo está vacío")
+        names = [value.strip().lower() for value in header]
+        missing = [column for column in REQUIRED_COLUMNS if column not in names]
+        if missing:
+            raise UserSourceFormatError(f"Faltan columnas requeridas: {', '.join(missing)}")
+        columns = {
+            column: names.index(column)
+            for column in REQUIRED_COLUMNS + OPTIONAL_COLUMNS if column in names
+        }
+        for row_number, values in enumerate(reader, start=2):
+            if not any(value.strip() for value in values):
+                continue
+            yield row_number, {column: _cell(values, index) for column, index in columns.items()}
+    finally:
+        text.detach()
+
+
+def _iter_jsonl(file: BinaryIO):
+    text = io.TextIOWrapper(file, encoding="utf-8-sig")
+    try:
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise UserSourceFormatError(f"JSON inválido en la línea {line_number}: {e.msg}")
+            yield line_number, _record(record, line_number)
+    finally:
+        text.detach()
+
+
+def _iter_json(file: BinaryIO):
+    try:
+        records = json.load(io.TextIOWrapper(file, encoding="utf-8-sig"))
+    except json.JSONDecodeError as e:
+        raise UserSourceFormatError(f"JSON inválido: {e.msg}")
+    if not isinstance(records, list):
+        raise UserSourceFormatError("El archivo JSON debe contener un arreglo de usuarios")
+    for index, record in enumerate(records, start=1):
+        yield index, _record(record, index)
+
+
+def _record(record, position: int) -> dict:
+    if not isinstance(record, dict):
+        raise UserSourceFormatError(f"El registro {position} no es un objeto JSON")
+    return {
+        column: _value(record.get(column))
+        for column in REQUIRED_COLUMNS + OPTIONAL_COLUMNS if column in record
+    }
+
+
+def _cell(values, index: int) -> Optional[str]:
+    if index >= len(values):
+        return None
+    return _value(values[index])
+
+
+def _value(value) -> Optional[str]:
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
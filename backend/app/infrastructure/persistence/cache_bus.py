@@ -0,0 +1,238 @@
+"""
+Bus de invalidación de cachés entre procesos con LISTEN/NOTIFY de Postgres.
+
+Con varios workers de uvicorn cada proceso tiene sus propias cachés en
+memoria (productos, principals con sus bodegas asignadas). Las escrituras
+anotan un evento `{"entity": ..., "id": ...}` en la sesión y la unidad de
+trabajo, justo antes del commit, los envía todos juntos: una sola
+sentencia con un `pg_notify` por evento distinto, dentro de la misma
+transacción. Postgres los entrega solo si la transacción confirma, y nunca
+si se revierte. Un `id` nulo significa "todas las entradas".
+
+Cada worker mantiene una conexión dedicada que escucha el canal y, por cada
+evento, llama al manejador registrado para esa entidad. El proceso que
+escribe aplica además sus propios eventos al confirmar la sesión, sin
+esperar el aviso, para leer de inmediato lo que acaba de escribir. Si la conexión se
+cae (detectado por el aviso de cierre de asyncpg o por un ping periódico),
+los eventos intermedios se pierden: al reconectar se vacían todas las
+cachés registradas. La primera conexión no vacía nada: el arranque espera
+a que el listener conecte (`wait_connected`) antes de precalentar, así que
+lo precalentado ya no puede perder eventos. Con el bus activo las cachés pueden usar TTL largos;
+el TTL solo acota lo que se sirve mientras el listener está desconectado.
+
+Las altas de usuarios y productos no publican nada: ninguna caché guarda
+búsquedas fallidas. Las de bodegas sí, porque los reportes las listan.
+
+Variables de entorno:
+    CACHE_BUS_ENABLED: "false" para no iniciar el listener (por defecto activo)
+    CACHE_BUS_PING_INTERVAL: segundos entre pings de la conexión (por defecto 10)
+    CACHE_BUS_RECONNECT_MAX: espera máxima entre reintentos (por defecto 30)
+    CACHE_BUS_CONNECT_TIMEOUT: espera del arranque a la primera conexión (por defecto 5)
+"""
+import asyncio
+import json
+import logging
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.infrastructure.persistence.database import DATABASE_URL, _env_bool
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "cache_invalidation"
+CACHE_BUS_ENABLED = _env_bool("CACHE_BUS_ENABLED", True)
+CACHE_BUS_PING_INTERVAL = float(os.getenv("CACHE_BUS_PING_INTERVAL", "10"))  # segundos
+CACHE_BUS_RECONNECT_MAX = float(os.getenv("CACHE_BUS_RECONNECT_MAX", "30"))  # segundos
+CACHE_BUS_CONNECT_TIMEOUT = float(os.getenv("CACHE_BUS_CONNECT_TIMEOUT", "5"))  # segundos
+
+# Entidades publicadas por los repositorios
+PRODUCT = "product"
+USER = "user"
+WAREHOUSE = "warehouse"
+STOCK = "stock"  # id de la bodega cuya existencia cambió
+
+# Eventos publicados en la transacción en curso, en `session.info`
+PENDING_EVENTS = "cache_invalidation_events"
+
+
+# pg_notify por sentencia: Postgres admite hasta 1664 columnas por SELECT
+NOTIFY_BATCH_SIZE = 1000
+
+
+def publish_invalidation(session: AsyncSession, entity: str, entity_id: Optional[int] = None) -> None:
+    """
+    Anota un cambio de la entidad; se envía con `send_pending_invalidations`
+    antes del commit y se entrega al confirmar la transacción
+
+    Args:
+        session: Sesión de la transacción que hace la escritura
+        entity: Entidad modificada (PRODUCT, USER, WAREHOUSE, STOCK)
+        entity_id: Id modificado, o None si cambiaron varias entradas
+    """
+    session.info.setdefault(PENDING_EVENTS, []).append((entity, entity_id))
+
+
+def _pending_events(session) -> List[Tuple[str, Optional[int]]]:
+    # Sin repetidos y en orden de publicación
+    return list(dict.fromkeys(session.info.get(PENDING_EVENTS, ())))
+
+
+async def send_pending_invalidations(session: AsyncSession) -> None:
+    """Envía los eventos anotados en la transacción; se llama antes del commit"""
+    payloads = [
+        json.dumps({"entity": entity, "id": entity_id})
+        for entity, entity_id in _pending_events(session)
+    ]
+    for start in range(0, len(payloads), NOTIFY_BATCH_SIZE):
+        batch = payloads[start:start + NOTIFY_BATCH_SIZE]
+        await session.execute(select(*(func.pg_notify(CHANNEL, payload) for payload in batch)))
+
+
+class CacheInvalidationListener:
+    """Escucha el canal de invalidación y desaloja las cachés del proceso"""
+
+    def __init__(
+        self,
+        dsn: str = DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://"),
+        ping_interval: float = CACHE_BUS_PING_INTERVAL,
+        reconnect_max: float = CACHE_BUS_RECONNECT_MAX
+    ):
+        self.dsn = dsn
+        self.ping_interval = ping_interval
+        self.reconnect_max = reconnect_max
+        # entidad -> manejador(id o None)
+        self._handlers: Dict[str, List[Callable[[Optional[int]], None]]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+        self._connected_event = asyncio.Event()
+        # Hay que vaciar al conectar si se cacheó algo sin estar escuchando
+        self._flush_on_connect = False
+        self.connected = False
+        self.received = 0
+        self.disconnects = 0
+        self.flushes = 0
+        self.last_error: Optional[str] = None
+
+    def register(self, entity: str, handler: Callable[[Optional[int]], None]) -> None:
+        self._handlers.setdefault(entity, []).append(handler)
+
+    def flush_all(self) -> None:
+        """Vacía todas las cachés registradas"""
+        self.flushes += 1
+        for handlers in self._handlers.values():
+            for handler in handlers:
+                handler(None)
+
+    def dispatch(self, payload: str) -> None:
+        self.received += 1
+        try:
+            event = json.loads(payload)
+            entity, entity_id = event["entity"], event.get("id")
+        except (ValueError, TypeError, KeyError):
+            logger.warning("Evento de invalidación inválido: %r", payload)
+            self.flush_all()
+            return
+        self.apply(entity, entity_id)
+
+    def apply(self, entity: str, entity_id: Optional[int]) -> None:
+        for handler in self._handlers.get(entity, ()):
+            handler(entity_id)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def wait_connected(self, timeout: float = CACHE_BUS_CONNECT_TIMEOUT) -> bool:
+        """
+        Espera a que el listener conecte. Si no lo hace a tiempo, la primera
+        conexión vaciará las cachés: lo cacheado mientras tanto pudo perder eventos.
+        """
+        try:
+            await asyncio.wait_for(self._connected_event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            self._flush_on_connect = True
+            return False
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._stopping.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        import asyncpg
+
+        delay = min(1.0, self.reconnect_max)
+        while not self._stopping.is_set():
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                lost = asyncio.Event()
+                connection.add_termination_listener(lambda _: lost.set())
+                await connection.add_listener(CHANNEL, lambda _c, _pid, _ch, payload: self.dispatch(payload))
+                self.connected = True
+                self._connected_event.set()
+                # Lo publicado mientras no se escuchaba se perdió
+                if self._flush_on_connect:
+                    self._flush_on_connect = False
+                    self.flush_all()
+                delay = min(1.0, self.reconnect_max)
+                while not lost.is_set():
+                    try:
+                        await asyncio.wait_for(lost.wait(), self.ping_interval)
+                    except asyncio.TimeoutError:
+                        await asyncio.wait_for(connection.execute("SELECT 1"), self.ping_interval)
+                raise ConnectionError("conexión del listener cerrada")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                logger.warning("Listener de invalidación desconectado: %s", self.last_error)
+            finally:
+                if self.connected:
+                    self.connected = False
+                    self._connected_event.clear()
+                    self._flush_on_connect = True
+                    self.flush_all()
+                    if not self._stopping.is_set():
+                        self.disconnects += 1
+                if connection is not None and not connection.is_closed():
+                    connection.terminate()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.reconnect_max)
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": CACHE_BUS_ENABLED,
+            "channel": CHANNEL,
+            "connected": self.connected,
+            "received": self.received,
+            "disconnects": self.disconnects,
+            "flushes": self.flushes,
+            "last_error": self.last_error,
+        }
+
+
+cache_invalidation_listener = CacheInvalidationListener()
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending_events(session: Session) -> None:
+    for entity, entity_id in _pending_events(session):
+        cache_invalidation_listener.apply(entity, entity_id)
+    session.info.pop(PENDING_EVENTS, None)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending_events(session: Session, previous_transaction) -> None:
+    if not previous_transaction.nested:
+        session.info.pop(PENDING_EVENTS, None)
@@ -0,0 +1,113 @@
+"""
+Caché de respuestas de conteos cerrados.
+
+Un conteo en estado CLOSED ya no cambia: su detalle y sus líneas se
+serializan una vez y se guardan como bytes, cada uno con un ETag fuerte
+calculado sobre el contenido (igual en todos los workers). Servir un
+conteo archivado desde la caché no consulta la base.
+
+Lo único que puede cambiar es lo que el detalle toma de otras tablas: el
+nombre de la bodega y el usuario creador. Los eventos de bodegas y usuarios
+del bus de invalidación descartan los conteos afectados; al reconstruirlos
+cambia el contenido y con él el ETag.
+
+La caché se acota por tamaño total (`CLOSED_COUNT_CACHE_MAX_BYTES`,
+por defecto 64 MB; 0 la deshabilita) y descarta los menos usados. Un
+conteo que por sí solo supera el límite no se guarda.
+"""
+import hashlib
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from typing import Optional
+
+CLOSED_COUNT_CACHE_MAX_BYTES = int(os.getenv("CLOSED_COUNT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+@dataclass(frozen=True)
+class CachedBody:
+    """Cuerpo JSON serializado y su ETag fuerte"""
+    body: bytes
+    etag: str
+
+    @classmethod
+    def of(cls, body: bytes) -> "CachedBody":
+        return cls(body=body, etag=f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"')
+
+
+@dataclass(frozen=True)
+class ClosedCountSnapshot:
+    """Respuestas de un conteo cerrado, con lo necesario para validar permisos"""
+    count_id: int
+    warehouse_id: int
+    created_by: int
+    detail: CachedBody
+    items: CachedBody
+
+    @property
+    def size(self) -> int:
+        return len(self.detail.body) + len(self.items.body)
+
+
+class ClosedCountCache:
+    """Caché LRU de conteos cerrados acotada por bytes"""
+
+    def __init__(self, max_bytes: int = CLOSED_COUNT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[int, ClosedCountSnapshot]" = OrderedDict()
+        self._bytes = 0
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, count_id: int) -> Optional[ClosedCountSnapshot]:
+        with self._lock:
+            snapshot = self._entries.get(count_id)
+            if snapshot is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(count_id)
+            self.hits += 1
+            return snapshot
+
+    def put(self, snapshot: ClosedCountSnapshot) -> None:
+        if snapshot.size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(snapshot.count_id, None)
+            if previous is not None:
+                self._bytes -= previous.size
+            self._entries[snapshot.count_id] = snapshot
+            self._bytes += snapshot.size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+
+    def _discard(self, matches) -> None:
+        with self._lock:
+            for count_id in [cid for cid, snapshot in self._entries.items() if matches(snapshot)]:
+                self._bytes -= self._entries.pop(count_id).size
+
+    def invalidate_warehouse(self, warehouse_id: Optional[int] = None) -> None:
+        """Descarta los conteos de la bodega (de todas si es None)"""
+        self._discard(lambda s: warehouse_id is None or s.warehouse_id == warehouse_id)
+
+    def invalidate_creator(self, user_id: Optional[int] = None) -> None:
+        """Descarta los conteos creados por el usuario (de todos si es None)"""
+        self._discard(lambda s: user_id is None or s.created_by == user_id)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "max_bytes": self.max_bytes,
+                "bytes": self._bytes,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+closed_count_cache = ClosedCountCache()
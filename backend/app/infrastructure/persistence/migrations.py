@@ -0,0 +1,268 @@
+"""
+Migraciones versionadas del esquema.
+
+`init_db` crea las tablas nuevas con `create_all`, pero eso no modifica
+tablas que ya existen. Cada migración registrada aquí aplica esos cambios
+sobre bases de datos existentes y queda anotada en `schema_migrations`.
+
+Las migraciones corren en modo AUTOCOMMIT (necesario para
+`CREATE INDEX CONCURRENTLY` en PostgreSQL) y deben ser idempotentes:
+si una falla a mitad de camino, se vuelve a ejecutar completa en el
+siguiente arranque.
+
+Cada worker las ejecuta al iniciar. En PostgreSQL el runner toma un
+advisory lock de sesión antes de leer `schema_migrations`: los demás
+workers esperan y, al obtenerlo, ven las versiones ya aplicadas en lugar
+de repetir migraciones que no son seguras en paralelo (los saldos de
+apertura, la copia de existencias o los índices CONCURRENTLY).
+
+La espera se hace con `pg_try_advisory_lock` y pausas entre intentos, no
+con `pg_advisory_lock`: un worker bloqueado en esa sentencia tendría una
+transacción abierta, y `CREATE INDEX CONCURRENTLY` espera a que terminen
+todas las transacciones anteriores, incluida esa. El arranque quedaría
+bloqueado para siempre.
+"""
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List, Sequence
+from sqlalchemy import delete, exists, func, insert, inspect, literal, select, text
+from sqlalchemy.engine import Connection
+
+# Clave del advisory lock que serializa el runner entre workers
+MIGRATIONS_LOCK_KEY = 7_301_001
+MIGRATIONS_LOCK_POLL = 0.5  # segundos entre intentos de tomar el lock
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+
+
+def create_index(conn: Connection, name: str, table: str, columns: Sequence[str], unique: bool = False) -> None:
+    """
+    Crea un índice si no existe. En PostgreSQL se construye con CONCURRENTLY
+    para no bloquear escrituras sobre la tabla mientras se crea.
+    """
+    column_list = ", ".join(columns)
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    if conn.dialect.name == "postgresql":
+        # Un CREATE INDEX CONCURRENTLY fallido deja un índice inválido que
+        # IF NOT EXISTS daría por bueno: se elimina antes de reintentar
+        invalid = conn.execute(
+            text(
+                "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = :name AND NOT i.indisvalid"
+            ),
+            {"name": name}
+        ).first()
+        if invalid:
+            conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+        conn.execute(text(f"CREATE {kind} CONCURRENTLY IF NOT EXISTS {name} ON {table} ({column_list})"))
+    else:
+        conn.execute(text(f"CREATE {kind} IF NOT EXISTS {name} ON {table} ({column_list})"))
+
+
+def drop_index(conn: Connection, name: str) -> None:
+    """Elimina un índice si existe, sin bloquear escrituras en PostgreSQL"""
+    concurrently = " CONCURRENTLY" if conn.dialect.name == "postgresql" else ""
+    conn.execute(text(f"DROP INDEX{concurrently} IF EXISTS {name}"))
+
+
+def add_column(conn: Connection, table: str, column: str, ddl: str) -> None:
+    """Agrega una columna si la tabla aún no la tiene"""
+    existing = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column not in existing:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def _0001_inventory_indexes(conn: Connection) -> None:
+    create_index(
+        conn, "ix_inventory_items_warehouse_product_count",
+        "inventory_items", ["warehouse_id", "product_id", "count_id"]
+    )
+    create_index(conn, "ix_inventory_items_count_id", "inventory_items", ["count_id"])
+    create_index(
+        conn, "ix_inventory_counts_warehouse_status",
+        "inventory_counts", ["warehouse_id", "status"]
+    )
+
+
+def _0002_product_sku(conn: Connection) -> None:
+    add_column(conn, "products", "sku", "VARCHAR(64)")
+    create_index(conn, "ix_products_sku", "products", ["sku"], unique=True)
+
+
+def _0003_stock_opening_balances(conn: Connection) -> None:
+    """
+    Abre el libro de movimientos con la existencia actual de cada bodega.
+    Las tablas las crea `create_all`; antes de esta migración no hay
+    historia, por lo que las consultas anteriores a ella devuelven vacío.
+    """
+    from app.infrastructure.persistence.models import (
+        InventoryItemModel, StockMovementModel, StockMovementReason
+    )
+    
+    movements = StockMovementModel.__table__
+    if conn.execute(select(movements.c.id).limit(1)).first():
+        return
+    items = InventoryItemModel.__table__
+    conn.execute(
+        insert(movements).from_select(
+            ["warehouse_id", "product_id", "item_id", "quantity_delta", "reason", "created_at"],
+            select(
+                items.c.warehouse_id,
+                items.c.product_id,
+                items.c.id,
+                items.c.quantity,
+                literal(StockMovementReason.OPENING, movements.c.reason.type),
+                literal(datetime.utcnow())
+            ).where(items.c.count_id.is_(None), items.c.quantity != 0)
+        )
+    )
+
+
+def _0004_split_stock_items(conn: Connection) -> None:
+    """
+    Mueve la existencia (filas de inventory_items sin count_id) a stock_items,
+    sumando duplicados en una fila por producto y bodega. Se conserva el id
+    menor de cada grupo para que los ids usados por la API sigan valiendo.
+    """
+    from app.infrastructure.persistence.models import InventoryItemModel, StockItemModel
+    
+    items = InventoryItemModel.__table__
+    stock = StockItemModel.__table__
+    conn.execute(
+        insert(stock).from_select(
+            ["id", "warehouse_id", "product_id", "quantity", "created_at", "updated_at"],
+            select(
+                func.min(items.c.id),
+                items.c.warehouse_id,
+                items.c.product_id,
+                func.sum(items.c.quantity),
+                func.min(items.c.created_at),
+                func.max(items.c.updated_at)
+            )
+            .where(
+                items.c.count_id.is_(None),
+                # Idempotente si una ejecución anterior se interrumpió tras copiar
+                ~exists().where(
+                    stock.c.warehouse_id == items.c.warehouse_id,
+                    stock.c.product_id == items.c.product_id
+                )
+            )
+            .group_by(items.c.warehouse_id, items.c.product_id)
+        )
+    )
+    conn.execute(delete(items).where(items.c.count_id.is_(None)))
+    if conn.dialect.name == "postgresql":
+        # Los ids se insertaron explícitamente: se adelanta la secuencia
+        conn.execute(text(
+            "SELECT setval(pg_get_serial_sequence('stock_items', 'id'), "
+            "COALESCE((SELECT MAX(id) FROM stock_items), 0) + 1, false)"
+        ))
+        conn.execute(text("ALTER TABLE inventory_items ALTER COLUMN count_id SET NOT NULL"))
+
+
+def _0005_version_columns(conn: Connection) -> None:
+    add_column(conn, "stock_items", "version", "INTEGER NOT NULL DEFAULT 1")
+    add_column(conn, "inventory_counts", "version", "INTEGER NOT NULL DEFAULT 1")
+
+
+def _0006_server_timestamps(conn: Connection) -> None:
+    """
+    Defaults de fecha en el servidor para las tablas existentes (las nuevas
+    ya los reciben de `create_all`). SQLite no permite cambiar el default de
+    una columna, por lo que solo aplica a PostgreSQL.
+    """
+    if conn.dialect.name != "postgresql":
+        return
+    columns = {
+        "users": ("created_at", "updated_at"),
+        "warehouses": ("created_at", "updated_at"),
+        "products": ("created_at", "updated_at"),
+        "inventory_counts": ("created_at",),
+        "stock_items": ("created_at", "updated_at"),
+        "inventory_items": ("created_at", "updated_at"),
+    }
+    for table, names in columns.items():
+        for name in names:
+            conn.execute(text(
+                f"ALTER TABLE {table} ALTER COLUMN {name} SET DEFAULT TIMEZONE('utc', CURRENT_TIMESTAMP)"
+            ))
+
+
+def _0007_drop_inventory_items_warehouse_index(conn: Connection) -> None:
+    """
+    inventory_items ya solo guarda líneas de conteo, que se consultan por
+    count_id. El índice por bodega y producto ninguna consulta lo usa y solo
+    encarece cada inserción de una planilla.
+    """
+    drop_index(conn, "ix_inventory_items_warehouse_product_count")
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "inventory_indexes", _0001_inventory_indexes),
+    Migration(2, "product_sku", _0002_product_sku),
+    Migration(3, "stock_opening_balances", _0003_stock_opening_balances),
+    Migration(4, "split_stock_items", _0004_split_stock_items),
+    Migration(5, "version_columns", _0005_version_columns),
+    Migration(6, "server_timestamps", _0006_server_timestamps),
+    Migration(7, "drop_inventory_items_warehouse_index", _0007_drop_inventory_items_warehouse_index),
+]
+
+
+def apply_migrations(conn: Connection) -> List[int]:
+    """
+    Aplica las migraciones pendientes sobre una conexión en AUTOCOMMIT
+
+    La conexión debe ser exclusiva del runner: el advisory lock es de sesión
+    y se libera al terminar, aunque una migración falle. La espera del lock
+    duerme el hilo; corre en el arranque, antes de atender requests.
+
+    Returns:
+        Versiones aplicadas en esta ejecución
+    """
+    if conn.dialect.name != "postgresql":
+        return _apply_pending(conn)
+    # Cada intento es una sentencia corta en AUTOCOMMIT: entre intentos este
+    # worker no tiene transacción abierta que frene los índices CONCURRENTLY
+    while not conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": MIGRATIONS_LOCK_KEY}).scalar():
+        time.sleep(MIGRATIONS_LOCK_POLL)
+    try:
+        return _apply_pending(conn)
+    finally:
+        conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATIONS_LOCK_KEY})
+
+
+def _apply_pending(conn: Connection) -> List[int]:
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, "
+        "name VARCHAR(200) NOT NULL, "
+        "applied_at TIMESTAMP NOT NULL)"
+    ))
+    # Se lee con el lock tomado: otro worker pudo terminar de migrar
+    # mientras esta conexión esperaba
+    applied_versions = {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+    applied = []
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        if migration.version in applied_versions:
+            continue
+        migration.upgrade(conn)
+        conn.execute(
+            text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:version, :name, :applied_at)"),
+            {"version": migration.version, "name": migration.name, "applied_at": datetime.utcnow()}
+        )
+        applied.append(migration.version)
+    return applied
+
+
+async def run_migrations(engine) -> List[int]:
+    """Ejecuta las migraciones pendientes usando el engine asíncrono"""
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        return await conn.run_sync(apply_migrations)
@@ -1,10 +1,34 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum, Table, Date
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum, Table, Date, Index, UniqueConstraint, JSON
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql.functions import FunctionElement
 from datetime import datetime
 from app.infrastructure.persistence.database import Base
 import enum
 
 
+class utcnow(FunctionElement):
+    """
+    Hora UTC sin zona calculada por la base de datos. Las columnas de fecha
+    de las entidades la usan como default del servidor: con
+    `eager_defaults` el INSERT/UPDATE la devuelve por RETURNING y no hace
+    falta un SELECT posterior para conocerla.
+    """
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(utcnow, "postgresql")
+def _pg_utcnow(element, compiler, **kw):
+    return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
+
+
+@compiles(utcnow)
+def _default_utcnow(element, compiler, **kw):
+    # SQLite entrega CURRENT_TIMESTAMP en UTC
+    return "CURRENT_TIMESTAMP"
+
+
 class UserRole(str, enum.Enum):
     ADMIN = "admin"
     USER = "user"
@@ -16,6 +40,14 @@ class InventoryCountStatus(str, enum.Enum):
     CLOSED = "closed"
 
 
+class StockMovementReason(str, enum.Enum):
+    OPENING = "opening"  # Saldo inicial al crear el libro de movimientos
+    RECEIPT = "receipt"  # Ingreso de unidades a la bodega
+    ADJUSTMENT = "adjustment"  # Cambio manual de cantidad
+    REMOVAL = "removal"  # Producto retirado de la bodega
+    COUNT_CLOSE = "count_close"  # Conciliación al cerrar un conteo
+
+
 user_warehouses = Table(
     'user_warehouses',
     Base.metadata,
@@ -26,6 +58,7 @@ user_warehouses = Table(
 
 class UserModel(Base):
     __tablename__ = "users"
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     first_name = Column(String(100), nullable=False)
@@ -39,25 +72,27 @@ class UserModel(Base):
     hashed_password = Column(String(255), nullable=False)
     role = Column(Enum(UserRole), default=UserRole.USER, nullable=False)
     picture_url = Column(String(255), nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=utcnow())
+    updated_at = Column(DateTime, server_default=utcnow(), onupdate=utcnow())
 
     assigned_warehouses = relationship("WarehouseModel", secondary=user_warehouses, backref="assigned_users")
 
 
 class WarehouseModel(Base):
     __tablename__ = "warehouses"
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), nullable=False)
     location = Column(String(200), nullable=False)
     capacity = Column(Integer, nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=utcnow())
+    updated_at = Column(DateTime, server_default=utcnow(), onupdate=utcnow())
 
 
 class ProductModel(Base):
     __tablename__ = "products"
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), nullable=False)
@@ -65,11 +100,13 @@ class ProductModel(Base):
     price = Column(Float, nullable=False)
     packaging_unit = Column(String(50), nullable=True, default="Unidad")  
     units_per_package = Column(Integer, nullable=False, default=1)  
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    sku = Column(String(64), nullable=True, unique=True, index=True)  # Clave natural para sincronizar con el ERP
+    created_at = Column(DateTime, server_default=utcnow())
+    updated_at = Column(DateTime, server_default=utcnow(), onupdate=utcnow())
 
 class InventoryCountModel(Base):
     __tablename__ = "inventory_counts"
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(200), nullable=False)  
@@ -77,26 +114,111 @@ class InventoryCountModel(Base):
     warehouse_id = Column(Integer, ForeignKey("warehouses.id"), nullable=False)
     status = Column(Enum(InventoryCountStatus), default=InventoryCountStatus.IN_PROGRESS, nullable=False)
     created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, server_default=utcnow())
     closed_at = Column(DateTime, nullable=True)
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Control de concurrencia optimista
     
     warehouse = relationship("WarehouseModel")
     creator = relationship("UserModel")
     items = relationship("InventoryItemModel", back_populates="count")
 
+    __table_args__ = (
+        Index("ix_inventory_counts_warehouse_status", "warehouse_id", "status"),
+    )
+
+
+class StockItemModel(Base):
+    """Existencia disponible: una sola fila por producto y bodega"""
+    __tablename__ = "stock_items"
+    __mapper_args__ = {"eager_defaults": True}
+
+    id = Column(Integer, primary_key=True, index=True)
+    warehouse_id = Column(Integer, ForeignKey("warehouses.id"), nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    quantity = Column(Integer, nullable=False, default=0)
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Control de concurrencia optimista
+    created_at = Column(DateTime, server_default=utcnow())
+    updated_at = Column(DateTime, server_default=utcnow(), onupdate=utcnow())
+
+    warehouse = relationship("WarehouseModel")
+    product = relationship("ProductModel")
+
+    __table_args__ = (
+        UniqueConstraint("warehouse_id", "product_id", name="uq_stock_items_warehouse_product"),
+    )
+
 
 class InventoryItemModel(Base):
+    """Línea de un conteo de inventario (la existencia vive en stock_items)"""
     __tablename__ = "inventory_items"
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
-    count_id = Column(Integer, ForeignKey("inventory_counts.id"), nullable=True)  
+    count_id = Column(Integer, ForeignKey("inventory_counts.id"), nullable=False)
     warehouse_id = Column(Integer, ForeignKey("warehouses.id"), nullable=False)
     product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
     packages_count = Column(Integer, nullable=False, default=0)  
     quantity = Column(Integer, nullable=False, default=0)  
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime, server_default=utcnow())
+    updated_at = Column(DateTime, server_default=utcnow(), onupdate=utcnow())
 
     count = relationship("InventoryCountModel", back_populates="items")
     warehouse = relationship("WarehouseModel")
-    product = relationship("ProductModel")
\ No newline at end of file
+    product = relationship("ProductModel")
+
+    __table_args__ = (
+        Index("ix_inventory_items_count_id", "count_id"),
+    )
+
+
+class InventoryCountVarianceModel(Base):
+    """Reporte de diferencias por producto generado al cerrar un conteo"""
+    __tablename__ = "inventory_count_variances"
+
+    id = Column(Integer, primary_key=True, index=True)
+    count_id = Column(Integer, ForeignKey("inventory_counts.id"), nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    counted_quantity = Column(Integer, nullable=False)  # Unidades contadas
+    system_quantity = Column(Integer, nullable=False)  # Existencia antes del cierre
+    variance = Column(Integer, nullable=False)  # counted - system
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    product = relationship("ProductModel")
+
+    __table_args__ = (
+        UniqueConstraint("count_id", "product_id", name="uq_inventory_count_variances_count_product"),
+    )
+
+
+class StockMovementModel(Base):
+    """Libro de movimientos de existencia (solo inserción)"""
+    __tablename__ = "stock_movements"
+
+    id = Column(Integer, primary_key=True)
+    warehouse_id = Column(Integer, ForeignKey("warehouses.id"), nullable=False)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    quantity_delta = Column(Integer, nullable=False)
+    reason = Column(Enum(StockMovementReason), nullable=False)
+    item_id = Column(Integer, nullable=True)  # Fila de stock_items afectada (puede ya no existir)
+    count_id = Column(Integer, ForeignKey("inventory_counts.id"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_stock_movements_warehouse_id_id", "warehouse_id", "id"),
+    )
+
+
+class StockCheckpointModel(Base):
+    """Foto de la existencia de una bodega tomada al cerrar un conteo"""
+    __tablename__ = "stock_checkpoints"
+
+    id = Column(Integer, primary_key=True)
+    warehouse_id = Column(Integer, ForeignKey("warehouses.id"), nullable=False)
+    count_id = Column(Integer, ForeignKey("inventory_counts.id"), nullable=True)
+    last_movement_id = Column(Integer, nullable=False, default=0)  # Último movimiento incluido
+    balances = Column(JSON, nullable=False)  # {product_id: cantidad}
+    taken_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_stock_checkpoints_warehouse_taken_at", "warehouse_id", "taken_at"),
+    )
@@ -0,0 +1,209 @@
+"""
+Caché en memoria del catálogo de productos.
+
+Cada alta de inventario y cada línea de conteo consultan el producto para
+convertir empaques a unidades, y el catálogo cambia muy poco. La caché
+guarda entidades `Product` por id (LRU acotada a `PRODUCT_CACHE_SIZE`, con
+vencimiento a los `PRODUCT_CACHE_TTL` segundos) y `CachedProductRepository`
+la pone delante de `ProductRepository` como lectura a través de la caché.
+
+Invalidación: las escrituras del repositorio (update, delete, upsert_many)
+invalidan al momento y otra vez después del commit de la unidad de
+trabajo. Mientras la transacción está abierta, los productos modificados
+se leen de la base sin poblar la caché, para que nunca quede en ella un
+dato no confirmado. El TTL acota el tiempo en que otro proceso puede ver
+un producto anterior. Con `PRODUCT_CACHE_TTL=0` la caché queda deshabilitada.
+
+Una invalidación (de otra transacción o del bus) puede llegar mientras se
+consultan los faltantes. Cada invalidación cambia la generación de los ids
+afectados (`clear`, la de todos); la lectura a través de la caché la toma
+antes de consultar y `put_many` no guarda los productos cuya generación
+cambió entretanto.
+"""
+import os
+import time
+from collections import OrderedDict
+from dataclasses import replace
+from threading import Lock
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from app.domain.entities.entities import Product
+from app.domain.repositories.repository_interfaces import IProductRepository
+
+PRODUCT_CACHE_TTL = float(os.getenv("PRODUCT_CACHE_TTL", "300"))  # segundos
+PRODUCT_CACHE_SIZE = int(os.getenv("PRODUCT_CACHE_SIZE", "10000"))
+
+
+class ProductCache:
+    """Caché LRU con TTL de productos por id, con contadores de aciertos"""
+
+    def __init__(self, ttl: float = PRODUCT_CACHE_TTL, max_size: int = PRODUCT_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[int, Tuple[float, Product]]" = OrderedDict()
+        # Generación de invalidación: global (clear) y por id (invalidate)
+        self._epoch = 0
+        self._generations: Dict[int, int] = {}
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def get_many(self, product_ids: Iterable[int]) -> Tuple[Dict[int, Product], Set[int]]:
+        """
+        Returns:
+            (productos encontrados, ids que hay que buscar en la base)
+        """
+        found: Dict[int, Product] = {}
+        missing: Set[int] = set()
+        now = time.monotonic()
+        with self._lock:
+            for product_id in product_ids:
+                entry = self._entries.get(product_id)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(product_id)
+                    # Copia: quien la recibe puede modificarla sin tocar la caché
+                    found[product_id] = replace(entry[1])
+                    self.hits += 1
+                else:
+                    if entry is not None:
+                        del self._entries[product_id]
+                    missing.add(product_id)
+                    self.misses += 1
+        return found, missing
+
+    def generation(self, product_ids: Iterable[int]) -> Tuple[int, Dict[int, int]]:
+        """Generación de los ids; se lee antes de consultarlos en la base"""
+        with self._lock:
+            return self._epoch, {product_id: self._generations.get(product_id, 0) for product_id in product_ids}
+
+    def put_many(
+        self,
+        products: Iterable[Product],
+        generation: Optional[Tuple[int, Dict[int, int]]] = None
+    ) -> None:
+        if not self.enabled:
+            return
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            if generation is not None and generation[0] != self._epoch:
+                return
+            for product in products:
+                if generation is not None and generation[1].get(product.id) != self._generations.get(product.id, 0):
+                    # Se invalidó durante la consulta: lo leído puede ser anterior
+                    continue
+                self._entries[product.id] = (expires_at, replace(product))
+                self._entries.move_to_end(product.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, product_ids: Iterable[int]) -> None:
+        with self._lock:
+            for product_id in product_ids:
+                self._entries.pop(product_id, None)
+                self._generations[product_id] = self._generations.get(product_id, 0) + 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._epoch += 1
+            self._generations.clear()
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "ttl_s": self.ttl,
+                "max_size": self.max_size,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+product_cache = ProductCache()
+
+
+class CachedProductRepository(IProductRepository):
+    """Repositorio de productos con lectura a través de la caché"""
+
+    def __init__(
+        self,
+        repository: IProductRepository,
+        cache: ProductCache,
+        after_commit: Callable[[Callable[[], None]], None]
+    ):
+        self.repository = repository
+        self.cache = cache
+        # Registra una acción para después del commit de la unidad de trabajo
+        self._after_commit = after_commit
+        # Productos escritos en esta transacción: no se leen ni guardan en caché
+        self._dirty: Set[int] = set()
+        self._dirty_all = False
+
+    def _written(self, product_ids: Optional[List[int]] = None) -> None:
+        if product_ids is None:
+            self._dirty_all = True
+            self.cache.clear()
+            self._after_commit(self.cache.clear)
+        else:
+            self._dirty.update(product_ids)
+            self.cache.invalidate(product_ids)
+            self._after_commit(lambda: self.cache.invalidate(product_ids))
+
+    def _bypass(self, product_id: int) -> bool:
+        return self._dirty_all or product_id in self._dirty
+
+    async def create(self, product: Product) -> Product:
+        return await self.repository.create(product)
+
+    async def upsert_many(self, products: List[Product]) -> Tuple[int, int]:
+        result = await self.repository.upsert_many(products)
+        # Se sincroniza por sku sin conocer los ids afectados
+        self._written()
+        return result
+
+    async def get_by_id(self, product_id: int) -> Optional[Product]:
+        products = await self.get_many([product_id])
+        return products.get(product_id)
+
+    async def get_many(self, product_ids: Iterable[int]) -> Dict[int, Product]:
+        ids = set(product_ids)
+        if not ids:
+            return {}
+        cacheable = {product_id for product_id in ids if not self._bypass(product_id)}
+        found, missing = self.cache.get_many(cacheable)
+        generation = self.cache.generation(missing)
+        missing |= ids - cacheable
+        if missing:
+            loaded = await self.repository.get_many(missing)
+            self.cache.put_many(
+                (p for product_id, p in loaded.items() if product_id in cacheable), generation
+            )
+            found.update(loaded)
+        return found
+
+    async def get_all(self, skip: int = 0, limit: int = 100, after_id: Optional[int] = None) -> List[Product]:
+        return await self.repository.get_all(skip, limit, after_id)
+
+    async def update(self, product_id: int, product: Product, fields: Optional[Iterable[str]] = None) -> Optional[Product]:
+        updated = await self.repository.update(product_id, product, fields)
+        self._written([product_id])
+        return updated
+
+    async def delete(self, product_id: int) -> bool:
+        deleted = await self.repository.delete(product_id)
+        self._written([product_id])
+        return deleted
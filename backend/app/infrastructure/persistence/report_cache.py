@@ -0,0 +1,112 @@
+"""
+Caché versionada de reportes de inventario (resúmenes por bodega).
+
+Cada bodega tiene un contador de generación que sube con cada escritura de
+existencia confirmada (propia o de otro worker, vía el bus de invalidación).
+Un reporte se guarda ya serializado con la generación vigente al empezar a
+calcularlo y se sirve mientras esa generación no cambie: consultar una
+caché vigente no toca la base ni vuelve a serializar.
+
+- Reporte de una bodega: clave de generación (época, generación de la bodega).
+- Reportes de todas las bodegas: (época, total de escrituras del proceso).
+- La época sube ante cambios que afectan a todas (productos, bodegas, o
+  cuando el bus no puede asegurar qué cambió) e invalida todo.
+
+Tomar la generación antes de leer la base evita guardar como vigente un
+resultado calculado mientras otra transacción confirmaba: esa escritura
+sube la generación y la entrada nace vencida. Las generaciones son locales
+al proceso; no se usan como ETag porque no coinciden entre workers.
+
+Variables de entorno:
+    REPORT_CACHE_SIZE: máximo de reportes guardados (0 deshabilita; por defecto 1000)
+    REPORT_CACHE_WARM_TOP: bodegas con más movimientos recientes a precalentar al iniciar
+"""
+import os
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Dict, Hashable, Optional, Tuple
+
+REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", "1000"))
+REPORT_CACHE_WARM_TOP = int(os.getenv("REPORT_CACHE_WARM_TOP", "10"))
+
+Generation = Tuple[int, int]
+
+
+@dataclass(frozen=True)
+class CachedReport:
+    """Reporte serializado listo para enviar"""
+    body: bytes
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+class ReportCache:
+    """Contadores de generación por bodega y reportes guardados por generación"""
+
+    def __init__(self, max_size: int = REPORT_CACHE_SIZE):
+        self.max_size = max_size
+        self._lock = Lock()
+        self._epoch = 0
+        self._total = 0
+        self._generations: Dict[int, int] = {}
+        self._entries: "OrderedDict[Hashable, Tuple[Generation, CachedReport]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def generation(self, warehouse_id: Optional[int] = None) -> Generation:
+        """Generación de una bodega, o de todas si `warehouse_id` es None"""
+        with self._lock:
+            if warehouse_id is None:
+                return self._epoch, self._total
+            return self._epoch, self._generations.get(warehouse_id, 0)
+
+    def bump(self, warehouse_id: Optional[int] = None) -> None:
+        """Registra una escritura en la bodega; sin bodega invalida todo"""
+        with self._lock:
+            if warehouse_id is None:
+                self._epoch += 1
+                self._entries.clear()
+                return
+            self._generations[warehouse_id] = self._generations.get(warehouse_id, 0) + 1
+            self._total += 1
+
+    def get(self, key: Hashable, generation: Generation) -> Optional[CachedReport]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] != generation:
+                del self._entries[key]
+                self.stale += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, generation: Generation, report: CachedReport) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (generation, report)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.stale
+            return {
+                "max_size": self.max_size,
+                "entries": len(self._entries),
+                "epoch": self._epoch,
+                "warehouses_tracked": len(self._generations),
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+report_cache = ReportCache()
@@ -1,10 +1,29 @@
-from typing import List, Optional
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import Integer, column, exists, func, insert, literal, literal_column, null, select, tuple_, update, values
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from datetime import date, datetime
 from sqlalchemy.orm import selectinload
 from app.domain.entities.entities import User, Product, Warehouse, InventoryItem
+from app.domain.exceptions import VersionConflictError
 from app.domain.repositories.repository_interfaces import IUserRepository, IProductRepository, IWarehouseRepository, IInventoryRepository
-from app.infrastructure.persistence.models import UserModel, ProductModel, WarehouseModel, InventoryItemModel, InventoryCountModel, InventoryCountStatus
+from app.infrastructure.persistence.cache_bus import PRODUCT, STOCK, USER, WAREHOUSE, publish_invalidation
+from app.infrastructure.persistence.models import UserModel, ProductModel, WarehouseModel, InventoryItemModel, InventoryCountModel, InventoryCountStatus, InventoryCountVarianceModel, StockItemModel, StockMovementModel, StockMovementReason, StockCheckpointModel, user_warehouses
+
+
+def paginate(query, model, skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
+    """
+    Aplica paginación ordenada por id. Con `after_id` usa keyset (id > after_id),
+    cuyo costo no crece con la profundidad; sin él conserva offset/limit.
+    """
+    query = query.order_by(model.id)
+    if after_id is not None:
+        return query.where(model.id > after_id).limit(limit)
+    return query.offset(skip).limit(limit)
+
+
+# Máximo de parámetros por sentencia que acepta el protocolo de Postgres (asyncpg)
+MAX_BIND_PARAMS = 32767
 
 
 class UserRepository(IUserRepository):
@@ -13,11 +32,38 @@ class UserRepository(IUserRepository):
         self.session = session
     
     async def create(self, user_model: UserModel) -> UserModel:
+        # id y fechas vuelven en el RETURNING del INSERT (eager_defaults)
         self.session.add(user_model)
-        await self.session.commit()
-        await self.session.refresh(user_model)
+        await self.session.flush()
         return user_model
     
+    async def create_many_skip_existing(self, users: List[dict]) -> List[str]:
+        """
+        Inserta usuarios con INSERT ... ON CONFLICT DO NOTHING. Sin columna de
+        conflicto, Postgres omite la fila ante cualquier índice único
+        (username o email). Cada sentencia lleva las filas que caben en
+        MAX_BIND_PARAMS, sea cual sea el tamaño del bloque recibido.
+
+        Returns:
+            Usernames efectivamente insertados
+        """
+        if not users:
+            return []
+        now = datetime.utcnow()
+        rows = [{**user, "created_at": now, "updated_at": now} for user in users]
+        rows_per_statement = MAX_BIND_PARAMS // len(rows[0])
+        inserted = []
+        for start in range(0, len(rows), rows_per_statement):
+            result = await self.session.execute(
+                pg_insert(UserModel)
+                .values(rows[start:start + rows_per_statement])
+                .on_conflict_do_nothing()
+                .returning(UserModel.username)
+            )
+            inserted.extend(result.scalars().all())
+        await self.session.flush()
+        return inserted
+    
     async def get_by_id(self, user_id: int) -> Optional[UserModel]:
         result = await self.session.execute(select(UserModel).where(UserModel.id == user_id))
         return result.scalar_one_or_none()
@@ -32,39 +78,51 @@ class UserRepository(IUserRepository):
         result = await self.session.execute(select(UserModel).where(UserModel.email == email))
         return result.scalar_one_or_none()
     
-    async def get_all(self, skip: int = 0, limit: int = 100) -> List[UserModel]:
+    async def get_all(self, skip: int = 0, limit: int = 100, after_id: Optional[int] = None) -> List[UserModel]:
         """Obtiene todos los usuarios con paginación"""
-        result = await self.session.execute(select(UserModel).offset(skip).limit(limit))
+        result = await self.session.execute(paginate(select(UserModel), UserModel, skip, limit, after_id))
         return list(result.scalars().all())
     
     async def update(self, user_id: int, user: User) -> UserModel:
-        """Actualiza un usuario existente"""
-        result = await self.session.execute(select(UserModel).where(UserModel.id == user_id))
+        """Actualiza un usuario existente con un solo UPDATE ... RETURNING"""
+        values = {
+            "first_name": user.first_name,
+            "last_name": user.last_name,
+            "email": user.email,
+            "phone": user.phone,
+            "gender": user.gender,
+            "nationality": user.nationality,
+            "nat": user.nat,
+            "username": user.username,
+            "picture_url": user.picture_url
+        }
+        if user.role:
+            from app.infrastructure.persistence.models import UserRole
+            values["role"] = UserRole(user.role)
+        result = await self.session.execute(
+            update(UserModel).where(UserModel.id == user_id).values(**values).returning(UserModel),
+            execution_options={"populate_existing": True}
+        )
         user_model = result.scalar_one_or_none()
         if user_model:
-            user_model.first_name = user.first_name
-            user_model.last_name = user.last_name
-            user_model.email = user.email
-            user_model.phone = user.phone
-            user_model.gender = user.gender
-            user_model.nationality = user.nationality
-            user_model.nat = user.nat
-            user_model.username = user.username
-            user_model.picture_url = user.picture_url
-            if user.role:
-                from app.infrastructure.persistence.models import UserRole
-                user_model.role = UserRole(user.role)
-            await self.session.commit()
-            await self.session.refresh(user_model)
-            return user_model
-        return None
+            publish_invalidation(self.session, USER, user_id)
+        await self.session.flush()
+        return user_model
+    
+    async def update_password(self, user_id: int, hashed_password: str) -> None:
+        """Reemplaza el hash de la contraseña (p. ej. al cambiar el factor de trabajo)"""
+        await self.session.execute(
+            update(UserModel).where(UserModel.id == user_id).values(hashed_password=hashed_password)
+        )
+        await self.session.flush()
     
     async def delete(self, user_id: int) -> bool:
         result = await self.session.execute(select(UserModel).where(UserModel.id == user_id))
         user_model = result.scalar_one_or_none()
         if user_model:
             await self.session.delete(user_model)
-            await self.session.commit()
+            publish_invalidation(self.session, USER, user_id)
+            await self.session.flush()
             return True
         return False
 
@@ -81,11 +139,11 @@ class ProductRepository(IProductRepository):
             description=product.description,
             price=product.price,
             packaging_unit=product.packaging_unit,
-            units_per_package=product.units_per_package
+            units_per_package=product.units_per_package,
+            sku=product.sku
         )
         self.session.add(product_model)
-        await self.session.commit()
-        await self.session.refresh(product_model)
+        await self.session.flush()
         
         return Product(
             id=product_model.id,
@@ -94,10 +152,53 @@ class ProductRepository(IProductRepository):
             price=product_model.price,
             packaging_unit=product_model.packaging_unit,
             units_per_package=product_model.units_per_package,
+            sku=product_model.sku,
             created_at=product_model.created_at,
             updated_at=product_model.updated_at
         )
     
+    async def upsert_many(self, products: List[Product]) -> Tuple[int, int]:
+        """
+        Inserta o actualiza productos por `sku` con un solo
+        INSERT ... ON CONFLICT (sku) DO UPDATE. Las filas idénticas no se tocan.
+
+        Returns:
+            (insertados, actualizados)
+        """
+        if not products:
+            return 0, 0
+        now = datetime.utcnow()
+        stmt = pg_insert(ProductModel).values([
+            {
+                "sku": p.sku,
+                "name": p.name,
+                "description": p.description,
+                "price": p.price,
+                "packaging_unit": p.packaging_unit,
+                "units_per_package": p.units_per_package,
+                "created_at": now,
+                "updated_at": now
+            }
+            for p in products
+        ])
+        synced = ["name", "description", "price", "packaging_unit", "units_per_package"]
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ProductModel.sku],
+            set_={**{c: stmt.excluded[c] for c in synced}, "updated_at": now},
+            where=tuple_(*[ProductModel.__table__.c[c] for c in synced]).is_distinct_from(
+                tuple_(*[stmt.excluded[c] for c in synced])
+            )
+        ).returning(literal_column("xmax = 0").label("inserted"))
+        
+        result = await self.session.execute(stmt)
+        flags = result.scalars().all()
+        inserted = sum(1 for flag in flags if flag)
+        if len(flags) > inserted:
+            # Se sincroniza por sku: se invalidan todos los productos
+            publish_invalidation(self.session, PRODUCT)
+        await self.session.flush()
+        return inserted, len(flags) - inserted
+    
     async def get_by_id(self, product_id: int) -> Optional[Product]:
         result = await self.session.execute(select(ProductModel).where(ProductModel.id == product_id))
         product_model = result.scalar_one_or_none()
@@ -109,13 +210,35 @@ class ProductRepository(IProductRepository):
                 price=product_model.price,
                 packaging_unit=product_model.packaging_unit,
                 units_per_package=product_model.units_per_package,
+                sku=product_model.sku,
                 created_at=product_model.created_at,
                 updated_at=product_model.updated_at
             )
         return None
     
-    async def get_all(self, skip: int = 0, limit: int = 100) -> List[Product]:
-        result = await self.session.execute(select(ProductModel).offset(skip).limit(limit))
+    async def get_many(self, product_ids: Iterable[int]) -> Dict[int, Product]:
+        """Obtiene varios productos en una sola consulta, indexados por id"""
+        ids = set(product_ids)
+        if not ids:
+            return {}
+        result = await self.session.execute(select(ProductModel).where(ProductModel.id.in_(ids)))
+        return {
+            pm.id: Product(
+                id=pm.id,
+                name=pm.name,
+                description=pm.description,
+                price=pm.price,
+                packaging_unit=pm.packaging_unit,
+                units_per_package=pm.units_per_package,
+                sku=pm.sku,
+                created_at=pm.created_at,
+                updated_at=pm.updated_at
+            )
+            for pm in result.scalars().all()
+        }
+    
+    async def get_all(self, skip: int = 0, limit: int = 100, after_id: Optional[int] = None) -> List[Product]:
+        result = await self.session.execute(paginate(select(ProductModel), ProductModel, skip, limit, after_id))
         product_models = result.scalars().all()
         return [
             Product(
@@ -125,23 +248,39 @@ class ProductRepository(IProductRepository):
                 price=pm.price,
                 packaging_unit=pm.packaging_unit,
                 units_per_package=pm.units_per_package,
+                sku=pm.sku,
                 created_at=pm.created_at,
                 updated_at=pm.updated_at
             )
             for pm in product_models
         ]
     
-    async def update(self, product_id: int, product: Product) -> Product:
-        result = await self.session.execute(select(ProductModel).where(ProductModel.id == product_id))
+    UPDATABLE_FIELDS = ("name", "description", "price", "packaging_unit", "units_per_package", "sku")
+    
+    async def update(self, product_id: int, product: Product, fields: Optional[Iterable[str]] = None) -> Optional[Product]:
+        """
+        Actualiza un producto con un solo UPDATE ... RETURNING. Con `fields`
+        solo se escriben esas columnas (un PUT sin `sku` conserva la clave
+        del ERP en lugar de borrarla).
+        """
+        if fields is None:
+            fields = self.UPDATABLE_FIELDS
+        else:
+            sent = set(fields)
+            fields = [field for field in self.UPDATABLE_FIELDS if field in sent]
+        result = await self.session.execute(
+            update(ProductModel)
+            .where(ProductModel.id == product_id)
+            .values({field: getattr(product, field) for field in fields})
+            .returning(ProductModel),
+            execution_options={"populate_existing": True}
+        )
         product_model = result.scalar_one_or_none()
         if product_model:
-            product_model.name = product.name
-            product_model.description = product.description
-            product_model.price = product.price
-            product_model.packaging_unit = product.packaging_unit
-            product_model.units_per_package = product.units_per_package
-            await self.session.commit()
-            await self.session.refresh(product_model)
+            publish_invalidation(self.session, PRODUCT, product_id)
+        await self.session.flush()
+        if not product_model:
+            return None
         
         return Product(
             id=product_model.id,
@@ -150,6 +289,7 @@ class ProductRepository(IProductRepository):
             price=product_model.price,
             packaging_unit=product_model.packaging_unit,
             units_per_package=product_model.units_per_package,
+            sku=product_model.sku,
             created_at=product_model.created_at,
             updated_at=product_model.updated_at
         )
@@ -159,7 +299,8 @@ class ProductRepository(IProductRepository):
         product_model = result.scalar_one_or_none()
         if product_model:
             await self.session.delete(product_model)
-            await self.session.commit()
+            publish_invalidation(self.session, PRODUCT, product_id)
+            await self.session.flush()
             return True
         return False
 
@@ -177,8 +318,9 @@ class WarehouseRepository(IWarehouseRepository):
             capacity=warehouse.capacity
         )
         self.session.add(warehouse_model)
-        await self.session.commit()
-        await self.session.refresh(warehouse_model)
+        await self.session.flush()
+        # Los reportes de todas las bodegas deben incluirla
+        publish_invalidation(self.session, WAREHOUSE, warehouse_model.id)
         
         return Warehouse(
             id=warehouse_model.id,
@@ -203,8 +345,8 @@ class WarehouseRepository(IWarehouseRepository):
             )
         return None
     
-    async def get_all(self, skip: int = 0, limit: int = 100) -> List[Warehouse]:
-        result = await self.session.execute(select(WarehouseModel).offset(skip).limit(limit))
+    async def get_all(self, skip: int = 0, limit: int = 100, after_id: Optional[int] = None) -> List[Warehouse]:
+        result = await self.session.execute(paginate(select(WarehouseModel), WarehouseModel, skip, limit, after_id))
         warehouse_models = result.scalars().all()
         return [
             Warehouse(
@@ -218,15 +360,20 @@ class WarehouseRepository(IWarehouseRepository):
             for wm in warehouse_models
         ]
     
-    async def update(self, warehouse_id: int, warehouse: Warehouse) -> Warehouse:
-        result = await self.session.execute(select(WarehouseModel).where(WarehouseModel.id == warehouse_id))
+    async def update(self, warehouse_id: int, warehouse: Warehouse) -> Optional[Warehouse]:
+        result = await self.session.execute(
+            update(WarehouseModel)
+            .where(WarehouseModel.id == warehouse_id)
+            .values(name=warehouse.name, location=warehouse.location, capacity=warehouse.capacity)
+            .returning(WarehouseModel),
+            execution_options={"populate_existing": True}
+        )
         warehouse_model = result.scalar_one_or_none()
         if warehouse_model:
-            warehouse_model.name = warehouse.name
-            warehouse_model.location = warehouse.location
-            warehouse_model.capacity = warehouse.capacity
-            await self.session.commit()
-            await self.session.refresh(warehouse_model)
+            publish_invalidation(self.session, WAREHOUSE, warehouse_id)
+        await self.session.flush()
+        if not warehouse_model:
+            return None
         
         return Warehouse(
             id=warehouse_model.id,
@@ -241,127 +388,508 @@ class WarehouseRepository(IWarehouseRepository):
         result = await self.session.execute(select(WarehouseModel).where(WarehouseModel.id == warehouse_id))
         warehouse_model = result.scalar_one_or_none()
         if warehouse_model:
+            # Borrarla quita sus asignaciones: cambian los principals de esos usuarios
+            assigned = await self.session.execute(
+                select(user_warehouses.c.user_id).where(user_warehouses.c.warehouse_id == warehouse_id)
+            )
+            for user_id in assigned.scalars():
+                publish_invalidation(self.session, USER, user_id)
             await self.session.delete(warehouse_model)
-            await self.session.commit()
+            publish_invalidation(self.session, WAREHOUSE, warehouse_id)
+            await self.session.flush()
             return True
         return False
 
 class InventoryRepository(IInventoryRepository):
     """Implementación del repositorio de Inventario"""
     
+    # Primer argumento de los advisory locks de existencia por bodega
+    STOCK_LOCK_NAMESPACE = 1
+    
     def __init__(self, session: AsyncSession):
         self.session = session
     
-    async def create(self, inventory_item) -> InventoryItemModel:
-        """Crear nuevo item de inventario (acepta InventoryItemModel directamente)"""
+    async def _lock_stock_writes(self, warehouse_id: int) -> None:
+        """
+        Toma el advisory lock compartido de la bodega antes de cambiar su
+        existencia. Las escrituras no se bloquean entre sí, pero el cierre de
+        un conteo (lock exclusivo) espera a las que están en curso y detiene
+        las nuevas hasta confirmar: así el checkpoint y su último movimiento
+        no dejan afuera movimientos aún sin confirmar.
+        """
+        await self.session.execute(
+            select(func.pg_advisory_xact_lock_shared(self.STOCK_LOCK_NAMESPACE, warehouse_id))
+        )
+    
+    async def _lock_stock_writes_for_items(self, item_ids: List[int]) -> None:
+        """Como `_lock_stock_writes`, para las bodegas de las existencias indicadas"""
+        await self.session.execute(
+            select(func.pg_advisory_xact_lock_shared(self.STOCK_LOCK_NAMESPACE, StockItemModel.warehouse_id))
+            .where(StockItemModel.id.in_(item_ids))
+        )
+    
+    async def _record_movements(self, movements: List[dict]) -> None:
+        """
+        Agrega movimientos al libro dentro de la transacción en curso, junto
+        con el cambio de existencia que los origina, y publica el cambio de
+        generación de las bodegas afectadas (caché de reportes).
+        """
+        for warehouse_id in sorted({m["warehouse_id"] for m in movements}):
+            publish_invalidation(self.session, STOCK, warehouse_id)
+        movements = [m for m in movements if m["quantity_delta"]]
+        if not movements:
+            return
+        now = datetime.utcnow()
+        await self.session.execute(
+            insert(StockMovementModel),
+            [{"item_id": None, "count_id": None, "created_at": now, **m} for m in movements]
+        )
+    
+    @staticmethod
+    def _stock_movement(item, quantity_delta: int, reason: StockMovementReason) -> dict:
+        return {
+            "warehouse_id": item.warehouse_id,
+            "product_id": item.product_id,
+            "item_id": item.id,
+            "quantity_delta": quantity_delta,
+            "reason": reason
+        }
+    
+    @staticmethod
+    def _to_entity(stock_item: StockItemModel) -> InventoryItem:
+        return InventoryItem(
+            id=stock_item.id,
+            warehouse_id=stock_item.warehouse_id,
+            product_id=stock_item.product_id,
+            quantity=stock_item.quantity,
+            version=stock_item.version,
+            created_at=stock_item.created_at,
+            updated_at=stock_item.updated_at
+        )
+    
+    async def create(self, inventory_item: InventoryItemModel) -> InventoryItemModel:
+        """Crear una línea de conteo (acepta InventoryItemModel directamente)"""
         self.session.add(inventory_item)
-        await self.session.commit()
-        await self.session.refresh(inventory_item)
+        await self.session.flush()
         return inventory_item
     
+    async def upsert_stock(
+        self,
+        warehouse_id: int,
+        product_id: int,
+        quantity: int,
+        increment: bool = True
+    ) -> StockItemModel:
+        """
+        Suma (`increment`) o fija la existencia de un producto en una bodega con
+        INSERT ... ON CONFLICT (warehouse_id, product_id) DO UPDATE ... RETURNING.
+        Dos altas concurrentes del mismo producto no pierden unidades ni crean
+        filas duplicadas: la segunda espera el bloqueo de la fila y la actualiza.
+
+        Para fijar la cantidad se necesita la anterior (libro de movimientos):
+        la primera sentencia bloquea la fila sin cambiarla y devuelve su valor.
+        """
+        await self._lock_stock_writes(warehouse_id)
+        now = datetime.utcnow()
+        stmt = pg_insert(StockItemModel).values(
+            warehouse_id=warehouse_id, product_id=product_id, quantity=quantity,
+            created_at=now, updated_at=now
+        )
+        stock = StockItemModel.__table__
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[StockItemModel.warehouse_id, StockItemModel.product_id],
+            set_={
+                "quantity": stock.c.quantity + stmt.excluded.quantity if increment else stock.c.quantity,
+                "version": stock.c.version + 1,
+                "updated_at": now
+            }
+        ).returning(StockItemModel, literal_column("xmax = 0").label("inserted"))
+        stock_item, inserted = (await self.session.execute(
+            stmt, execution_options={"populate_existing": True}
+        )).one()
+        
+        if inserted or increment:
+            quantity_delta = quantity
+            reason = StockMovementReason.RECEIPT if quantity >= 0 else StockMovementReason.ADJUSTMENT
+        else:
+            quantity_delta = quantity - stock_item.quantity
+            reason = StockMovementReason.ADJUSTMENT
+            stock_item = (await self.session.execute(
+                update(StockItemModel)
+                .where(StockItemModel.id == stock_item.id)
+                .values(quantity=quantity, updated_at=now)
+                .returning(StockItemModel)
+                .execution_options(synchronize_session=False, populate_existing=True)
+            )).scalar_one()
+        
+        await self._record_movements([self._stock_movement(stock_item, quantity_delta, reason)])
+        await self.session.flush()
+        return stock_item
+    
+    async def create_many(self, rows: List[dict]) -> List[InventoryItemModel]:
+        """
+        Inserta varias líneas de conteo en una sola transacción con INSERT
+        multi-fila y devuelve las filas creadas en el mismo orden recibido.
+        """
+        if not rows:
+            return []
+        result = await self.session.execute(
+            insert(InventoryItemModel).returning(InventoryItemModel, sort_by_parameter_order=True),
+            rows
+        )
+        created = list(result.scalars().all())
+        await self.session.flush()
+        return created
+    
+    async def bulk_insert_items(self, rows: List[dict]) -> int:
+        """Inserta líneas de conteo en bloque sin devolver las filas (cargas masivas)"""
+        if not rows:
+            return 0
+        await self.session.execute(insert(InventoryItemModel), rows)
+        await self.session.flush()
+        return len(rows)
+    
     async def get_by_warehouse_and_product(self, warehouse_id: int, product_id: int) -> Optional[InventoryItem]:
+        """Existencia de un producto en una bodega (a lo sumo una fila por la clave única)"""
         result = await self.session.execute(
-            select(InventoryItemModel).where(
-                (InventoryItemModel.warehouse_id == warehouse_id) &
-                (InventoryItemModel.product_id == product_id)
+            select(StockItemModel).where(
+                (StockItemModel.warehouse_id == warehouse_id) &
+                (StockItemModel.product_id == product_id)
             )
         )
-        item_model = result.scalar_one_or_none()
-        if item_model:
-            return InventoryItem(
-                id=item_model.id,
-                warehouse_id=item_model.warehouse_id,
-                product_id=item_model.product_id,
-                quantity=item_model.quantity,
-                created_at=item_model.created_at,
-                updated_at=item_model.updated_at
-            )
+        stock_item = result.scalar_one_or_none()
+        if stock_item:
+            return self._to_entity(stock_item)
         return None
     
     async def get_by_warehouse(self, warehouse_id: int, skip: int = 0, limit: int = 100) -> List[InventoryItem]:
         result = await self.session.execute(
-            select(InventoryItemModel)
-            .where(InventoryItemModel.warehouse_id == warehouse_id)
+            select(StockItemModel)
+            .where(StockItemModel.warehouse_id == warehouse_id)
+            .order_by(StockItemModel.id)
             .offset(skip)
             .limit(limit)
         )
-        items = result.scalars().all()
-        return [
-            InventoryItem(
-                id=item.id,
-                warehouse_id=item.warehouse_id,
-                product_id=item.product_id,
-                quantity=item.quantity,
-                created_at=item.created_at,
-                updated_at=item.updated_at
-            )
-            for item in items
-        ]
+        return [self._to_entity(item) for item in result.scalars().all()]
+    
+    async def get_warehouse_inventory(
+        self,
+        warehouse_id: Optional[int] = None,
+        after_id: Optional[int] = None,
+        limit: Optional[int] = None
+    ) -> List[Tuple[Warehouse, List[Tuple[InventoryItem, Product]]]]:
+        """
+        Obtiene bodegas con su existencia y productos en una sola consulta,
+        agrupados por bodega. Las bodegas sin existencia se incluyen con lista vacía.
+        `after_id`/`limit` paginan por bodega (keyset sobre warehouses.id).
+        """
+        query = (
+            select(WarehouseModel, StockItemModel, ProductModel)
+            .outerjoin(StockItemModel, StockItemModel.warehouse_id == WarehouseModel.id)
+            .outerjoin(ProductModel, ProductModel.id == StockItemModel.product_id)
+            .order_by(WarehouseModel.id, StockItemModel.id)
+        )
+        if warehouse_id is not None:
+            query = query.where(WarehouseModel.id == warehouse_id)
+        if limit is not None:
+            page_ids = paginate(select(WarehouseModel.id), WarehouseModel, 0, limit, after_id)
+            query = query.where(WarehouseModel.id.in_(page_ids.scalar_subquery()))
+        elif after_id is not None:
+            query = query.where(WarehouseModel.id > after_id)
+        
+        result = await self.session.execute(query)
+        
+        grouped: List[Tuple[Warehouse, List[Tuple[InventoryItem, Product]]]] = []
+        current_id = None
+        for wm, item, pm in result.all():
+            if wm.id != current_id:
+                current_id = wm.id
+                grouped.append((
+                    Warehouse(
+                        id=wm.id,
+                        name=wm.name,
+                        location=wm.location,
+                        capacity=wm.capacity,
+                        created_at=wm.created_at,
+                        updated_at=wm.updated_at
+                    ),
+                    []
+                ))
+            if item is None or pm is None:
+                continue
+            grouped[-1][1].append((
+                self._to_entity(item),
+                Product(
+                    id=pm.id,
+                    name=pm.name,
+                    description=pm.description,
+                    price=pm.price,
+                    packaging_unit=pm.packaging_unit,
+                    units_per_package=pm.units_per_package,
+                    sku=pm.sku,
+                    created_at=pm.created_at,
+                    updated_at=pm.updated_at
+                )
+            ))
+        return grouped
     
-    async def get_all(self, skip: int = 0, limit: int = 100) -> List[InventoryItem]:
+    async def get_busiest_warehouse_ids(self, limit: int, window: int = 10000) -> List[int]:
+        """
+        Bodegas con más movimientos entre los últimos `window` del libro, de
+        mayor a menor. Recorre solo el final del índice de la clave primaria.
+        """
+        recent = (
+            select(StockMovementModel.warehouse_id)
+            .order_by(StockMovementModel.id.desc())
+            .limit(window)
+            .subquery()
+        )
         result = await self.session.execute(
-            select(InventoryItemModel)
-            .offset(skip)
+            select(recent.c.warehouse_id)
+            .group_by(recent.c.warehouse_id)
+            .order_by(func.count().desc(), recent.c.warehouse_id)
             .limit(limit)
         )
-        items = result.scalars().all()
-        return [
-            InventoryItem(
-                id=item.id,
-                warehouse_id=item.warehouse_id,
-                product_id=item.product_id,
-                quantity=item.quantity,
-                created_at=item.created_at,
-                updated_at=item.updated_at
+        return list(result.scalars().all())
+    
+    async def stream_inventory_rows(
+        self,
+        warehouse_ids: Optional[List[int]] = None,
+        batch_size: int = 1000
+    ) -> AsyncIterator[List[dict]]:
+        """
+        Recorre la existencia con un cursor del lado del servidor y entrega
+        lotes de `batch_size` filas, sin materializar el resultado completo.
+        Mantiene las columnas count_id y packages_count del formato anterior.
+        """
+        query = (
+            select(
+                StockItemModel.id.label("item_id"),
+                null().label("count_id"),
+                StockItemModel.warehouse_id,
+                WarehouseModel.name.label("warehouse_name"),
+                StockItemModel.product_id,
+                ProductModel.name.label("product_name"),
+                literal(0).label("packages_count"),
+                StockItemModel.quantity,
+                StockItemModel.version
             )
-            for item in items
-        ]
+            .join(WarehouseModel, WarehouseModel.id == StockItemModel.warehouse_id)
+            .join(ProductModel, ProductModel.id == StockItemModel.product_id)
+            .order_by(StockItemModel.id)
+            .execution_options(yield_per=batch_size)
+        )
+        if warehouse_ids is not None:
+            query = query.where(StockItemModel.warehouse_id.in_(warehouse_ids))
+        
+        result = await self.session.stream(query)
+        async for partition in result.mappings().partitions(batch_size):
+            yield [dict(row) for row in partition]
+    
+    async def get_all(self, skip: int = 0, limit: int = 100, after_id: Optional[int] = None) -> List[InventoryItem]:
+        result = await self.session.execute(
+            paginate(select(StockItemModel), StockItemModel, skip, limit, after_id)
+        )
+        return [self._to_entity(item) for item in result.scalars().all()]
     
     async def update(self, inventory_id: int, inventory_item: InventoryItem) -> InventoryItem:
         result = await self.session.execute(
-            select(InventoryItemModel).where(InventoryItemModel.id == inventory_id)
+            select(StockItemModel).where(StockItemModel.id == inventory_id)
         )
         existing_item = result.scalar_one_or_none()
         if existing_item:
+            await self._lock_stock_writes(existing_item.warehouse_id)
+            previous_quantity = existing_item.quantity
             existing_item.quantity = inventory_item.quantity
+            existing_item.version = existing_item.version + 1
             self.session.add(existing_item)
-            await self.session.commit()
-            await self.session.refresh(existing_item)
+            await self._record_movements([
+                self._stock_movement(
+                    existing_item,
+                    existing_item.quantity - previous_quantity,
+                    StockMovementReason.RECEIPT
+                    if existing_item.quantity > previous_quantity
+                    else StockMovementReason.ADJUSTMENT
+                )
+            ])
+            # version y updated_at vuelven en el RETURNING del UPDATE (eager_defaults)
+            await self.session.flush()
             
-            return InventoryItem(
-                id=existing_item.id,
-                warehouse_id=existing_item.warehouse_id,
-                product_id=existing_item.product_id,
-                quantity=existing_item.quantity,
-                created_at=existing_item.created_at,
-                updated_at=existing_item.updated_at
-            )
+            return self._to_entity(existing_item)
         raise ValueError(f"Inventory item with id {inventory_id} not found")
     
+    async def update_quantity(
+        self,
+        inventory_id: int,
+        quantity: int,
+        expected_version: Optional[int] = None
+    ) -> Optional[StockItemModel]:
+        """
+        Actualiza la cantidad de una existencia con un único UPDATE ... RETURNING
+        por clave primaria e incrementa su versión. La subconsulta devuelve la
+        cantidad anterior para registrar la diferencia en el libro de movimientos.
+
+        Con `expected_version` la actualización es condicional
+        (WHERE version = :v) y no toma bloqueos previos: misma versión implica
+        misma cantidad, y si otra transacción cambió la fila, PostgreSQL
+        reevalúa la condición sobre la fila nueva y no actualiza.
+
+        Raises:
+            VersionConflictError: Si la fila existe con otra versión
+        """
+        await self._lock_stock_writes_for_items([inventory_id])
+        previous = (
+            select(StockItemModel.id, StockItemModel.quantity.label("previous_quantity"))
+            .where(StockItemModel.id == inventory_id)
+        )
+        conditions = []
+        if expected_version is None:
+            # Escritura incondicional: se bloquea la fila para leer la cantidad anterior
+            previous = previous.with_for_update()
+        else:
+            conditions.append(StockItemModel.version == expected_version)
+        previous = previous.subquery()
+        result = await self.session.execute(
+            update(StockItemModel)
+            .where(StockItemModel.id == previous.c.id, *conditions)
+            .values(quantity=quantity, version=StockItemModel.version + 1, updated_at=datetime.utcnow())
+            .returning(StockItemModel, previous.c.previous_quantity)
+            .execution_options(synchronize_session=False)
+        )
+        row = result.one_or_none()
+        if row is None:
+            current_version = None
+            if expected_version is not None:
+                current_version = (await self.session.execute(
+                    select(StockItemModel.version).where(StockItemModel.id == inventory_id)
+                )).scalar_one_or_none()
+            if current_version is not None:
+                raise VersionConflictError("Inventory item", inventory_id, current_version)
+            return None
+        stock_item, previous_quantity = row
+        await self._record_movements([
+            self._stock_movement(stock_item, quantity - previous_quantity, StockMovementReason.ADJUSTMENT)
+        ])
+        await self.session.flush()
+        return stock_item
+    
+    async def update_quantities(self, changes: List[dict]) -> List[dict]:
+        """
+        Aplica varias actualizaciones condicionales (id, quantity,
+        expected_version) con un solo UPDATE ... FROM (VALUES ...).
+        Cada cambio se aplica solo si la versión coincide; los demás no
+        afectan al resto del lote.
+
+        Returns:
+            Un resultado por cambio, en el orden recibido: status "updated",
+            "conflict" (con la cantidad y versión actuales para reintentar)
+            o "not_found"
+        """
+        if not changes:
+            return []
+        await self._lock_stock_writes_for_items([c["id"] for c in changes])
+        requested = values(
+            column("id", Integer),
+            column("quantity", Integer),
+            column("expected_version", Integer),
+            name="requested"
+        ).data([(c["id"], c["quantity"], c["expected_version"]) for c in changes])
+        previous = (
+            select(
+                StockItemModel.id,
+                StockItemModel.quantity.label("previous_quantity"),
+                requested.c.quantity.label("new_quantity"),
+                requested.c.expected_version
+            )
+            .join(requested, requested.c.id == StockItemModel.id)
+            .subquery()
+        )
+        result = await self.session.execute(
+            update(StockItemModel)
+            .where(
+                StockItemModel.id == previous.c.id,
+                StockItemModel.version == previous.c.expected_version
+            )
+            .values(
+                quantity=previous.c.new_quantity,
+                version=StockItemModel.version + 1,
+                updated_at=datetime.utcnow()
+            )
+            .returning(StockItemModel, previous.c.previous_quantity)
+            .execution_options(synchronize_session=False)
+        )
+        updated = {stock_item.id: (stock_item, previous_quantity) for stock_item, previous_quantity in result.all()}
+        
+        missing_ids = [c["id"] for c in changes if c["id"] not in updated]
+        current = {}
+        if missing_ids:
+            rows = await self.session.execute(
+                select(StockItemModel.id, StockItemModel.quantity, StockItemModel.version)
+                .where(StockItemModel.id.in_(missing_ids))
+            )
+            current = {row.id: row for row in rows}
+        
+        await self._record_movements([
+            self._stock_movement(stock_item, stock_item.quantity - previous_quantity, StockMovementReason.ADJUSTMENT)
+            for stock_item, previous_quantity in updated.values()
+        ])
+        await self.session.flush()
+        
+        results = []
+        for change in changes:
+            item_id = change["id"]
+            if item_id in updated:
+                stock_item = updated[item_id][0]
+                results.append({"id": item_id, "status": "updated",
+                                "quantity": stock_item.quantity, "version": stock_item.version})
+            elif item_id in current:
+                row = current[item_id]
+                results.append({"id": item_id, "status": "conflict",
+                                "quantity": row.quantity, "version": row.version})
+            else:
+                results.append({"id": item_id, "status": "not_found", "quantity": None, "version": None})
+        return results
+    
     async def delete(self, inventory_id: int) -> bool:
         result = await self.session.execute(
-            select(InventoryItemModel).where(InventoryItemModel.id == inventory_id)
+            select(StockItemModel).where(StockItemModel.id == inventory_id)
         )
-        item_model = result.scalar_one_or_none()
-        if item_model:
-            await self.session.delete(item_model)
-            await self.session.commit()
+        stock_item = result.scalar_one_or_none()
+        if stock_item:
+            await self._lock_stock_writes(stock_item.warehouse_id)
+            await self._record_movements([
+                self._stock_movement(stock_item, -stock_item.quantity, StockMovementReason.REMOVAL)
+            ])
+            await self.session.delete(stock_item)
+            await self.session.flush()
             return True
         return False
     
-    async def get_by_id(self, inventory_id: int) -> Optional[InventoryItemModel]:
-        """Obtiene un item de inventario por ID"""
+    async def get_by_id(self, inventory_id: int) -> Optional[StockItemModel]:
+        """Obtiene una fila de existencia por ID"""
         result = await self.session.execute(
-            select(InventoryItemModel).where(InventoryItemModel.id == inventory_id)
+            select(StockItemModel).where(StockItemModel.id == inventory_id)
         )
         return result.scalar_one_or_none()
     
+    async def get_many(self, inventory_ids: Iterable[int]) -> Dict[int, StockItemModel]:
+        """Obtiene varias filas de existencia por ID en una sola consulta"""
+        ids = list(set(inventory_ids))
+        if not ids:
+            return {}
+        result = await self.session.execute(
+            select(StockItemModel).where(StockItemModel.id.in_(ids))
+        )
+        return {item.id: item for item in result.scalars().all()}
+    
     # Métodos para conteos de inventario
     async def create_count(self, count: InventoryCountModel) -> InventoryCountModel:
-        """Crea un nuevo conteo de inventario"""
+        """
+        Crea un nuevo conteo de inventario. Las relaciones (bodega, creador)
+        no se cargan: quien las necesite las consulta por su id.
+        """
         self.session.add(count)
-        await self.session.commit()
-        await self.session.refresh(count, ['warehouse', 'creator'])
+        await self.session.flush()
         return count
     
     async def get_count_by_id(self, count_id: int) -> Optional[InventoryCountModel]:
@@ -377,25 +905,326 @@ class InventoryRepository(IInventoryRepository):
         )
         return result.scalar_one_or_none()
     
-    async def get_counts(self, warehouse_id: Optional[int] = None, status: Optional[str] = None) -> List[InventoryCountModel]:
-        query = select(InventoryCountModel).options(
-            selectinload(InventoryCountModel.warehouse),
-            selectinload(InventoryCountModel.creator),
-            selectinload(InventoryCountModel.items)
+    async def get_count_header(
+        self,
+        count_id: int,
+        lock: Optional[str] = None,
+        with_relations: bool = False
+    ) -> Optional[InventoryCountModel]:
+        """
+        Obtiene un conteo sin cargar sus items (para validar estado y permisos)
+
+        Args:
+            lock: "share" bloquea el conteo contra un cierre concurrente mientras
+                se agregan items; "update" lo bloquea en exclusiva para cerrarlo
+            with_relations: carga bodega y usuario creador
+        """
+        query = select(InventoryCountModel).where(InventoryCountModel.id == count_id)
+        if with_relations:
+            query = query.options(
+                selectinload(InventoryCountModel.warehouse),
+                selectinload(InventoryCountModel.creator)
+            )
+        if lock == "share":
+            query = query.with_for_update(read=True)
+        elif lock == "update":
+            query = query.with_for_update()
+        result = await self.session.execute(query)
+        return result.scalar_one_or_none()
+    
+    async def close_and_reconcile_count(self, count: InventoryCountModel, closed_at: datetime) -> dict:
+        """
+        Cierra el conteo y lleva lo contado a la existencia de la bodega en una
+        sola transacción, con sentencias sobre conjuntos:
+
+        0. Toma el advisory lock exclusivo de la bodega: espera a las escrituras
+           de existencia en curso y detiene las nuevas hasta confirmar el cierre
+        1. Bloquea las filas de existencia (stock_items) de los productos contados
+        2. Guarda el reporte de diferencias (contado - sistema) por producto
+        3. Ajusta la existencia existente sumando la diferencia
+        4. Crea la existencia de productos contados que no tenían fila
+        5. Registra las diferencias en el libro de movimientos
+        6. Guarda una foto de la existencia de la bodega (checkpoint)
+        7. Marca el conteo como cerrado
+
+        Se espera que el conteo ya esté bloqueado con get_count_header(lock="update").
+        Solo se ajustan los productos presentes en el conteo.
+        """
+        counted = (
+            select(
+                InventoryItemModel.product_id,
+                func.sum(InventoryItemModel.quantity).label("quantity")
+            )
+            .where(InventoryItemModel.count_id == count.id)
+            .group_by(InventoryItemModel.product_id)
+            .subquery()
+        )
+        
+        totals = (await self.session.execute(
+            select(func.count(InventoryItemModel.id), func.coalesce(func.sum(InventoryItemModel.quantity), 0))
+            .where(InventoryItemModel.count_id == count.id)
+        )).one()
+        
+        await self.session.execute(
+            select(func.pg_advisory_xact_lock(self.STOCK_LOCK_NAMESPACE, count.warehouse_id))
+        )
+        await self.session.execute(
+            select(StockItemModel.id)
+            .where(
+                StockItemModel.warehouse_id == count.warehouse_id,
+                StockItemModel.product_id.in_(select(counted.c.product_id))
+            )
+            .with_for_update()
+        )
+        
+        system_quantity = func.coalesce(StockItemModel.quantity, 0)
+        await self.session.execute(
+            insert(InventoryCountVarianceModel).from_select(
+                ["count_id", "product_id", "counted_quantity", "system_quantity", "variance", "created_at"],
+                select(
+                    literal(count.id),
+                    counted.c.product_id,
+                    counted.c.quantity,
+                    system_quantity,
+                    counted.c.quantity - system_quantity,
+                    literal(closed_at)
+                ).select_from(
+                    counted.outerjoin(
+                        StockItemModel,
+                        (StockItemModel.product_id == counted.c.product_id) &
+                        (StockItemModel.warehouse_id == count.warehouse_id)
+                    )
+                )
+            )
+        )
+        
+        variance = InventoryCountVarianceModel
+        updated = await self.session.execute(
+            update(StockItemModel)
+            .where(
+                StockItemModel.warehouse_id == count.warehouse_id,
+                StockItemModel.product_id == variance.product_id,
+                variance.count_id == count.id,
+                variance.variance != 0
+            )
+            .values(
+                quantity=StockItemModel.quantity + variance.variance,
+                version=StockItemModel.version + 1,
+                updated_at=closed_at
+            )
+            .execution_options(synchronize_session=False)
+        )
+        
+        inserted = await self.session.execute(
+            insert(StockItemModel).from_select(
+                ["warehouse_id", "product_id", "quantity", "created_at", "updated_at"],
+                select(
+                    literal(count.warehouse_id),
+                    variance.product_id,
+                    variance.counted_quantity,
+                    literal(closed_at),
+                    literal(closed_at)
+                ).where(
+                    variance.count_id == count.id,
+                    variance.variance != 0,
+                    ~exists().where(
+                        StockItemModel.warehouse_id == count.warehouse_id,
+                        StockItemModel.product_id == variance.product_id
+                    )
+                )
+            )
+        )
+        
+        await self.session.execute(
+            insert(StockMovementModel).from_select(
+                ["warehouse_id", "product_id", "quantity_delta", "reason", "count_id", "created_at"],
+                select(
+                    literal(count.warehouse_id),
+                    variance.product_id,
+                    variance.variance,
+                    literal(StockMovementReason.COUNT_CLOSE, StockMovementModel.reason.type),
+                    literal(count.id),
+                    literal(closed_at)
+                ).where(variance.count_id == count.id, variance.variance != 0)
+            )
+        )
+        await self._create_checkpoint(count.warehouse_id, count.id, closed_at)
+        publish_invalidation(self.session, STOCK, count.warehouse_id)
+        
+        await self.session.execute(
+            update(InventoryCountModel)
+            .where(InventoryCountModel.id == count.id)
+            .values(
+                status=InventoryCountStatus.CLOSED,
+                closed_at=closed_at,
+                version=InventoryCountModel.version + 1
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.flush()
+        
+        count.status = InventoryCountStatus.CLOSED
+        count.closed_at = closed_at
+        count.version = count.version + 1
+        return {
+            "items_count": totals[0],
+            "total_units": totals[1],
+            "adjusted_products": updated.rowcount + inserted.rowcount
+        }
+    
+    async def _create_checkpoint(self, warehouse_id: int, count_id: Optional[int], taken_at: datetime) -> None:
+        """
+        Guarda la existencia actual de la bodega y el último movimiento que incluye
+
+        Requiere el advisory lock exclusivo de la bodega: sin él, un movimiento
+        con id menor aún sin confirmar quedaría fuera del checkpoint y también
+        de los movimientos posteriores a `last_movement_id`.
+        """
+        last_movement_id = (await self.session.execute(
+            select(func.coalesce(func.max(StockMovementModel.id), 0))
+            .where(StockMovementModel.warehouse_id == warehouse_id)
+        )).scalar_one()
+        balances = await self.session.execute(
+            select(StockItemModel.product_id, StockItemModel.quantity)
+            .where(StockItemModel.warehouse_id == warehouse_id)
+        )
+        self.session.add(StockCheckpointModel(
+            warehouse_id=warehouse_id,
+            count_id=count_id,
+            last_movement_id=last_movement_id,
+            # Claves como texto: así quedan al serializar a JSON
+            balances={str(product_id): quantity for product_id, quantity in balances if quantity},
+            taken_at=taken_at
+        ))
+    
+    async def get_stock_as_of(
+        self,
+        warehouse_id: int,
+        as_of: datetime
+    ) -> Tuple[Optional[StockCheckpointModel], Dict[int, int], int]:
+        """
+        Existencia de una bodega en un instante: parte del checkpoint más
+        cercano anterior a `as_of` y suma solo los movimientos posteriores a él
+        (rango sobre el índice warehouse_id, id).
+
+        Returns:
+            (checkpoint usado o None, {product_id: cantidad}, movimientos aplicados)
+        """
+        checkpoint = (await self.session.execute(
+            select(StockCheckpointModel)
+            .where(StockCheckpointModel.warehouse_id == warehouse_id, StockCheckpointModel.taken_at <= as_of)
+            .order_by(StockCheckpointModel.taken_at.desc(), StockCheckpointModel.id.desc())
+            .limit(1)
+        )).scalar_one_or_none()
+        
+        balances: Dict[int, int] = {}
+        last_movement_id = 0
+        if checkpoint:
+            balances = {int(product_id): quantity for product_id, quantity in checkpoint.balances.items()}
+            last_movement_id = checkpoint.last_movement_id
+        
+        deltas = await self.session.execute(
+            select(
+                StockMovementModel.product_id,
+                func.sum(StockMovementModel.quantity_delta),
+                func.count(StockMovementModel.id)
+            )
+            .where(
+                StockMovementModel.warehouse_id == warehouse_id,
+                StockMovementModel.id > last_movement_id,
+                StockMovementModel.created_at <= as_of
+            )
+            .group_by(StockMovementModel.product_id)
+        )
+        replayed = 0
+        for product_id, delta, movements in deltas:
+            balances[product_id] = balances.get(product_id, 0) + delta
+            replayed += movements
+        
+        return checkpoint, {p: q for p, q in sorted(balances.items()) if q}, replayed
+    
+    async def get_count_variances(self, count_id: int) -> List[InventoryCountVarianceModel]:
+        """Obtiene el reporte de diferencias de un conteo cerrado"""
+        result = await self.session.execute(
+            select(InventoryCountVarianceModel)
+            .options(selectinload(InventoryCountVarianceModel.product))
+            .where(InventoryCountVarianceModel.count_id == count_id)
+            .order_by(InventoryCountVarianceModel.product_id)
+        )
+        return list(result.scalars().all())
+    
+    async def get_counts(
+        self,
+        warehouse_id: Optional[int] = None,
+        status: Optional[str] = None,
+        warehouse_ids: Optional[List[int]] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        before_id: Optional[int] = None,
+        limit: int = 50
+    ) -> List[Tuple[InventoryCountModel, str, str, int, int]]:
+        """
+        Lista conteos (más recientes primero) con nombre de bodega, usuario creador,
+        cantidad de líneas y unidades totales. Los agregados se calculan con
+        subconsultas correlacionadas sobre el índice de count_id, así el costo
+        depende del tamaño de la página y no del historial de items.
+        """
+        items_count = (
+            select(func.count(InventoryItemModel.id))
+            .where(InventoryItemModel.count_id == InventoryCountModel.id)
+            .scalar_subquery()
+        )
+        total_units = (
+            select(func.coalesce(func.sum(InventoryItemModel.quantity), 0))
+            .where(InventoryItemModel.count_id == InventoryCountModel.id)
+            .scalar_subquery()
+        )
+        query = (
+            select(
+                InventoryCountModel,
+                WarehouseModel.name,
+                UserModel.username,
+                items_count,
+                total_units
+            )
+            .join(WarehouseModel, WarehouseModel.id == InventoryCountModel.warehouse_id)
+            .join(UserModel, UserModel.id == InventoryCountModel.created_by)
+            .order_by(InventoryCountModel.id.desc())
+            .limit(limit)
         )
         
         if warehouse_id:
             query = query.where(InventoryCountModel.warehouse_id == warehouse_id)
         
+        if warehouse_ids is not None:
+            query = query.where(InventoryCountModel.warehouse_id.in_(warehouse_ids))
+        
         if status:
             query = query.where(InventoryCountModel.status == InventoryCountStatus(status))
         
+        if date_from:
+            query = query.where(InventoryCountModel.cut_off_date >= date_from)
+        
+        if date_to:
+            query = query.where(InventoryCountModel.cut_off_date <= date_to)
+        
+        if before_id is not None:
+            query = query.where(InventoryCountModel.id < before_id)
+        
         result = await self.session.execute(query)
-        return list(result.scalars().all())
+        return [tuple(row) for row in result.all()]
     
-    async def update_count(self, count: InventoryCountModel) -> InventoryCountModel:
-        """Actualiza un conteo existente"""
+    async def update_count(
+        self,
+        count: InventoryCountModel,
+        relations: Optional[List[str]] = None
+    ) -> InventoryCountModel:
+        """
+        Actualiza un conteo existente. Solo recarga las relaciones indicadas
+        en `relations` (p. ej. ['warehouse', 'creator']).
+        """
         self.session.add(count)
-        await self.session.commit()
-        await self.session.refresh(count, ['warehouse', 'creator', 'items'])
+        await self.session.flush()
+        if relations:
+            await self.session.refresh(count, relations)
         return count
\ No newline at end of file
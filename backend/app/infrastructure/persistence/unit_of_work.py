@@ -0,0 +1,76 @@
+"""
+Unidad de trabajo: una sesión y una transacción por request.
+
+Los repositorios solo hacen `flush` (los cambios quedan enviados a la base
+dentro de la transacción, con sus ids y defaults disponibles) y la unidad
+de trabajo confirma todo junto con un único `commit` al final. Si algo
+falla antes, nada de lo hecho en el request queda guardado.
+
+En las rutas se obtiene con `Depends(get_uow)` y se confirma con
+`await uow.commit()` antes de responder: el cierre de las dependencias con
+`yield` corre después de enviar la respuesta, por lo que un commit ahí
+podría fallar con el cliente ya informado de un éxito. Lo que la ruta no
+confirma se descarta al cerrar.
+
+Fuera de FastAPI (scripts, benchmarks) se usa como context manager, que
+confirma al salir sin errores y revierte si hubo una excepción:
+
+    async with UnitOfWork(session) as uow:
+        await AddInventoryItemUseCase(uow.inventory, uow.products, uow.warehouses).execute(dto)
+"""
+from typing import AsyncIterator, Callable, List
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.infrastructure.persistence.cache_bus import send_pending_invalidations
+from app.infrastructure.persistence.database import AsyncSessionLocal
+from app.infrastructure.persistence.product_cache import CachedProductRepository, product_cache
+from app.infrastructure.persistence.repositories import (
+    UserRepository, ProductRepository, WarehouseRepository, InventoryRepository
+)
+
+
+class UnitOfWork:
+    """Agrupa los repositorios de un request sobre la misma transacción"""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self._after_commit: List[Callable[[], None]] = []
+        self.users = UserRepository(session)
+        self.products = CachedProductRepository(ProductRepository(session), product_cache, self.after_commit)
+        self.warehouses = WarehouseRepository(session)
+        self.inventory = InventoryRepository(session)
+
+    def after_commit(self, action: Callable[[], None]) -> None:
+        """Agenda una acción (p. ej. invalidar una caché) para después del commit"""
+        self._after_commit.append(action)
+
+    async def commit(self) -> None:
+        # Los avisos de invalidación viajan juntos, en la misma transacción
+        await send_pending_invalidations(self.session)
+        await self.session.commit()
+        actions, self._after_commit = self._after_commit, []
+        for action in actions:
+            action()
+
+    async def rollback(self) -> None:
+        await self.session.rollback()
+        self._after_commit = []
+
+    async def __aenter__(self) -> "UnitOfWork":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            await self.commit()
+        else:
+            await self.rollback()
+
+
+async def get_uow() -> AsyncIterator[UnitOfWork]:
+    """Dependencia de FastAPI: una unidad de trabajo por request"""
+    async with AsyncSessionLocal() as session:
+        uow = UnitOfWork(session)
+        try:
+            yield uow
+        finally:
+            # Descarta lo que la ruta no confirmó (error o respuesta anticipada)
+            await uow.rollback()
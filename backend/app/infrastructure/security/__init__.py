@@ -1,16 +1,24 @@
 """
 Módulo de seguridad - JWT y autenticación
 """
-from app.infrastructure.security.password import hash_password, verify_password
+from app.infrastructure.security.password import (
+    hash_password, verify_password, hash_password_async, verify_password_async, needs_rehash
+)
 from app.infrastructure.security.jwt_handler import create_access_token, decode_access_token
 from app.infrastructure.security.dependencies import get_current_user, require_admin, get_current_user_optional
+from app.infrastructure.security.principal_cache import Principal, principal_cache
 
 __all__ = [
     "hash_password",
     "verify_password",
+    "hash_password_async",
+    "verify_password_async",
+    "needs_rehash",
     "create_access_token",
     "decode_access_token",
     "get_current_user",
     "require_admin",
-    "get_current_user_optional"
+    "get_current_user_optional",
+    "Principal",
+    "principal_cache"
 ]
@@ -3,29 +3,33 @@ Dependencias de seguridad para FastAPI
 """
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
-from app.infrastructure.persistence.database import get_db
-from app.infrastructure.persistence.repositories import UserRepository
+from app.infrastructure.persistence.unit_of_work import UnitOfWork, get_uow
 from app.infrastructure.security.jwt_handler import decode_access_token
 from app.infrastructure.persistence.models import UserRole
+from app.infrastructure.security.principal_cache import Principal, principal_cache
 
 security = HTTPBearer()
 
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    session: AsyncSession = Depends(get_db)
-):
+    uow: UnitOfWork = Depends(get_uow)
+) -> Principal:
     """
     Obtiene el usuario actual desde el token JWT
     
+    Si el principal está en caché no se consulta la base de datos (la
+    sesión no llega a pedir una conexión al pool). Si no, la consulta usa la
+    misma unidad de trabajo que la ruta (FastAPI la resuelve una vez por
+    request), así que el request ocupa una sola conexión.
+    
     Args:
         credentials: Credenciales HTTP Bearer
-        session: Sesión de base de datos
+        uow: Unidad de trabajo del request
     
     Returns:
-        Usuario autenticado con bodegas asignadas cargadas
+        Principal con rol e ids de las bodegas asignadas
     
     Raises:
         HTTPException: Si el token es inválido o el usuario no existe
@@ -45,8 +49,13 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    principal = principal_cache.get(int(user_id))
+    if principal is not None:
+        return principal
+    generation = principal_cache.generation(int(user_id))
+    
     # Cargar usuario con sus bodegas asignadas
-    result = await session.execute(
+    result = await uow.session.execute(
         select(UserModel)
         .options(selectinload(UserModel.assigned_warehouses))
         .where(UserModel.id == int(user_id))
@@ -60,7 +69,9 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    return user
+    principal = Principal.from_user(user)
+    principal_cache.set(principal, generation)
+    return principal
 
 
 async def require_admin(current_user = Depends(get_current_user)):
@@ -86,7 +97,7 @@ async def require_admin(current_user = Depends(get_current_user)):
 
 async def get_current_user_optional(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False)),
-    session: AsyncSession = Depends(get_db)
+    uow: UnitOfWork = Depends(get_uow)
 ):
     """
     Obtiene el usuario actual si hay token, sino retorna None
@@ -96,6 +107,6 @@ async def get_current_user_optional(
         return None
     
     try:
-        return await get_current_user(credentials, session)
+        return await get_current_user(credentials, uow)
     except HTTPException:
         return None
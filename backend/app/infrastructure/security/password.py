@@ -1,17 +1,39 @@
 """
 Módulo para manejo de contraseñas
+
+bcrypt es deliberadamente lento (cientos de ms por hash con el costo por
+defecto). Dentro de un handler async eso bloquea el event loop completo,
+por lo que las rutas usan `hash_password_async` y `verify_password_async`,
+que ejecutan bcrypt en un pool dedicado:
+
+- PASSWORD_HASH_EXECUTOR: "thread" (por defecto; bcrypt libera el GIL)
+  o "process".
+- PASSWORD_HASH_WORKERS: hashes simultáneos como máximo. El resto espera
+  en la cola del pool sin ocupar el event loop.
+- BCRYPT_ROUNDS: factor de trabajo de los hashes nuevos. Los hashes con
+  otro factor se regeneran al iniciar sesión (ver `needs_rehash`).
 """
+import asyncio
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
 import bcrypt
 
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread").lower()
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_executor: Optional[Executor] = None
+
 
-def hash_password(password: str) -> str:
+def hash_password(password: str, rounds: Optional[int] = None) -> str:
     """
     Hashea una contraseña usando bcrypt
     bcrypt tiene un límite de 72 bytes
     """
     # Convertir a bytes y hashear
     password_bytes = password.encode('utf-8')
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds or BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(password_bytes, salt)
     # Retornar como string
     return hashed.decode('utf-8')
@@ -24,3 +46,48 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     password_bytes = plain_password.encode('utf-8')
     hashed_bytes = hashed_password.encode('utf-8')
     return bcrypt.checkpw(password_bytes, hashed_bytes)
+
+
+def needs_rehash(hashed_password: str, rounds: Optional[int] = None) -> bool:
+    """
+    Indica si el hash fue generado con un factor de trabajo distinto al
+    configurado. El formato es `$2b$<costo>$<sal+hash>`.
+    """
+    parts = hashed_password.split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return True
+    return int(parts[2]) != (rounds or BCRYPT_ROUNDS)
+
+
+def get_password_executor() -> Executor:
+    """Pool dedicado a bcrypt, creado en el primer uso"""
+    global _executor
+    if _executor is None:
+        if PASSWORD_HASH_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(
+                max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt"
+            )
+    return _executor
+
+
+def shutdown_password_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def hash_password_async(password: str, rounds: Optional[int] = None) -> str:
+    """Versión de `hash_password` que no bloquea el event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_password_executor(), hash_password, password, rounds)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Versión de `verify_password` que no bloquea el event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_password_executor(), verify_password, plain_password, hashed_password
+    )
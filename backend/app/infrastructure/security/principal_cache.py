@@ -0,0 +1,123 @@
+"""
+Caché en memoria del usuario autenticado (principal).
+
+Cada request autenticada necesita el rol del usuario y las bodegas que
+tiene asignadas. Sin caché eso son dos consultas (usuario y bodegas) antes
+de que la ruta haga su propio trabajo. El principal se guarda por id de
+usuario durante `AUTH_PRINCIPAL_CACHE_TTL` segundos; un acierto no toca la
+base de datos.
+
+Las rutas que cambian rol o bodegas (actualizar, eliminar y asignar
+bodegas) invalidan la entrada explícitamente. El TTL acota el tiempo en que
+otro proceso (otro worker de uvicorn) puede seguir viendo datos anteriores.
+Con `AUTH_PRINCIPAL_CACHE_TTL=0` la caché queda deshabilitada.
+
+Una invalidación puede llegar mientras un request consulta el usuario: lo
+leído sería anterior al cambio. Por eso cada invalidación cambia la
+generación del usuario (y `clear` la de todos); quien consulta la base la
+lee antes (`generation`) y la pasa a `set`, que descarta el principal si
+cambió entretanto.
+"""
+import os
+import time
+from dataclasses import dataclass
+from threading import Lock
+from typing import Dict, FrozenSet, Optional, Tuple
+from app.infrastructure.persistence.models import UserRole
+
+AUTH_PRINCIPAL_CACHE_TTL = float(os.getenv("AUTH_PRINCIPAL_CACHE_TTL", "30"))  # segundos
+AUTH_PRINCIPAL_CACHE_SIZE = int(os.getenv("AUTH_PRINCIPAL_CACHE_SIZE", "10000"))
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Identidad inmutable del usuario autenticado"""
+    id: int
+    username: str
+    role: UserRole
+    warehouse_ids: FrozenSet[int]
+
+    @classmethod
+    def from_user(cls, user) -> "Principal":
+        """Construye el principal desde un UserModel con bodegas cargadas"""
+        return cls(
+            id=user.id,
+            username=user.username,
+            role=user.role,
+            warehouse_ids=frozenset(w.id for w in user.assigned_warehouses)
+        )
+
+
+class PrincipalCache:
+    """Caché TTL de principales por id de usuario, con contadores de aciertos"""
+
+    def __init__(self, ttl: float = AUTH_PRINCIPAL_CACHE_TTL, max_size: int = AUTH_PRINCIPAL_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: Dict[int, Tuple[float, Principal]] = {}
+        # Generación de invalidación: global (clear) y por usuario (invalidate)
+        self._epoch = 0
+        self._generations: Dict[int, int] = {}
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def get(self, user_id: int) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+
+    def generation(self, user_id: int) -> Tuple[int, int]:
+        """Generación del usuario; se lee antes de consultar la base"""
+        with self._lock:
+            return self._epoch, self._generations.get(user_id, 0)
+
+    def set(self, principal: Principal, generation: Optional[Tuple[int, int]] = None) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation is not None and generation != (self._epoch, self._generations.get(principal.id, 0)):
+                # Se invalidó durante la consulta: el principal puede ser anterior
+                return
+            self._entries.pop(principal.id, None)
+            if len(self._entries) >= self.max_size:
+                # Los dicts conservan el orden de inserción: se descarta la más antigua
+                del self._entries[next(iter(self._entries))]
+            self._entries[principal.id] = (time.monotonic() + self.ttl, principal)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._epoch += 1
+            self._generations.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "ttl_s": self.ttl,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+principal_cache = PrincipalCache()
@@ -0,0 +1,51 @@
+"""
+Control de concurrencia optimista en la API.
+
+Los registros versionados devuelven su versión en el header `ETag`
+(`"<version>"`). Para modificarlos, el cliente envía la versión que vio en
+`If-Match` (o en el parámetro `expected_version`); si el registro cambió
+entretanto, la respuesta es 409 con la versión actual para reintentar.
+"""
+from typing import Optional
+from fastapi import HTTPException, Response, status
+from app.domain.exceptions import VersionConflictError
+
+
+def expected_version_from(if_match: Optional[str], expected_version: Optional[int]) -> Optional[int]:
+    """
+    Obtiene la versión esperada desde If-Match o desde el parámetro explícito
+
+    Raises:
+        HTTPException: Si If-Match no es una versión válida o contradice al parámetro
+    """
+    if not if_match or if_match.strip() == "*":
+        return expected_version
+    tag = if_match.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    try:
+        version = int(tag.strip('"'))
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="If-Match debe contener la versión del registro"
+        )
+    if expected_version is not None and expected_version != version:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="If-Match y expected_version no coinciden"
+        )
+    return version
+
+
+def set_etag(response: Response, version: Optional[int]) -> None:
+    if version is not None:
+        response.headers["ETag"] = f'"{version}"'
+
+
+def conflict_exception(error: VersionConflictError) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail={"message": str(error), "current_version": error.current_version},
+        headers={"ETag": f'"{error.current_version}"'} if error.current_version is not None else None
+    )
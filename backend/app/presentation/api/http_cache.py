@@ -0,0 +1,32 @@
+"""
+Respuestas que el cliente guarda y revalida con ETag en cada uso.
+
+Sirven para recursos cuyo contenido ya no cambia (conteos cerrados). Se envían con ETag fuerte y `Cache-Control: private, no-cache`: el cliente
+guarda la respuesta pero la revalida en cada uso. No se declaran
+`immutable` porque lo que el recurso toma de otras tablas (p. ej. el
+nombre de una bodega) sí puede cambiar, y con él cambia el ETag. Es
+`private` porque las respuestas dependen de la autenticación y no deben
+guardarse en cachés compartidas. Si el `If-None-Match` coincide, la
+respuesta es 304 sin cuerpo.
+"""
+from typing import Optional
+from fastapi import Response, status
+from app.infrastructure.persistence.closed_count_cache import CachedBody
+
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Comparación débil de If-None-Match, como indica RFC 9110"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
+
+def revalidating_response(cached: CachedBody, if_none_match: Optional[str] = None) -> Response:
+    """Cuerpo guardado con su ETag, o 304 si el cliente ya tiene esa versión"""
+    headers = {"ETag": cached.etag, "Cache-Control": REVALIDATE_CACHE_CONTROL}
+    if etag_matches(if_none_match, cached.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
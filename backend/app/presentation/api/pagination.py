@@ -0,0 +1,57 @@
+"""
+Paginación por cursor (keyset) para los endpoints de listado.
+
+El cursor es opaco para el cliente: codifica la clave del último registro
+de la página. La siguiente página filtra `id > último_id` sobre el índice
+de la clave primaria, por lo que su costo no depende de la profundidad.
+El cursor de la página siguiente viaja en el header `X-Next-Cursor` para
+no cambiar el formato del cuerpo de las respuestas existentes.
+"""
+import base64
+import json
+from typing import Optional, Sequence
+from fastapi import HTTPException, Response, status
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(last_id: int) -> str:
+    raw = json.dumps({"id": last_id}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[int]:
+    """
+    Decodifica un cursor recibido del cliente
+
+    Raises:
+        HTTPException: Si el cursor no es válido
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        last_id = payload["id"]
+        if not isinstance(last_id, int):
+            raise ValueError(last_id)
+        return last_id
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor de paginación inválido"
+        )
+
+
+def next_cursor(items: Sequence, limit: Optional[int], key: str = "id") -> Optional[str]:
+    """Cursor de la siguiente página, o None si la actual no está llena"""
+    if limit and len(items) >= limit:
+        return encode_cursor(getattr(items[-1], key))
+    return None
+
+
+def set_next_cursor(response: Response, items: Sequence, limit: Optional[int], key: str = "id") -> None:
+    """Agrega el header con el cursor de la siguiente página si la actual está llena"""
+    cursor = next_cursor(items, limit, key)
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
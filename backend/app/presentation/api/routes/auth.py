@@ -1,8 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.ext.asyncio import AsyncSession
-from app.infrastructure.persistence.database import get_db
-from app.infrastructure.persistence.repositories import UserRepository
-from app.infrastructure.security import hash_password, verify_password, create_access_token
+from app.infrastructure.persistence.unit_of_work import UnitOfWork, get_uow
+from app.infrastructure.security import (
+    hash_password_async, verify_password_async, needs_rehash, create_access_token
+)
 from app.application.dtos.dtos import UserRegisterDTO, UserLoginDTO, TokenDTO, UserResponseDTO
 from app.infrastructure.persistence.models import UserModel, UserRole
 
@@ -10,8 +10,8 @@ router = APIRouter(prefix="/api/auth", tags=["authentication"])
 
 
 @router.post("/register", response_model=TokenDTO, status_code=status.HTTP_201_CREATED)
-async def register(user_data: UserRegisterDTO, session: AsyncSession = Depends(get_db)):
-    repository = UserRepository(session)
+async def register(user_data: UserRegisterDTO, uow: UnitOfWork = Depends(get_uow)):
+    repository = uow.users
     
     # Verificar si el usuario ya existe
     existing_user = await repository.get_by_username(user_data.username)
@@ -29,7 +29,7 @@ async def register(user_data: UserRegisterDTO, session: AsyncSession = Depends(g
             detail="El email ya está registrado"
         )
     
-    hashed_password = hash_password(user_data.password)
+    hashed_password = await hash_password_async(user_data.password)
     
     user_model = UserModel(
         first_name=user_data.first_name,
@@ -46,6 +46,7 @@ async def register(user_data: UserRegisterDTO, session: AsyncSession = Depends(g
     )
     
     user = await repository.create(user_model)
+    await uow.commit()
     
     access_token = create_access_token(
         data={"sub": str(user.id), "username": user.username, "role": user.role.value}
@@ -58,9 +59,9 @@ async def register(user_data: UserRegisterDTO, session: AsyncSession = Depends(g
 
 
 @router.post("/login", response_model=TokenDTO)
-async def login(credentials: UserLoginDTO, session: AsyncSession = Depends(get_db)):
+async def login(credentials: UserLoginDTO, uow: UnitOfWork = Depends(get_uow)):
 
-    repository = UserRepository(session)
+    repository = uow.users
     
     # Buscar usuario por username
     user = await repository.get_by_username(credentials.username)
@@ -72,12 +73,19 @@ async def login(credentials: UserLoginDTO, session: AsyncSession = Depends(get_d
         )
     
     # Verificar contraseña
-    if not verify_password(credentials.password, user.hashed_password):
+    if not await verify_password_async(credentials.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Usuario o contraseña incorrectos"
         )
     
+    # Regenerar el hash si el factor de trabajo configurado cambió
+    if needs_rehash(user.hashed_password):
+        new_hash = await hash_password_async(credentials.password)
+        await repository.update_password(user.id, new_hash)
+        await uow.commit()
+        user.hashed_password = new_hash
+    
     # Crear token
     access_token = create_access_token(
         data={"sub": str(user.id), "username": user.username, "role": user.role.value}
@@ -90,8 +98,8 @@ async def login(credentials: UserLoginDTO, session: AsyncSession = Depends(get_d
 
 
 @router.post("/register-admin", response_model=TokenDTO, status_code=status.HTTP_201_CREATED)
-async def register_admin(user_data: UserRegisterDTO, session: AsyncSession = Depends(get_db)):
-    repository = UserRepository(session)
+async def register_admin(user_data: UserRegisterDTO, uow: UnitOfWork = Depends(get_uow)):
+    repository = uow.users
     
     # Verificar si el usuario ya existe
     existing_user = await repository.get_by_username(user_data.username)
@@ -110,7 +118,7 @@ async def register_admin(user_data: UserRegisterDTO, session: AsyncSession = Dep
         )
     
     # Crear el nuevo usuario admin
-    hashed_password = hash_password(user_data.password)
+    hashed_password = await hash_password_async(user_data.password)
     
     user_model = UserModel(
         first_name=user_data.first_name,
@@ -127,6 +135,7 @@ async def register_admin(user_data: UserRegisterDTO, session: AsyncSession = Dep
     )
     
     user = await repository.create(user_model)
+    await uow.commit()
     
     # Crear token
     access_token = create_access_token(
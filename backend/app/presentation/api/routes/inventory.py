@@ -1,41 +1,123 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.ext.asyncio import AsyncSession
-
-from app.infrastructure.persistence.database import get_db
-from app.infrastructure.persistence.repositories import (
-    InventoryRepository,
-    ProductRepository,
-    WarehouseRepository
-)
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Hashable, List, Optional
+from pydantic import TypeAdapter
+
+from app.infrastructure.persistence.database import AsyncSessionLocal
+from app.infrastructure.persistence.repositories import InventoryRepository
+from app.infrastructure.persistence.report_cache import REPORT_CACHE_WARM_TOP, CachedReport, report_cache
+from app.infrastructure.persistence.unit_of_work import UnitOfWork, get_uow
 from app.application.dtos.dtos import (
     InventoryItemCreateDTO,
     InventoryItemResponseDTO,
-    WarehouseInventoryDTO
+    InventoryQuantityUpdateDTO,
+    InventoryQuantityBatchResultDTO,
+    WarehouseInventoryDTO,
+    WarehouseStockAsOfDTO
 )
 from app.application.use_cases.inventory_use_cases import (
     AddInventoryItemUseCase,
     UpdateInventoryQuantityUseCase,
+    UpdateInventoryQuantitiesBatchUseCase,
     GetWarehouseInventoryUseCase,
     GetProductQuantityUseCase,
     RemoveProductFromWarehouseUseCase,
-    GetAllWarehouseInventoryUseCase
+    GetAllWarehouseInventoryUseCase,
+    GetWarehouseStockAsOfUseCase,
+    ExportInventoryUseCase
 )
 from app.infrastructure.security import get_current_user, require_admin
+from app.presentation.api.pagination import NEXT_CURSOR_HEADER, decode_cursor, next_cursor
+from app.presentation.api.concurrency import conflict_exception, expected_version_from, set_etag
+from app.presentation.api.single_flight import single_flight
+from app.domain.exceptions import VersionConflictError
+from app.domain.repositories.repository_interfaces import IInventoryRepository
 
 router = APIRouter(prefix="/api/inventory", tags=["inventory"])
 
+WAREHOUSE_INVENTORY_LIST = TypeAdapter(List[WarehouseInventoryDTO])
+
+
+async def cached_report(
+    key: Hashable,
+    warehouse_id: Optional[int],
+    render: Callable[[IInventoryRepository], Awaitable[CachedReport]]
+) -> CachedReport:
+    """
+    Devuelve el reporte guardado si la generación de la bodega (o de todas,
+    con `warehouse_id` None) no cambió; si cambió, lo calcula y lo guarda
+    con la generación leída antes de consultar la base. Las peticiones
+    simultáneas por el mismo reporte y generación comparten un solo cálculo.
+    """
+    generation = report_cache.generation(warehouse_id)
+    report = report_cache.get(key, generation)
+    if report is not None:
+        return report
+    
+    async def compute():
+        # Sesión propia: el cálculo lo esperan varias peticiones y cualquiera puede terminar antes
+        async with AsyncSessionLocal() as session:
+            report = await render(InventoryRepository(session))
+        report_cache.set(key, generation, report)
+        return report
+    
+    return await single_flight.do("inventory-report", (key, generation), compute)
+
+
+def report_response(report: CachedReport) -> Response:
+    return Response(content=report.body, media_type="application/json", headers=report.headers)
+
+
+async def warehouse_inventory_report(warehouse_id: int) -> CachedReport:
+    async def render(inventory_repo: IInventoryRepository):
+        result = await GetWarehouseInventoryUseCase(inventory_repo).execute(warehouse_id)
+        return CachedReport(body=result.model_dump_json().encode("utf-8"))
+    
+    return await cached_report(("warehouse", warehouse_id), warehouse_id, render)
+
+
+async def all_warehouses_inventory_report(after_id: Optional[int] = None, limit: Optional[int] = None) -> CachedReport:
+    async def render(inventory_repo: IInventoryRepository):
+        result = await GetAllWarehouseInventoryUseCase(inventory_repo).execute(after_id=after_id, limit=limit)
+        cursor = next_cursor(result, limit, key="warehouse_id")
+        return CachedReport(
+            body=WAREHOUSE_INVENTORY_LIST.dump_json(result),
+            headers={NEXT_CURSOR_HEADER: cursor} if cursor else {}
+        )
+    
+    return await cached_report(("all", after_id, limit), None, render)
+
+
+async def warm_inventory_reports(top: int = REPORT_CACHE_WARM_TOP) -> int:
+    """
+    Precalienta el resumen de todas las bodegas y el de las `top` bodegas
+    con más movimientos recientes
+
+    Returns:
+        Cantidad de reportes calculados
+    """
+    await all_warehouses_inventory_report()
+    warehouse_ids = []
+    if top > 0:
+        async with AsyncSessionLocal() as session:
+            warehouse_ids = await InventoryRepository(session).get_busiest_warehouse_ids(top)
+    for warehouse_id in warehouse_ids:
+        await warehouse_inventory_report(warehouse_id)
+    return 1 + len(warehouse_ids)
+
 
 @router.post("/", response_model=InventoryItemResponseDTO, status_code=status.HTTP_201_CREATED)
 async def add_product_to_warehouse(
     dto: InventoryItemCreateDTO,
-    db: AsyncSession = Depends(get_db),
+    uow: UnitOfWork = Depends(get_uow),
     current_user = Depends(get_current_user)
 ):
     from app.infrastructure.persistence.models import UserRole
     
     if current_user.role == UserRole.USER:
         # Verificar si el usuario tiene asignada la bodega
-        user_warehouse_ids = [w.id for w in current_user.assigned_warehouses]
+        user_warehouse_ids = current_user.warehouse_ids
         if dto.warehouse_id not in user_warehouse_ids:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -44,11 +126,12 @@ async def add_product_to_warehouse(
     
     try:
         use_case = AddInventoryItemUseCase(
-            InventoryRepository(db),
-            ProductRepository(db),
-            WarehouseRepository(db)
+            uow.inventory,
+            uow.products,
+            uow.warehouses
         )
         result = await use_case.execute(dto)
+        await uow.commit()
         return result
     except ValueError as e:
         raise HTTPException(
@@ -62,17 +145,68 @@ async def add_product_to_warehouse(
         )
 
 
+@router.put("/batch", response_model=InventoryQuantityBatchResultDTO)
+async def update_inventory_quantities(
+    changes: List[InventoryQuantityUpdateDTO],
+    uow: UnitOfWork = Depends(get_uow),
+    current_user = Depends(get_current_user)
+):
+    """
+    Aplica varias actualizaciones de cantidad condicionadas a la versión de
+    cada item. Los conflictos no detienen el lote: se informan con la cantidad
+    y versión actuales para que el cliente reintente solo esos items.
+    """
+    from app.infrastructure.persistence.models import UserRole
+    
+    inventory_repo = uow.inventory
+    if current_user.role == UserRole.USER:
+        user_warehouse_ids = current_user.warehouse_ids
+        items = await inventory_repo.get_many(change.id for change in changes)
+        for item in items.values():
+            if item.warehouse_id not in user_warehouse_ids:
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail=f"No tiene permisos para modificar inventario de la bodega {item.warehouse_id}"
+                )
+    
+    try:
+        use_case = UpdateInventoryQuantitiesBatchUseCase(inventory_repo)
+        result = await use_case.execute(changes)
+        # Los items en conflicto no se tocaron: se confirman los demás
+        await uow.commit()
+        return result
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+
 @router.put("/{inventory_id}", response_model=InventoryItemResponseDTO)
 async def update_inventory_quantity(
+    response: Response,
     inventory_id: int,
     quantity: int,
-    db: AsyncSession = Depends(get_db),
+    expected_version: Optional[int] = None,
+    if_match: Optional[str] = Header(None),
+    uow: UnitOfWork = Depends(get_uow),
     current_user = Depends(get_current_user)
 ):
+    """
+    Fija la cantidad de un item. Con If-Match (o expected_version) solo se
+    aplica si la versión no cambió; si cambió responde 409.
+    """
     from app.infrastructure.persistence.models import UserRole
     
+    version = expected_version_from(if_match, expected_version)
+    inventory_repo = uow.inventory
     if current_user.role == UserRole.USER:
-        inventory_repo = InventoryRepository(db)
+        # Única lectura del item; la actualización no vuelve a consultarlo
         item = await inventory_repo.get_by_id(inventory_id)
         if not item:
             raise HTTPException(
@@ -80,7 +214,7 @@ async def update_inventory_quantity(
                 detail="Item de inventario no encontrado"
             )
         
-        user_warehouse_ids = [w.id for w in current_user.assigned_warehouses]
+        user_warehouse_ids = current_user.warehouse_ids
         if item.warehouse_id not in user_warehouse_ids:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -88,9 +222,13 @@ async def update_inventory_quantity(
             )
     
     try:
-        use_case = UpdateInventoryQuantityUseCase(InventoryRepository(db))
-        result = await use_case.execute(inventory_id, quantity)
+        use_case = UpdateInventoryQuantityUseCase(inventory_repo)
+        result = await use_case.execute(inventory_id, quantity, version)
+        await uow.commit()
+        set_etag(response, result.version)
         return result
+    except VersionConflictError as e:
+        raise conflict_exception(e)
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -103,20 +241,102 @@ async def update_inventory_quantity(
         )
 
 
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+@router.get("/export")
+async def export_inventory(
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    warehouse_id: Optional[int] = None,
+    current_user = Depends(get_current_user)
+):
+    """
+    Exporta el inventario en streaming (NDJSON o CSV) con un cursor del lado
+    del servidor. La memoria usada no depende de la cantidad de filas.
+    """
+    from app.infrastructure.persistence.models import UserRole
+    
+    warehouse_ids = [warehouse_id] if warehouse_id is not None else None
+    if current_user.role == UserRole.USER:
+        user_warehouse_ids = current_user.warehouse_ids
+        if warehouse_id is not None and warehouse_id not in user_warehouse_ids:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"No tiene permisos para exportar el inventario de la bodega {warehouse_id}"
+            )
+        if warehouse_ids is None:
+            warehouse_ids = sorted(user_warehouse_ids)
+    
+    async def body():
+        # Sesión propia: debe seguir abierta mientras se envía la respuesta
+        async with AsyncSessionLocal() as session:
+            use_case = ExportInventoryUseCase(InventoryRepository(session))
+            async for chunk in use_case.execute(export_format, warehouse_ids):
+                yield chunk
+    
+    return StreamingResponse(
+        body(),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f"attachment; filename=inventory.{export_format}"}
+    )
+
+
 @router.get("/warehouse/{warehouse_id}", response_model=WarehouseInventoryDTO)
 async def get_warehouse_inventory(
     warehouse_id: int,
-    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
+    """
+    Inventario de una bodega. Se sirve desde la caché de reportes mientras
+    no haya escrituras de existencia en la bodega.
+    """
     try:
-        use_case = GetWarehouseInventoryUseCase(
-            InventoryRepository(db),
-            WarehouseRepository(db),
-            ProductRepository(db)
+        return report_response(await warehouse_inventory_report(warehouse_id))
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
         )
-        result = await use_case.execute(warehouse_id)
-        return result
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+
+@router.get("/warehouse/{warehouse_id}/as-of", response_model=WarehouseStockAsOfDTO)
+async def get_warehouse_stock_as_of(
+    warehouse_id: int,
+    at: datetime,
+    uow: UnitOfWork = Depends(get_uow),
+    current_user = Depends(get_current_user)
+):
+    """
+    Existencia de la bodega en el instante `at` (UTC), reconstruida desde el
+    libro de movimientos a partir del checkpoint más cercano.
+    """
+    from app.infrastructure.persistence.models import UserRole
+    
+    if current_user.role == UserRole.USER:
+        user_warehouse_ids = current_user.warehouse_ids
+        if warehouse_id not in user_warehouse_ids:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"No tiene permisos para ver el inventario de la bodega {warehouse_id}"
+            )
+    
+    try:
+        use_case = GetWarehouseStockAsOfUseCase(
+            uow.inventory,
+            uow.products,
+            uow.warehouses
+        )
+        # Se comparan fechas sin zona horaria, igual que las guardadas
+        as_of = at if at.tzinfo is None else at.astimezone(timezone.utc).replace(tzinfo=None)
+        return await use_case.execute(warehouse_id, as_of)
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -131,15 +351,24 @@ async def get_warehouse_inventory(
 
 @router.get("/warehouse/{warehouse_id}/product/{product_id}")
 async def get_product_quantity(
+    response: Response,
     warehouse_id: int,
     product_id: int,
-    db: AsyncSession = Depends(get_db),
+    uow: UnitOfWork = Depends(get_uow),
     current_user = Depends(get_current_user)
 ):
+    """Cantidad del producto en la bodega; con existencia, su versión va en el ETag"""
     try:
-        use_case = GetProductQuantityUseCase(InventoryRepository(db))
-        quantity = await use_case.execute(warehouse_id, product_id)
-        return {"warehouse_id": warehouse_id, "product_id": product_id, "quantity": quantity}
+        use_case = GetProductQuantityUseCase(uow.inventory)
+        item = await use_case.execute(warehouse_id, product_id)
+        version = item.version if item else None
+        set_etag(response, version)
+        return {
+            "warehouse_id": warehouse_id,
+            "product_id": product_id,
+            "quantity": item.quantity if item else 0,
+            "version": version
+        }
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -150,17 +379,18 @@ async def get_product_quantity(
 @router.delete("/{inventory_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def remove_product_from_warehouse(
     inventory_id: int,
-    db: AsyncSession = Depends(get_db),
+    uow: UnitOfWork = Depends(get_uow),
     current_user = Depends(require_admin)
 ):
     try:
-        use_case = RemoveProductFromWarehouseUseCase(InventoryRepository(db))
+        use_case = RemoveProductFromWarehouseUseCase(uow.inventory)
         success = await use_case.execute(inventory_id)
         if not success:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Inventory item with id {inventory_id} not found"
             )
+        await uow.commit()
     except HTTPException:
         raise
     except Exception as e:
@@ -172,23 +402,19 @@ async def remove_product_from_warehouse(
 
 @router.get("/", response_model=list[WarehouseInventoryDTO])
 async def get_all_warehouses_inventory(
-    db: AsyncSession = Depends(get_db),
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
     current_user = Depends(get_current_user)
 ):
+    """
+    Inventario de todas las bodegas. Con `limit` pagina por bodega y
+    devuelve el cursor de la siguiente página en el header X-Next-Cursor.
+    Se sirve desde la caché de reportes mientras no haya escrituras.
+    """
+    after_id = decode_cursor(cursor)
     try:
-        use_case = GetAllWarehouseInventoryUseCase(
-            InventoryRepository(db),
-            WarehouseRepository(db),
-            ProductRepository(db)
-        )
-        result = await use_case.execute()
-        return result
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=str(e)
-        )
-        return result
+        report = await all_warehouses_inventory_report(after_id, limit)
+        return report_response(report)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1,43 +1,89 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Optional
-
-from app.infrastructure.persistence.database import get_db
-from app.infrastructure.persistence.repositories import (
-    InventoryRepository,
-    ProductRepository,
-    WarehouseRepository
-)
+from fastapi import APIRouter, Depends, File, Header, HTTPException, Query, Response, UploadFile, status
+from fastapi import status as http_status
+from datetime import date, datetime, time
+from typing import List, Optional, Tuple
+from pydantic import TypeAdapter
+
+from app.infrastructure.persistence.closed_count_cache import CachedBody, ClosedCountSnapshot, closed_count_cache
+from app.infrastructure.persistence.database import AsyncSessionLocal
+from app.infrastructure.persistence.repositories import InventoryRepository
+from app.infrastructure.persistence.unit_of_work import UnitOfWork, get_uow
 from app.application.dtos.dtos import (
     InventoryCountCreateDTO,
     InventoryCountResponseDTO,
     InventoryCountDetailDTO,
     InventoryItemCreateDTO,
-    InventoryItemResponseDTO
+    InventoryItemResponseDTO,
+    InventoryItemBatchResultDTO,
+    CountSheetImportSummaryDTO,
+    InventoryCountVarianceDTO,
+    WarehouseStockAsOfDTO
 )
 from app.application.use_cases.inventory_count_use_cases import (
     CreateInventoryCountUseCase,
     GetInventoryCountsUseCase,
     GetInventoryCountDetailUseCase,
     CloseInventoryCountUseCase,
-    AddItemToCountUseCase
+    AddItemToCountUseCase,
+    AddItemsBatchToCountUseCase,
+    ImportCountSheetUseCase,
+    GetInventoryCountVariancesUseCase
 )
+from app.application.use_cases.inventory_use_cases import GetWarehouseStockAsOfUseCase
 from app.infrastructure.security import get_current_user, require_admin
+from app.infrastructure.files import iter_count_sheet_rows
+from app.presentation.api.pagination import decode_cursor, set_next_cursor
+from app.presentation.api.concurrency import conflict_exception, expected_version_from, set_etag
+from app.presentation.api.single_flight import single_flight
+from app.presentation.api.http_cache import revalidating_response
+from app.domain.exceptions import VersionConflictError
 
 router = APIRouter(prefix="/api/inventory-counts", tags=["inventory-counts"])
 
+COUNT_ITEMS_LIST = TypeAdapter(List[InventoryItemResponseDTO])
+
+
+async def load_count_detail(
+    uow: UnitOfWork,
+    count_id: int
+) -> Tuple[Optional[ClosedCountSnapshot], Optional[InventoryCountDetailDTO]]:
+    """
+    Detalle de un conteo. Los conteos cerrados salen de la caché sin
+    consultar la base; al construir uno cerrado por primera vez se guarda
+    serializado.
+
+    Returns:
+        (respuestas del conteo cerrado o None, detalle si se consultó la base)
+    """
+    from app.infrastructure.persistence.models import InventoryCountStatus
+    
+    snapshot = closed_count_cache.get(count_id)
+    if snapshot:
+        return snapshot, None
+    result = await GetInventoryCountDetailUseCase(uow.inventory).execute(count_id)
+    if result and result.status == InventoryCountStatus.CLOSED.value:
+        snapshot = ClosedCountSnapshot(
+            count_id=result.id,
+            warehouse_id=result.warehouse_id,
+            created_by=result.created_by,
+            detail=CachedBody.of(result.model_dump_json().encode("utf-8")),
+            items=CachedBody.of(COUNT_ITEMS_LIST.dump_json(result.items))
+        )
+        closed_count_cache.put(snapshot)
+    return snapshot, result
+
 
 @router.post("/", response_model=InventoryCountResponseDTO, status_code=status.HTTP_201_CREATED)
 async def create_inventory_count(
     dto: InventoryCountCreateDTO,
-    db: AsyncSession = Depends(get_db),
+    uow: UnitOfWork = Depends(get_uow),
     current_user = Depends(get_current_user)
 ):
     from app.infrastructure.persistence.models import UserRole
     
     # Si es USER, validar que tenga acceso a la bodega
     if current_user.role == UserRole.USER:
-        user_warehouse_ids = [w.id for w in current_user.assigned_warehouses]
+        user_warehouse_ids = current_user.warehouse_ids
         if dto.warehouse_id not in user_warehouse_ids:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -46,10 +92,11 @@ async def create_inventory_count(
     
     try:
         use_case = CreateInventoryCountUseCase(
-            InventoryRepository(db),
-            WarehouseRepository(db)
+            uow.inventory,
+            uow.warehouses
         )
         result = await use_case.execute(dto, current_user.id)
+        await uow.commit()
         return result
     except ValueError as e:
         raise HTTPException(
@@ -65,46 +112,82 @@ async def create_inventory_count(
 
 @router.get("/", response_model=List[InventoryCountResponseDTO])
 async def get_inventory_counts(
+    response: Response,
     warehouse_id: Optional[int] = None,
     status: Optional[str] = None,
-    db: AsyncSession = Depends(get_db),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
     current_user = Depends(get_current_user)
 ):
+    """
+    Listar conteos, más recientes primero. Filtra por bodega, estado y rango
+    de fecha de corte; pagina por cursor (header X-Next-Cursor). Peticiones
+    simultáneas con los mismos filtros y bodegas visibles comparten una
+    sola consulta.
+    """
     from app.infrastructure.persistence.models import UserRole
     
     # Si es USER, solo mostrar conteos de sus bodegas asignadas
+    warehouse_ids = None
     if current_user.role == UserRole.USER:
-        user_warehouse_ids = [w.id for w in current_user.assigned_warehouses]
+        user_warehouse_ids = current_user.warehouse_ids
         if warehouse_id and warehouse_id not in user_warehouse_ids:
             raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
+                status_code=http_status.HTTP_403_FORBIDDEN,
                 detail="No tiene permisos para ver conteos de esa bodega"
             )
-        if not warehouse_id and user_warehouse_ids:
-            pass
+        warehouse_ids = sorted(user_warehouse_ids)
+    
+    before_id = decode_cursor(cursor)
+    
+    async def load():
+        # Sesión propia: la consulta la esperan varias peticiones y cualquiera puede terminar antes
+        async with AsyncSessionLocal() as session:
+            use_case = GetInventoryCountsUseCase(InventoryRepository(session))
+            return await use_case.execute(
+                warehouse_id=warehouse_id,
+                status=status,
+                warehouse_ids=warehouse_ids,
+                date_from=date_from,
+                date_to=date_to,
+                before_id=before_id,
+                limit=limit
+            )
     
+    key = (
+        warehouse_id, status, date_from, date_to, before_id, limit,
+        tuple(warehouse_ids) if warehouse_ids is not None else None
+    )
     try:
-        use_case = GetInventoryCountsUseCase(InventoryRepository(db))
-        result = await use_case.execute(warehouse_id=warehouse_id, status=status)
+        result = await single_flight.do("inventory-counts", key, load)
+        set_next_cursor(response, result, limit)
         return result
     except Exception as e:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            status_code=http_status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
 
 
 @router.get("/{count_id}", response_model=InventoryCountDetailDTO)
 async def get_inventory_count_detail(
+    response: Response,
     count_id: int,
-    db: AsyncSession = Depends(get_db),
+    if_none_match: Optional[str] = Header(None),
+    uow: UnitOfWork = Depends(get_uow),
     current_user = Depends(get_current_user)
 ):
+    """
+    Detalle de un conteo con sus items. Un conteo cerrado se responde con
+    ETag fuerte y el cliente lo revalida en cada uso (304 si ya lo tiene);
+    uno abierto lleva su versión en el ETag, como las demás lecturas versionadas.
+    """
     try:
-        use_case = GetInventoryCountDetailUseCase(InventoryRepository(db))
-        result = await use_case.execute(count_id)
+        snapshot, result = await load_count_detail(uow, count_id)
         
-        if not result:
+        if not snapshot and not result:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Conteo con ID {count_id} no encontrado"
@@ -112,13 +195,17 @@ async def get_inventory_count_detail(
         
         from app.infrastructure.persistence.models import UserRole
         if current_user.role == UserRole.USER:
-            user_warehouse_ids = [w.id for w in current_user.assigned_warehouses]
-            if result.warehouse_id not in user_warehouse_ids:
+            user_warehouse_ids = current_user.warehouse_ids
+            warehouse_id = snapshot.warehouse_id if snapshot else result.warehouse_id
+            if warehouse_id not in user_warehouse_ids:
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
                     detail="No tiene permisos para ver este conteo"
                 )
         
+        if snapshot:
+            return revalidating_response(snapshot.detail, if_none_match)
+        set_etag(response, result.version)
         return result
     except HTTPException:
         raise
@@ -131,18 +218,27 @@ async def get_inventory_count_detail(
 
 @router.put("/{count_id}/close", response_model=InventoryCountResponseDTO)
 async def close_inventory_count(
+    response: Response,
     count_id: int,
-    db: AsyncSession = Depends(get_db),
+    expected_version: Optional[int] = None,
+    if_match: Optional[str] = Header(None),
+    uow: UnitOfWork = Depends(get_uow),
     current_user = Depends(require_admin)
 ):
     """
-    Cerrar un conteo de inventario.
-    Requiere rol ADMIN.
+    Cerrar un conteo de inventario y conciliar la existencia de la bodega
+    con lo contado. Requiere rol ADMIN. Con If-Match (o expected_version)
+    responde 409 si el conteo cambió desde que el cliente lo leyó.
     """
+    version = expected_version_from(if_match, expected_version)
     try:
-        use_case = CloseInventoryCountUseCase(InventoryRepository(db))
-        result = await use_case.execute(count_id)
+        use_case = CloseInventoryCountUseCase(uow.inventory)
+        result = await use_case.execute(count_id, version)
+        await uow.commit()
+        set_etag(response, result.version)
         return result
+    except VersionConflictError as e:
+        raise conflict_exception(e)
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -155,11 +251,89 @@ async def close_inventory_count(
         )
 
 
+@router.get("/{count_id}/variances", response_model=List[InventoryCountVarianceDTO])
+async def get_count_variances(
+    count_id: int,
+    uow: UnitOfWork = Depends(get_uow),
+    current_user = Depends(get_current_user)
+):
+    """
+    Obtener el reporte de diferencias (contado vs sistema) generado al cerrar el conteo.
+    """
+    try:
+        inventory_repo = uow.inventory
+        count = await inventory_repo.get_count_header(count_id)
+        
+        if not count:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Conteo con ID {count_id} no encontrado"
+            )
+        
+        from app.infrastructure.persistence.models import UserRole
+        if current_user.role == UserRole.USER:
+            user_warehouse_ids = current_user.warehouse_ids
+            if count.warehouse_id not in user_warehouse_ids:
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail="No tiene permisos para ver este conteo"
+                )
+        
+        use_case = GetInventoryCountVariancesUseCase(inventory_repo)
+        return await use_case.execute(count_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+
+@router.get("/{count_id}/stock-as-of", response_model=WarehouseStockAsOfDTO)
+async def get_count_stock_as_of(
+    count_id: int,
+    uow: UnitOfWork = Depends(get_uow),
+    current_user = Depends(get_current_user)
+):
+    """
+    Existencia de la bodega del conteo al final de su fecha de corte.
+    """
+    try:
+        inventory_repo = uow.inventory
+        count = await inventory_repo.get_count_header(count_id)
+        
+        if not count:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Conteo con ID {count_id} no encontrado"
+            )
+        
+        from app.infrastructure.persistence.models import UserRole
+        if current_user.role == UserRole.USER:
+            user_warehouse_ids = current_user.warehouse_ids
+            if count.warehouse_id not in user_warehouse_ids:
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail="No tiene permisos para ver este conteo"
+                )
+        
+        use_case = GetWarehouseStockAsOfUseCase(inventory_repo, uow.products, uow.warehouses)
+        return await use_case.execute(count.warehouse_id, datetime.combine(count.cut_off_date, time.max))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+
 @router.post("/{count_id}/items", response_model=InventoryItemResponseDTO, status_code=status.HTTP_201_CREATED)
 async def add_item_to_count(
     count_id: int,
     dto: InventoryItemCreateDTO,
-    db: AsyncSession = Depends(get_db),
+    uow: UnitOfWork = Depends(get_uow),
     current_user = Depends(get_current_user)
 ):
     """
@@ -168,8 +342,9 @@ async def add_item_to_count(
     """
     try:
         # Validar permisos: verificar que el usuario tenga acceso al conteo
-        inventory_repo = InventoryRepository(db)
-        count = await inventory_repo.get_count_by_id(count_id)
+        inventory_repo = uow.inventory
+        # Bloqueo compartido: un cierre concurrente espera a que se confirmen estos items
+        count = await inventory_repo.get_count_header(count_id, lock="share")
         
         if not count:
             raise HTTPException(
@@ -179,7 +354,7 @@ async def add_item_to_count(
         
         from app.infrastructure.persistence.models import UserRole
         if current_user.role == UserRole.USER:
-            user_warehouse_ids = [w.id for w in current_user.assigned_warehouses]
+            user_warehouse_ids = current_user.warehouse_ids
             if count.warehouse_id not in user_warehouse_ids:
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
@@ -188,9 +363,117 @@ async def add_item_to_count(
         
         use_case = AddItemToCountUseCase(
             inventory_repo,
-            ProductRepository(db)
+            uow.products
+        )
+        result = await use_case.execute(count_id, dto, count)
+        await uow.commit()
+        return result
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+
+@router.post("/{count_id}/items/batch", response_model=InventoryItemBatchResultDTO, status_code=status.HTTP_201_CREATED)
+async def add_items_batch_to_count(
+    count_id: int,
+    dtos: List[InventoryItemCreateDTO],
+    uow: UnitOfWork = Depends(get_uow),
+    current_user = Depends(get_current_user)
+):
+    """
+    Agregar varios items a un conteo en una sola petición.
+    Los productos se resuelven en una consulta y las líneas válidas se insertan
+    en una sola transacción; las inválidas se reportan por índice.
+    """
+    try:
+        inventory_repo = uow.inventory
+        # Bloqueo compartido: un cierre concurrente espera a que se confirmen estos items
+        count = await inventory_repo.get_count_header(count_id, lock="share")
+        
+        if not count:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Conteo con ID {count_id} no encontrado"
+            )
+        
+        from app.infrastructure.persistence.models import UserRole
+        if current_user.role == UserRole.USER:
+            user_warehouse_ids = current_user.warehouse_ids
+            if count.warehouse_id not in user_warehouse_ids:
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail="No tiene permisos para agregar items a este conteo"
+                )
+        
+        use_case = AddItemsBatchToCountUseCase(
+            inventory_repo,
+            uow.products
+        )
+        result = await use_case.execute(count_id, dtos, count)
+        await uow.commit()
+        return result
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+
+@router.post("/{count_id}/import", response_model=CountSheetImportSummaryDTO)
+async def import_count_sheet(
+    count_id: int,
+    file: UploadFile = File(...),
+    uow: UnitOfWork = Depends(get_uow),
+    current_user = Depends(get_current_user)
+):
+    """
+    Importar una planilla de conteo (.csv o .xlsx) con columnas
+    product_id y packages_count. El archivo se procesa por bloques y
+    se devuelve un resumen de filas aceptadas y rechazadas.
+    """
+    try:
+        inventory_repo = uow.inventory
+        # Bloqueo compartido: un cierre concurrente espera a que se confirmen estos items
+        count = await inventory_repo.get_count_header(count_id, lock="share")
+        
+        if not count:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Conteo con ID {count_id} no encontrado"
+            )
+        
+        from app.infrastructure.persistence.models import UserRole
+        if current_user.role == UserRole.USER:
+            user_warehouse_ids = current_user.warehouse_ids
+            if count.warehouse_id not in user_warehouse_ids:
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail="No tiene permisos para agregar items a este conteo"
+                )
+        
+        use_case = ImportCountSheetUseCase(
+            inventory_repo,
+            uow.products
         )
-        result = await use_case.execute(count_id, dto)
+        rows = iter_count_sheet_rows(file.file, file.filename)
+        result = await use_case.execute(count_id, rows, count)
+        await uow.commit()
         return result
     except ValueError as e:
         raise HTTPException(
@@ -204,22 +487,25 @@ async def add_item_to_count(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
+    finally:
+        await file.close()
 
 
 @router.get("/{count_id}/items", response_model=List[InventoryItemResponseDTO])
 async def get_count_items(
     count_id: int,
-    db: AsyncSession = Depends(get_db),
+    if_none_match: Optional[str] = Header(None),
+    uow: UnitOfWork = Depends(get_uow),
     current_user = Depends(get_current_user)
 ):
     """
-    Obtener todos los items de un conteo específico.
+    Obtener todos los items de un conteo específico. Los de un conteo
+    cerrado se sirven desde la caché con ETag fuerte.
     """
     try:
-        use_case = GetInventoryCountDetailUseCase(InventoryRepository(db))
-        count_detail = await use_case.execute(count_id)
+        snapshot, count_detail = await load_count_detail(uow, count_id)
         
-        if not count_detail:
+        if not snapshot and not count_detail:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Conteo con ID {count_id} no encontrado"
@@ -228,13 +514,16 @@ async def get_count_items(
         # Validar permisos
         from app.infrastructure.persistence.models import UserRole
         if current_user.role == UserRole.USER:
-            user_warehouse_ids = [w.id for w in current_user.assigned_warehouses]
-            if count_detail.warehouse_id not in user_warehouse_ids:
+            user_warehouse_ids = current_user.warehouse_ids
+            warehouse_id = snapshot.warehouse_id if snapshot else count_detail.warehouse_id
+            if warehouse_id not in user_warehouse_ids:
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
                     detail="No tiene permisos para ver items de este conteo"
                 )
         
+        if snapshot:
+            return revalidating_response(snapshot.items, if_none_match)
         return count_detail.items
     except HTTPException:
         raise
@@ -1,14 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.ext.asyncio import AsyncSession
-from app.infrastructure.persistence.database import get_db
-from app.infrastructure.persistence.repositories import ProductRepository
+from fastapi import APIRouter, Depends, HTTPException, Response
+from app.infrastructure.persistence.unit_of_work import UnitOfWork, get_uow
 from app.application.use_cases.product_use_cases import (
     CreateProductUseCase, GetProductByIdUseCase, GetAllProductsUseCase,
-    UpdateProductUseCase, DeleteProductUseCase
+    UpdateProductUseCase, DeleteProductUseCase, BulkUpsertProductsUseCase
+)
+from app.application.dtos.dtos import (
+    ProductCreateDTO, ProductResponseDTO, ProductUpsertDTO, ProductBulkUpsertResultDTO
 )
-from app.application.dtos.dtos import ProductCreateDTO, ProductResponseDTO
 from app.infrastructure.security import get_current_user, require_admin
-from typing import List
+from app.presentation.api.pagination import decode_cursor, set_next_cursor
+from typing import List, Optional
 
 router = APIRouter(prefix="/api/products", tags=["products"])
 
@@ -16,33 +17,52 @@ router = APIRouter(prefix="/api/products", tags=["products"])
 @router.post("/", response_model=ProductResponseDTO)
 async def create_product(
     product_dto: ProductCreateDTO, 
-    session: AsyncSession = Depends(get_db),
+    uow: UnitOfWork = Depends(get_uow),
     current_user = Depends(require_admin)
 ):
-    repository = ProductRepository(session)
+    repository = uow.products
     use_case = CreateProductUseCase(repository)
-    return await use_case.execute(product_dto)
+    result = await use_case.execute(product_dto)
+    await uow.commit()
+    return result
+
+
+@router.post("/bulk-upsert", response_model=ProductBulkUpsertResultDTO)
+async def bulk_upsert_products(
+    product_dtos: List[ProductUpsertDTO],
+    uow: UnitOfWork = Depends(get_uow),
+    current_user = Depends(require_admin)
+):
+    repository = uow.products
+    use_case = BulkUpsertProductsUseCase(repository)
+    result = await use_case.execute(product_dtos)
+    await uow.commit()
+    return result
 
 
 @router.get("/", response_model=List[ProductResponseDTO])
 async def get_all_products(
+    response: Response,
     skip: int = 0, 
     limit: int = 100, 
-    session: AsyncSession = Depends(get_db),
+    cursor: Optional[str] = None,
+    uow: UnitOfWork = Depends(get_uow),
     current_user = Depends(get_current_user)
 ):
-    repository = ProductRepository(session)
+    repository = uow.products
     use_case = GetAllProductsUseCase(repository)
-    return await use_case.execute(skip, limit)
+    items = await use_case.execute(skip, limit, decode_cursor(cursor))
+    set_next_cursor(response, items, limit)
+    return items
 
 
 @router.get("/{product_id}", response_model=ProductResponseDTO)
 async def get_product(
     product_id: int, 
-    session: AsyncSession = Depends(get_db),
+    uow: UnitOfWork = Depends(get_uow),
     current_user = Depends(get_current_user)
 ):
-    repository = ProductRepository(session)
+    repository = uow.products
     use_case = GetProductByIdUseCase(repository)
     product = await use_case.execute(product_id)
     if not product:
@@ -54,23 +74,26 @@ async def get_product(
 async def update_product(
     product_id: int, 
     product_dto: ProductCreateDTO, 
-    session: AsyncSession = Depends(get_db),
+    uow: UnitOfWork = Depends(get_uow),
     current_user = Depends(require_admin)
 ):
-    repository = ProductRepository(session)
+    repository = uow.products
     use_case = UpdateProductUseCase(repository)
-    return await use_case.execute(product_id, product_dto)
+    result = await use_case.execute(product_id, product_dto)
+    await uow.commit()
+    return result
 
 
 @router.delete("/{product_id}")
 async def delete_product(
     product_id: int, 
-    session: AsyncSession = Depends(get_db),
+    uow: UnitOfWork = Depends(get_uow),
     current_user = Depends(require_admin)
 ):
-    repository = ProductRepository(session)
+    repository = uow.products
     use_case = DeleteProductUseCase(repository)
     success = await use_case.execute(product_id)
     if not success:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
+    await uow.commit()
     return {"message": "Producto eliminado correctamente"}
@@ -1,14 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.ext.asyncio import AsyncSession
-from app.infrastructure.persistence.database import get_db
-from app.infrastructure.persistence.repositories import UserRepository
+import httpx
+from fastapi import APIRouter, Depends, File, HTTPException, Response, UploadFile, status
+from app.infrastructure.persistence.unit_of_work import UnitOfWork, get_uow
+from app.infrastructure.persistence.cache_bus import USER, publish_invalidation
 from app.application.use_cases.user_use_cases import (
     CreateUserUseCase, GetUserByIdUseCase, GetAllUsersUseCase,
     UpdateUserUseCase, DeleteUserUseCase, LoadUsersUseCase
 )
 from app.application.dtos.dtos import UserCreateDTO, UserResponseDTO, LoadUsersResponseDTO
-from app.infrastructure.security import get_current_user, require_admin
-from typing import List
+from app.infrastructure.security import get_current_user, require_admin, principal_cache
+from app.infrastructure.files import iter_user_rows
+from app.presentation.api.pagination import decode_cursor, set_next_cursor
+from typing import List, Optional
 
 router = APIRouter(prefix="/api/users", tags=["users"])
 
@@ -16,41 +18,54 @@ router = APIRouter(prefix="/api/users", tags=["users"])
 @router.post("/", response_model=UserResponseDTO)
 async def create_user(
     user_dto: UserCreateDTO, 
-    session: AsyncSession = Depends(get_db),
+    uow: UnitOfWork = Depends(get_uow),
     current_user = Depends(require_admin)
 ):
-    repository = UserRepository(session)
+    repository = uow.users
     use_case = CreateUserUseCase(repository)
-    return await use_case.execute(user_dto)
+    result = await use_case.execute(user_dto)
+    await uow.commit()
+    return result
 
 
 @router.get("/", response_model=List[UserResponseDTO])
 async def get_all_users(
+    response: Response,
     skip: int = 0, 
     limit: int = 100, 
-    session: AsyncSession = Depends(get_db),
+    cursor: Optional[str] = None,
+    uow: UnitOfWork = Depends(get_uow),
     current_user = Depends(require_admin)
 ):
-    repository = UserRepository(session)
+    repository = uow.users
     use_case = GetAllUsersUseCase(repository)
-    return await use_case.execute(skip, limit)
+    items = await use_case.execute(skip, limit, decode_cursor(cursor))
+    set_next_cursor(response, items, limit)
+    return items
 
 
 @router.get("/me", response_model=UserResponseDTO)
-async def get_current_user_info(current_user = Depends(get_current_user)):
-    return current_user
+async def get_current_user_info(
+    uow: UnitOfWork = Depends(get_uow),
+    current_user = Depends(get_current_user)
+):
+    # El principal en caché solo trae id, rol y bodegas: el perfil se lee completo
+    user = await GetUserByIdUseCase(uow.users).execute(current_user.id)
+    if not user:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    return user
 
 
 @router.get("/me/warehouses")
 async def get_my_warehouses(
-    session: AsyncSession = Depends(get_db),
+    uow: UnitOfWork = Depends(get_uow),
     current_user = Depends(get_current_user)
 ):
     from sqlalchemy import select
     from sqlalchemy.orm import selectinload
     from app.infrastructure.persistence.models import UserModel
     
-    result = await session.execute(
+    result = await uow.session.execute(
         select(UserModel)
         .options(selectinload(UserModel.assigned_warehouses))
         .where(UserModel.id == current_user.id)
@@ -70,10 +85,10 @@ async def get_my_warehouses(
 @router.get("/{user_id}", response_model=UserResponseDTO)
 async def get_user(
     user_id: int, 
-    session: AsyncSession = Depends(get_db),
+    uow: UnitOfWork = Depends(get_uow),
     current_user = Depends(require_admin)
 ):
-    repository = UserRepository(session)
+    repository = uow.users
     use_case = GetUserByIdUseCase(repository)
     user = await use_case.execute(user_id)
     if not user:
@@ -85,50 +100,76 @@ async def get_user(
 async def update_user(
     user_id: int, 
     user_dto: UserCreateDTO, 
-    session: AsyncSession = Depends(get_db),
+    uow: UnitOfWork = Depends(get_uow),
     current_user = Depends(require_admin)
 ):
-    repository = UserRepository(session)
+    repository = uow.users
     use_case = UpdateUserUseCase(repository)
-    return await use_case.execute(user_id, user_dto)
+    result = await use_case.execute(user_id, user_dto)
+    await uow.commit()
+    principal_cache.invalidate(user_id)
+    return result
 
 
 @router.delete("/{user_id}")
 async def delete_user(
     user_id: int, 
-    session: AsyncSession = Depends(get_db),
+    uow: UnitOfWork = Depends(get_uow),
     current_user = Depends(require_admin)
 ):
-    repository = UserRepository(session)
+    repository = uow.users
     use_case = DeleteUserUseCase(repository)
     success = await use_case.execute(user_id)
     if not success:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    await uow.commit()
+    principal_cache.invalidate(user_id)
     return {"message": "Usuario eliminado correctamente"}
 
 
 @router.post("/load", response_model=LoadUsersResponseDTO)
 async def load_users(
-    session: AsyncSession = Depends(get_db),
+    file: Optional[UploadFile] = File(None),
+    uow: UnitOfWork = Depends(get_uow),
     current_user = Depends(require_admin)
 ):
-    repository = UserRepository(session)
+    """
+    Alta masiva de usuarios desde un archivo (.csv, .json o .jsonl) o, sin
+    archivo, desde randomuser.me. Los usuarios existentes se omiten y la
+    respuesta detalla las filas no creadas.
+    """
+    repository = uow.users
     use_case = LoadUsersUseCase(repository)
-    return await use_case.execute()
+    try:
+        rows = iter_user_rows(file.file, file.filename) if file else None
+        result = await use_case.execute(rows)
+        # Una sola transacción: un archivo inválido a mitad de camino no deja usuarios a medias
+        await uow.commit()
+        return result
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except httpx.HTTPError as e:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Error al obtener usuarios de la fuente externa: {e}"
+        )
+    finally:
+        if file:
+            await file.close()
 
 
 @router.post("/{user_id}/assign-warehouses")
 async def assign_warehouses_to_user(
     user_id: int,
     warehouse_ids: List[int],
-    session: AsyncSession = Depends(get_db),
+    uow: UnitOfWork = Depends(get_uow),
     current_user = Depends(require_admin)
 ):
     from sqlalchemy import select
     from sqlalchemy.orm import selectinload
     from app.infrastructure.persistence.models import UserModel, WarehouseModel
     
-    result = await session.execute(
+    result = await uow.session.execute(
         select(UserModel)
         .options(selectinload(UserModel.assigned_warehouses))
         .where(UserModel.id == user_id)
@@ -137,15 +178,17 @@ async def assign_warehouses_to_user(
     if not user:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     
-    result = await session.execute(select(WarehouseModel).where(WarehouseModel.id.in_(warehouse_ids)))
+    result = await uow.session.execute(select(WarehouseModel).where(WarehouseModel.id.in_(warehouse_ids)))
     warehouses = list(result.scalars().all())
     
     if len(warehouses) != len(warehouse_ids):
         raise HTTPException(status_code=404, detail="Una o más bodegas no encontradas")
     
     user.assigned_warehouses = warehouses
-    await session.commit()
-    await session.refresh(user)
+    # Los demás workers desalojan el principal con las bodegas anteriores
+    publish_invalidation(uow.session, USER, user_id)
+    await uow.commit()
+    principal_cache.invalidate(user_id)
     
     return {
         "message": f"Bodegas asignadas exitosamente al usuario {user.username}",
@@ -157,14 +200,14 @@ async def assign_warehouses_to_user(
 @router.get("/{user_id}/warehouses")
 async def get_user_warehouses(
     user_id: int,
-    session: AsyncSession = Depends(get_db),
+    uow: UnitOfWork = Depends(get_uow),
     current_user = Depends(require_admin)
 ):
     from sqlalchemy import select
     from sqlalchemy.orm import selectinload
     from app.infrastructure.persistence.models import UserModel
     
-    result = await session.execute(
+    result = await uow.session.execute(
         select(UserModel)
         .options(selectinload(UserModel.assigned_warehouses))
         .where(UserModel.id == user_id)
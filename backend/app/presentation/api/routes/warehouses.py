@@ -1,14 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.ext.asyncio import AsyncSession
-from app.infrastructure.persistence.database import get_db
-from app.infrastructure.persistence.repositories import WarehouseRepository
+from fastapi import APIRouter, Depends, HTTPException, Response
+from app.infrastructure.persistence.unit_of_work import UnitOfWork, get_uow
 from app.application.use_cases.warehouse_use_cases import (
     CreateWarehouseUseCase, GetWarehouseByIdUseCase, GetAllWarehousesUseCase,
     UpdateWarehouseUseCase, DeleteWarehouseUseCase
 )
 from app.application.dtos.dtos import WarehouseCreateDTO, WarehouseResponseDTO
 from app.infrastructure.security import get_current_user, require_admin
-from typing import List
+from app.presentation.api.pagination import decode_cursor, set_next_cursor
+from typing import List, Optional
 
 router = APIRouter(prefix="/api/warehouses", tags=["warehouses"])
 
@@ -16,33 +15,39 @@ router = APIRouter(prefix="/api/warehouses", tags=["warehouses"])
 @router.post("/", response_model=WarehouseResponseDTO)
 async def create_warehouse(
     warehouse_dto: WarehouseCreateDTO, 
-    session: AsyncSession = Depends(get_db),
+    uow: UnitOfWork = Depends(get_uow),
     current_user = Depends(require_admin)
 ):
-    repository = WarehouseRepository(session)
+    repository = uow.warehouses
     use_case = CreateWarehouseUseCase(repository)
-    return await use_case.execute(warehouse_dto)
+    result = await use_case.execute(warehouse_dto)
+    await uow.commit()
+    return result
 
 
 @router.get("/", response_model=List[WarehouseResponseDTO])
 async def get_all_warehouses(
+    response: Response,
     skip: int = 0, 
     limit: int = 100, 
-    session: AsyncSession = Depends(get_db),
+    cursor: Optional[str] = None,
+    uow: UnitOfWork = Depends(get_uow),
     current_user = Depends(get_current_user)
 ):
-    repository = WarehouseRepository(session)
+    repository = uow.warehouses
     use_case = GetAllWarehousesUseCase(repository)
-    return await use_case.execute(skip, limit)
+    items = await use_case.execute(skip, limit, decode_cursor(cursor))
+    set_next_cursor(response, items, limit)
+    return items
 
 
 @router.get("/{warehouse_id}", response_model=WarehouseResponseDTO)
 async def get_warehouse(
     warehouse_id: int, 
-    session: AsyncSession = Depends(get_db),
+    uow: UnitOfWork = Depends(get_uow),
     current_user = Depends(get_current_user)
 ):
-    repository = WarehouseRepository(session)
+    repository = uow.warehouses
     use_case = GetWarehouseByIdUseCase(repository)
     warehouse = await use_case.execute(warehouse_id)
     if not warehouse:
@@ -54,23 +59,26 @@ async def get_warehouse(
 async def update_warehouse(
     warehouse_id: int, 
     warehouse_dto: WarehouseCreateDTO, 
-    session: AsyncSession = Depends(get_db),
+    uow: UnitOfWork = Depends(get_uow),
     current_user = Depends(require_admin)
 ):
-    repository = WarehouseRepository(session)
+    repository = uow.warehouses
     use_case = UpdateWarehouseUseCase(repository)
-    return await use_case.execute(warehouse_id, warehouse_dto)
+    result = await use_case.execute(warehouse_id, warehouse_dto)
+    await uow.commit()
+    return result
 
 
 @router.delete("/{warehouse_id}")
 async def delete_warehouse(
     warehouse_id: int, 
-    session: AsyncSession = Depends(get_db),
+    uow: UnitOfWork = Depends(get_uow),
     current_user = Depends(require_admin)
 ):
-    repository = WarehouseRepository(session)
+    repository = uow.warehouses
     use_case = DeleteWarehouseUseCase(repository)
     success = await use_case.execute(warehouse_id)
     if not success:
         raise HTTPException(status_code=404, detail="Bodega no encontrada")
+    await uow.commit()
     return {"message": "Bodega eliminada correctamente"}
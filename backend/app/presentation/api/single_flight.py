@@ -0,0 +1,100 @@
+"""
+Coalescencia de consultas idénticas en vuelo (single-flight).
+
+Al inicio de un turno muchos clientes piden el mismo listado a la vez y
+cada uno ejecutaría la misma consulta pesada. `single_flight.do(nombre,
+clave, fn)` ejecuta `fn` una sola vez por clave mientras está en curso:
+las peticiones que llegan con la misma clave esperan ese resultado (o su
+excepción) en lugar de lanzar otra consulta. Terminada la ejecución, la
+clave se libera y la siguiente petición consulta de nuevo.
+
+La clave debe incluir todo lo que cambia el resultado: ruta, parámetros y
+alcance de permisos (p. ej. las bodegas visibles para el usuario).
+
+Cancelación: la ejecución compartida corre en su propia tarea y cada
+petición la espera protegida (`asyncio.shield`). Si un cliente se
+desconecta solo se cancela su espera; la consulta se cancela cuando ya no
+queda nadie esperándola. Por eso `fn` no debe usar la sesión del request
+que la inició (puede cerrarse antes): abre la suya.
+
+Variables de entorno:
+    SINGLE_FLIGHT_ENABLED: "false" para ejecutar cada petición por separado
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+from app.infrastructure.persistence.database import _env_bool
+
+SINGLE_FLIGHT_ENABLED = _env_bool("SINGLE_FLIGHT_ENABLED", True)
+
+
+class _Call:
+    """Ejecución en curso y cantidad de peticiones que la esperan"""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Comparte una ejecución en curso entre peticiones con la misma clave"""
+
+    def __init__(self, enabled: bool = SINGLE_FLIGHT_ENABLED):
+        self.enabled = enabled
+        self._calls: Dict[Tuple[str, Hashable], _Call] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _counters(self, name: str) -> Dict[str, int]:
+        return self._stats.setdefault(
+            name, {"executions": 0, "coalesced": 0, "cancelled": 0, "abandoned": 0}
+        )
+
+    def _forget(self, key: Tuple[str, Hashable], call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    async def do(self, name: str, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Ejecuta `fn` o se une a la ejecución en curso con la misma clave
+
+        Args:
+            name: Nombre del endpoint (agrupa las métricas)
+            key: Parámetros y alcance que definen el resultado
+            fn: Función sin argumentos que calcula el resultado
+        """
+        if not self.enabled:
+            return await fn()
+        counters = self._counters(name)
+        full_key = (name, key)
+        call = self._calls.get(full_key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[full_key] = call
+            call.task.add_done_callback(lambda _: self._forget(full_key, call))
+            counters["executions"] += 1
+        else:
+            counters["coalesced"] += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if not call.task.done():
+                # Se canceló esta petición, no la ejecución compartida
+                counters["cancelled"] += 1
+                if call.waiters == 1:
+                    counters["abandoned"] += 1
+                    self._forget(full_key, call)
+                    call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self._calls),
+            "endpoints": {name: dict(counters) for name, counters in self._stats.items()},
+        }
+
+
+single_flight = SingleFlight()
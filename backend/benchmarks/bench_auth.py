@@ -0,0 +1,134 @@
+"""
+Benchmark de la autenticación: caché de principales habilitada vs deshabilitada.
+
+Consulta GET /api/inventory/warehouse/{id}/product/{id} (una consulta
+propia de la ruta) con un usuario USER, de modo que la diferencia entre
+modos es el costo de cargar usuario y bodegas en cada request.
+
+Requiere una base de datos PostgreSQL accesible en DATABASE_URL.
+
+Uso:
+    python -m benchmarks.bench_auth                  # ejecuta ambos modos
+    python -m benchmarks.bench_auth --ttl 0          # solo sin caché
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+async def prepare() -> tuple:
+    from sqlalchemy import select
+    from app.infrastructure.persistence.database import AsyncSessionLocal, init_db
+    from app.infrastructure.persistence.models import ProductModel, UserModel, UserRole, WarehouseModel
+    from app.infrastructure.security import create_access_token, hash_password
+
+    await init_db()
+    async with AsyncSessionLocal() as session:
+        user = (await session.execute(
+            select(UserModel).where(UserModel.username == "bench_auth")
+        )).scalar_one_or_none()
+        if user is None:
+            warehouses = [WarehouseModel(name=f"Bodega auth {i}", location="Bench", capacity=100) for i in range(5)]
+            user = UserModel(
+                first_name="Bench", last_name="Auth", email="bench_auth@example.com",
+                phone="000", gender="n/a", nationality="n/a", nat="NA",
+                username="bench_auth", hashed_password=hash_password("bench"), role=UserRole.USER
+            )
+            user.assigned_warehouses = warehouses
+            session.add_all([*warehouses, ProductModel(name="Producto auth", description="", price=1.0), user])
+            await session.commit()
+        warehouse = (await session.execute(
+            select(WarehouseModel).where(WarehouseModel.name == "Bodega auth 0")
+        )).scalar_one()
+        product = (await session.execute(
+            select(ProductModel).where(ProductModel.name == "Producto auth")
+        )).scalar_one()
+        token = create_access_token(
+            data={"sub": str(user.id), "username": user.username, "role": user.role.value}
+        )
+    return token, f"/api/inventory/warehouse/{warehouse.id}/product/{product.id}"
+
+
+async def run_mode(requests_count: int, concurrency: int) -> dict:
+    import httpx
+    from main import app
+    from app.infrastructure.persistence.database import engine
+    from app.infrastructure.security import principal_cache
+
+    token, path = await prepare()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Calentamiento (también llena la caché si está habilitada)
+        for _ in range(concurrency):
+            await client.get(path, headers=headers)
+        principal_cache.clear()
+        await client.get(path, headers=headers)
+
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def one_request():
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get(path, headers=headers)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code not in (200, 404):
+                    response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one_request() for _ in range(requests_count)))
+        elapsed = time.perf_counter() - start
+
+    await engine.dispose()
+    latencies.sort()
+    return {
+        "ttl_s": principal_cache.ttl,
+        "requests": requests_count,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(requests_count / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+        "cache": principal_cache.snapshot(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ttl", type=float)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.ttl is not None:
+        # La caché lee el TTL al importarse, por eso se fija antes
+        os.environ["AUTH_PRINCIPAL_CACHE_TTL"] = str(args.ttl)
+        os.environ.setdefault("DB_ECHO", "false")
+        print(json.dumps(asyncio.run(run_mode(args.requests, args.concurrency))))
+        return
+
+    results = []
+    for ttl in (0, 60):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_auth", "--ttl", str(ttl),
+             "--requests", str(args.requests), "--concurrency", str(args.concurrency)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'ttl s':<8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'aciertos':>10}")
+    for r in results:
+        print(f"{r['ttl_s']:<8}{r['requests_per_s']:>10}{r['p50_ms']:>10}{r['p99_ms']:>10}"
+              f"{r['cache']['hit_ratio']:>10}")
+    if results[0]["requests_per_s"]:
+        print(f"mejora: x{results[1]['requests_per_s'] / results[0]['requests_per_s']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
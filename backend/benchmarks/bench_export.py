@@ -0,0 +1,119 @@
+"""
+Benchmark de GET /api/inventory/export: RSS del servidor y tiempo al primer byte.
+
+Siembra filas sintéticas en stock_items (una sola vez), levanta uvicorn
+en un subproceso y descarga la exportación en streaming mientras muestrea
+la memoria residente del servidor.
+
+Requiere PostgreSQL en DATABASE_URL y Linux (/proc) para medir RSS.
+
+Uso:
+    python -m benchmarks.bench_export --rows 1000000 --format ndjson
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+PORT = 8765
+
+
+async def seed(rows: int) -> str:
+    from sqlalchemy import func, select, text
+    from app.infrastructure.persistence.database import AsyncSessionLocal, init_db, engine
+    from app.infrastructure.persistence.models import StockItemModel, UserModel, WarehouseModel
+    from app.infrastructure.security import create_access_token
+
+    await init_db()
+    async with AsyncSessionLocal() as session:
+        existing = (await session.execute(select(func.count(StockItemModel.id)))).scalar_one()
+        if existing < rows:
+            warehouse = WarehouseModel(name="Bodega benchmark", location="Bench", capacity=rows)
+            session.add(warehouse)
+            await session.flush()
+            # Una fila de existencia por producto (clave única bodega-producto)
+            await session.execute(
+                text(
+                    "WITH new_products AS ("
+                    "  INSERT INTO products (name, description, price, packaging_unit, units_per_package, created_at, updated_at) "
+                    "  SELECT 'Producto benchmark ' || g, '', 1.0, 'Unidad', 12, now(), now() "
+                    "  FROM generate_series(1, :missing) AS g RETURNING id"
+                    ") "
+                    "INSERT INTO stock_items (warehouse_id, product_id, quantity, created_at, updated_at) "
+                    "SELECT :warehouse_id, id, (id % 100) * 12, now(), now() FROM new_products"
+                ),
+                {"warehouse_id": warehouse.id, "missing": rows - existing}
+            )
+            await session.commit()
+        admin = (await session.execute(select(UserModel).where(UserModel.username == "admin"))).scalar_one()
+    await engine.dispose()
+    return create_access_token(
+        data={"sub": str(admin.id), "username": admin.username, "role": admin.role.value}
+    )
+
+
+def read_rss_kb(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as status_file:
+        for line in status_file:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+async def download(token: str, export_format: str, pid: int) -> dict:
+    import httpx
+
+    peak_rss = read_rss_kb(pid)
+    baseline_rss = peak_rss
+    total_bytes = 0
+    first_byte = None
+    start = time.perf_counter()
+    async with httpx.AsyncClient(timeout=None) as client:
+        async with client.stream(
+            "GET", f"http://127.0.0.1:{PORT}/api/inventory/export",
+            params={"format": export_format},
+            headers={"Authorization": f"Bearer {token}"}
+        ) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                if first_byte is None:
+                    first_byte = time.perf_counter() - start
+                total_bytes += len(chunk)
+                peak_rss = max(peak_rss, read_rss_kb(pid))
+    elapsed = time.perf_counter() - start
+    return {
+        "ttfb_ms": round(first_byte * 1000, 1),
+        "total_s": round(elapsed, 2),
+        "mb": round(total_bytes / 1024 / 1024, 1),
+        "server_rss_baseline_mb": round(baseline_rss / 1024, 1),
+        "server_rss_peak_mb": round(peak_rss / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--format", dest="export_format", choices=["ndjson", "csv"], default="ndjson")
+    args = parser.parse_args()
+
+    token = asyncio.run(seed(args.rows))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(PORT), "--log-level", "warning"],
+        env={**os.environ, "DB_ECHO": "false"}
+    )
+    try:
+        time.sleep(3)
+        result = asyncio.run(download(token, args.export_format, server.pid))
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"filas={args.rows} formato={args.export_format}")
+    for key, value in result.items():
+        print(f"  {key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
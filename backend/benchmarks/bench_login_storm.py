@@ -0,0 +1,93 @@
+"""
+Prueba de carga: latencia de un endpoint ajeno durante una ráfaga de logins.
+
+Mide GET /health en forma continua, primero sin carga y luego mientras se
+lanzan N logins concurrentes (bcrypt en el pool dedicado). Si el hashing
+bloqueara el event loop, el p99 de /health subiría al tiempo de varios
+hashes; con el pool debe mantenerse plano.
+
+Requiere una base de datos PostgreSQL accesible en DATABASE_URL y el
+usuario admin por defecto (admin / admin123).
+
+Uso:
+    python -m benchmarks.bench_login_storm --logins 200 --rounds 12
+"""
+import argparse
+import asyncio
+import os
+import time
+
+
+def percentile(values, fraction: float) -> float:
+    values = sorted(values)
+    return round(values[max(int(len(values) * fraction) - 1, 0)] * 1000, 2)
+
+
+async def probe(client, stop: asyncio.Event) -> list:
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.get("/health")
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+        await asyncio.sleep(0.005)
+    return latencies
+
+
+async def run(logins: int, baseline_s: float) -> dict:
+    import httpx
+    from main import app
+    from app.infrastructure.persistence.database import engine, init_db
+
+    await init_db()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        stop = asyncio.Event()
+        probe_task = asyncio.create_task(probe(client, stop))
+        await asyncio.sleep(baseline_s)
+        stop.set()
+        baseline = await probe_task
+
+        stop = asyncio.Event()
+        probe_task = asyncio.create_task(probe(client, stop))
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(
+            client.post("/api/auth/login", json={"username": "admin", "password": "admin123"})
+            for _ in range(logins)
+        ))
+        storm_s = time.perf_counter() - start
+        stop.set()
+        during = await probe_task
+
+    await engine.dispose()
+    return {
+        "logins": logins,
+        "login_errors": sum(1 for r in responses if r.status_code != 200),
+        "logins_per_s": round(logins / storm_s, 1),
+        "health_p50_ms_baseline": percentile(baseline, 0.5),
+        "health_p99_ms_baseline": percentile(baseline, 0.99),
+        "health_p50_ms_storm": percentile(during, 0.5),
+        "health_p99_ms_storm": percentile(during, 0.99),
+        "health_samples_storm": len(during),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--rounds", type=int, help="BCRYPT_ROUNDS para esta ejecución")
+    parser.add_argument("--baseline", type=float, default=2.0, help="segundos de medición sin carga")
+    args = parser.parse_args()
+
+    if args.rounds:
+        # El factor se lee al importar el módulo de contraseñas
+        os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    os.environ.setdefault("DB_ECHO", "false")
+
+    result = asyncio.run(run(args.logins, args.baseline))
+    for key, value in result.items():
+        print(f"  {key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark de throughput de GET /api/products/ con NullPool vs pool acotado.
+
+Requiere una base de datos PostgreSQL accesible en DATABASE_URL.
+
+Uso:
+    python -m benchmarks.bench_pool                 # ejecuta ambos modos
+    python -m benchmarks.bench_pool --mode queue    # solo un modo
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+async def run_mode(requests_count: int, concurrency: int) -> dict:
+    import httpx
+    from sqlalchemy import select
+    from main import app
+    from app.infrastructure.persistence.database import (
+        AsyncSessionLocal, init_db, engine, get_pool_status, pool_stats, DB_POOL_MODE
+    )
+    from app.infrastructure.persistence.models import UserModel
+    from app.infrastructure.security import create_access_token
+
+    await init_db()
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(select(UserModel).where(UserModel.username == "admin"))
+        admin = result.scalar_one()
+    token = create_access_token(
+        data={"sub": str(admin.id), "username": admin.username, "role": admin.role.value}
+    )
+    headers = {"Authorization": f"Bearer {token}"}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Calentamiento
+        for _ in range(concurrency):
+            await client.get("/api/products/", headers=headers)
+        pool_stats.reset()
+
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def one_request():
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get("/api/products/", headers=headers)
+                latencies.append(time.perf_counter() - start)
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one_request() for _ in range(requests_count)))
+        elapsed = time.perf_counter() - start
+
+    await engine.dispose()
+    latencies.sort()
+    return {
+        "mode": DB_POOL_MODE,
+        "requests": requests_count,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(requests_count / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2),
+        "pool": get_pool_status(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mode", choices=["null", "queue"])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.mode:
+        # El engine se construye al importar, por eso el modo se fija antes
+        os.environ["DB_POOL_MODE"] = args.mode
+        os.environ.setdefault("DB_ECHO", "false")
+        print(json.dumps(asyncio.run(run_mode(args.requests, args.concurrency))))
+        return
+
+    results = []
+    for mode in ("null", "queue"):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_pool", "--mode", mode,
+             "--requests", str(args.requests), "--concurrency", str(args.concurrency)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'modo':<8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'espera pool ms':>16}")
+    for r in results:
+        print(f"{r['mode']:<8}{r['requests_per_s']:>10}{r['p50_ms']:>10}{r['p99_ms']:>10}"
+              f"{r['pool']['checkout_wait']['avg_wait_ms']:>16}")
+
+
+if __name__ == "__main__":
+    main()
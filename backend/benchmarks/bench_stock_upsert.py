@@ -0,0 +1,82 @@
+"""
+Prueba de concurrencia de AddInventoryItemUseCase sobre el mismo producto.
+
+Lanza N altas en paralelo (una sesión por alta, como requests distintas)
+contra la misma bodega y producto, verifica que la existencia final sea
+la inicial más todas las unidades agregadas y que haya una sola fila, y
+reporta el throughput.
+
+Requiere PostgreSQL en DATABASE_URL (usa INSERT ... ON CONFLICT).
+
+Uso:
+    python -m benchmarks.bench_stock_upsert --adds 200 --packages 1
+"""
+import argparse
+import asyncio
+import sys
+import time
+
+
+async def run(adds: int, packages: int) -> dict:
+    from sqlalchemy import func, select
+    from app.application.dtos.dtos import InventoryItemCreateDTO
+    from app.application.use_cases.inventory_use_cases import AddInventoryItemUseCase
+    from app.infrastructure.persistence.database import AsyncSessionLocal, init_db, engine
+    from app.infrastructure.persistence.models import ProductModel, StockItemModel, WarehouseModel
+    from app.infrastructure.persistence.unit_of_work import UnitOfWork
+
+    await init_db()
+    async with AsyncSessionLocal() as session:
+        warehouse = WarehouseModel(name="Bodega concurrencia", location="Bench", capacity=adds)
+        product = ProductModel(name="Producto concurrencia", description="", price=1.0, units_per_package=6)
+        session.add_all([warehouse, product])
+        await session.commit()
+        warehouse_id, product_id, units = warehouse.id, product.id, product.units_per_package
+
+    async def one_add():
+        async with AsyncSessionLocal() as session, UnitOfWork(session) as uow:
+            use_case = AddInventoryItemUseCase(uow.inventory, uow.products, uow.warehouses)
+            await use_case.execute(InventoryItemCreateDTO(
+                warehouse_id=warehouse_id, product_id=product_id, packages_count=packages
+            ))
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one_add() for _ in range(adds)), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+
+    async with AsyncSessionLocal() as session:
+        rows, quantity = (await session.execute(
+            select(func.count(StockItemModel.id), func.coalesce(func.sum(StockItemModel.quantity), 0))
+            .where(StockItemModel.warehouse_id == warehouse_id, StockItemModel.product_id == product_id)
+        )).one()
+    await engine.dispose()
+
+    return {
+        "adds": adds,
+        "errors": sum(1 for r in results if isinstance(r, Exception)),
+        "rows": rows,
+        "final_quantity": quantity,
+        "expected_quantity": adds * packages * units,
+        "elapsed_s": round(elapsed, 3),
+        "adds_per_s": round(adds / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--adds", type=int, default=200)
+    parser.add_argument("--packages", type=int, default=1)
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.adds, args.packages))
+    for key, value in result.items():
+        print(f"  {key}: {value}")
+
+    if result["errors"] or result["rows"] != 1 or result["final_quantity"] != result["expected_quantity"]:
+        print("FALLA: se perdieron actualizaciones o se duplicaron filas")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
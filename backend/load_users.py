@@ -1,72 +1,78 @@
-import asyncio
-import httpx
-import sys
-from sqlalchemy.ext.asyncio import AsyncSession
-from app.infrastructure.persistence.database import AsyncSessionLocal, init_db
-from app.domain.entities.entities import User
-from app.infrastructure.persistence.repositories import UserRepository
-
-
-async def fetch_users_from_api():
-    url = "https://randomuser.me/api/?results=100"
-    
-    try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(url)
-            response.raise_for_status()
-            data = response.json()
-            
-            users = []
-            for result in data.get("results", []):
-                user = User(
-                    first_name=result["name"]["first"],
-                    last_name=result["name"]["last"],
-                    email=result["email"],
-                    phone=result["phone"],
-                    gender=result["gender"],
-                    nationality=result["location"]["country"],
-                    nat=result["nat"],
-                    username=result["login"]["username"],
-                    picture_url=result["picture"]["large"]
-                )
-                users.append(user)
-            
-            return users
-    except httpx.RequestError as e:
-        print(f"Error al conectar con la API: {e}")
-        sys.exit(1)
-    except Exception as e:
-        print(f"Error al procesar la respuesta: {e}")
-        sys.exit(1)
+"""
+Alta masiva de usuarios desde un archivo o desde randomuser.me.
 
+Uso:
+    python load_users.py                              # 100 usuarios de randomuser.me
+    python load_users.py --file personal.csv          # .csv, .json o .jsonl
+    python load_users.py --file personal.jsonl --report resultado.csv
 
-async def save_users_to_db(users: list):
-    async with AsyncSessionLocal() as session:
-        repository = UserRepository(session)
-        
-        for i, user in enumerate(users, 1):
-            try:
-                created_user = await repository.create(user)
-                print(f"[{i}/100] Usuario {created_user.username} guardado correctamente (ID: {created_user.id})")
-            except Exception as e:
-                print(f"Error al guardar usuario {user.username}: {e}")
-                continue
+Los usuarios sin columna password reciben la contraseña por defecto. Con
+muchas contraseñas propias conviene PASSWORD_HASH_EXECUTOR=process para
+repartir bcrypt entre varios núcleos.
+"""
+import argparse
+import asyncio
+import csv
+import sys
+import time
+import httpx
+from app.infrastructure.persistence.database import AsyncSessionLocal, init_db, engine
+from app.infrastructure.persistence.unit_of_work import UnitOfWork
+from app.application.use_cases.user_use_cases import LoadUsersUseCase
+from app.infrastructure.files import iter_user_rows, UserSourceFormatError
 
 
-async def main():
+async def main(file_path, report_path, chunk_size: int):
     print("Inicializando la base de datos")
     await init_db()
     print("Base de datos inicializada.")
     
-    print("\nObteniendo 100 usuarios de randomuser.me...")
-    users = await fetch_users_from_api()
-    print(f"Se obtuvieron {len(users)} usuarios exitosamente.")
+    report_file = open(report_path, "w", newline="", encoding="utf-8") if report_path else None
+    writer = csv.writer(report_file) if report_file else None
+    if writer:
+        writer.writerow(["row", "username", "status", "detail"])
+    
+    def on_row(result):
+        if writer:
+            writer.writerow([result.row, result.username or "", result.status, result.detail or ""])
     
-    print("\nGuardando usuarios en la base de datos...")
-    await save_users_to_db(users)
+    start = time.perf_counter()
+    try:
+        async with AsyncSessionLocal() as session, UnitOfWork(session) as uow:
+            use_case = LoadUsersUseCase(uow.users, on_row=on_row)
+            use_case.CHUNK_SIZE = chunk_size
+            if file_path:
+                print(f"\nCargando usuarios desde {file_path}...")
+                with open(file_path, "rb") as source:
+                    summary = await use_case.execute(iter_user_rows(source, file_path))
+            else:
+                print("\nObteniendo usuarios de randomuser.me...")
+                summary = await use_case.execute()
+    except (UserSourceFormatError, OSError) as e:
+        print(f"Error al leer el archivo: {e}")
+        sys.exit(1)
+    except httpx.HTTPError as e:
+        print(f"Error al conectar con la API: {e}")
+        sys.exit(1)
+    finally:
+        if report_file:
+            report_file.close()
+        await engine.dispose()
     
-    print("\n✓ Proceso completado. 100 usuarios cargados en la base de datos.")
+    elapsed = time.perf_counter() - start
+    print(f"\nFilas leídas: {summary.total_rows}")
+    print(f"Creados: {summary.total_loaded}  Omitidos: {summary.skipped}  Rechazados: {summary.rejected}")
+    print(f"Tiempo: {elapsed:.1f} s ({summary.total_rows / elapsed if elapsed else 0:.0f} filas/s)")
+    for result in summary.results[:20]:
+        print(f"  fila {result.row} ({result.username}): {result.status} - {result.detail}")
+    if report_path:
+        print(f"Reporte por fila en {report_path}")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", help="Archivo .csv, .json o .jsonl con los usuarios")
+    parser.add_argument("--report", help="Archivo CSV donde escribir el resultado de cada fila")
+    parser.add_argument("--chunk-size", type=int, default=LoadUsersUseCase.CHUNK_SIZE)
+    args = parser.parse_args()
+    asyncio.run(main(args.file, args.report, args.chunk_size))
@@ -1,7 +1,16 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.presentation.api.routes import users, products, warehouses, inventory, auth, inventory_counts
-from app.infrastructure.persistence.database import init_db
+from app.infrastructure.persistence.database import init_db, engine, get_pool_status
+from app.infrastructure.security import principal_cache
+from app.infrastructure.persistence.product_cache import product_cache
+from app.infrastructure.persistence.report_cache import report_cache
+from app.infrastructure.persistence.closed_count_cache import closed_count_cache
+from app.infrastructure.persistence.cache_bus import (
+    CACHE_BUS_ENABLED, PRODUCT, STOCK, USER, WAREHOUSE, cache_invalidation_listener
+)
+from app.infrastructure.security.password import shutdown_password_executor
+from app.presentation.api.single_flight import single_flight
 
 app = FastAPI(
     title="System Inventory API",
@@ -16,6 +25,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Rutas de autenticación (públicas)
@@ -29,9 +39,48 @@ app.include_router(inventory.router)
 app.include_router(inventory_counts.router)
 
 
+def register_cache_invalidation():
+    """Conecta los eventos del bus de invalidación con las cachés del proceso"""
+    cache_invalidation_listener.register(
+        PRODUCT, lambda product_id: product_cache.clear() if product_id is None else product_cache.invalidate([product_id])
+    )
+    cache_invalidation_listener.register(
+        USER, lambda user_id: principal_cache.clear() if user_id is None else principal_cache.invalidate(user_id)
+    )
+    # Los principals guardan ids de bodegas: al borrar una bodega el repositorio
+    # publica USER por cada usuario asignado, así que WAREHOUSE no los toca
+    cache_invalidation_listener.register(STOCK, report_cache.bump)
+    # Nombres y precios de productos y datos de bodegas aparecen en todos los reportes
+    cache_invalidation_listener.register(PRODUCT, lambda product_id: report_cache.bump())
+    cache_invalidation_listener.register(WAREHOUSE, lambda warehouse_id: report_cache.bump())
+    # El detalle de un conteo cerrado incluye el nombre de la bodega y del creador
+    cache_invalidation_listener.register(WAREHOUSE, closed_count_cache.invalidate_warehouse)
+    cache_invalidation_listener.register(USER, closed_count_cache.invalidate_creator)
+
+
+register_cache_invalidation()
+
+
 @app.on_event("startup")
 async def startup():
     await init_db()
+    if CACHE_BUS_ENABLED:
+        cache_invalidation_listener.start()
+        # Se precalienta ya escuchando: así no se pierde ningún evento
+        if not await cache_invalidation_listener.wait_connected():
+            print("⚠️  El listener de invalidación aún no conecta; se vaciarán las cachés al conectar")
+    try:
+        warmed = await inventory.warm_inventory_reports()
+        print(f"✅ Caché de reportes precalentada ({warmed} reportes)")
+    except Exception as e:
+        print(f"⚠️  No se pudo precalentar la caché de reportes: {e}")
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await cache_invalidation_listener.stop()
+    await engine.dispose()
+    shutdown_password_executor()
 
 
 @app.get("/health", tags=["health"])
@@ -39,6 +88,41 @@ async def health_check():
     return {"status": "ok", "message": "API funcionando correctamente"}
 
 
+@app.get("/health/pool", tags=["health"])
+async def pool_health_check():
+    return get_pool_status()
+
+
+@app.get("/health/auth-cache", tags=["health"])
+async def auth_cache_health_check():
+    return principal_cache.snapshot()
+
+
+@app.get("/health/product-cache", tags=["health"])
+async def product_cache_health_check():
+    return product_cache.snapshot()
+
+
+@app.get("/health/report-cache", tags=["health"])
+async def report_cache_health_check():
+    return report_cache.snapshot()
+
+
+@app.get("/health/closed-count-cache", tags=["health"])
+async def closed_count_cache_health_check():
+    return closed_count_cache.snapshot()
+
+
+@app.get("/health/single-flight", tags=["health"])
+async def single_flight_health_check():
+    return single_flight.snapshot()
+
+
+@app.get("/health/cache-bus", tags=["health"])
+async def cache_bus_health_check():
+    return cache_invalidation_listener.snapshot()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,137 @@
+import asyncio
+import json
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from sqlalchemy.dialects import postgresql
+from app.infrastructure.persistence.cache_bus import (
+    CHANNEL, PRODUCT, USER, CacheInvalidationListener, publish_invalidation, send_pending_invalidations
+)
+
+
+class FakeConnection:
+    """Conexión de asyncpg mínima: el ping falla cuando se indica"""
+
+    def __init__(self, fail_ping: bool):
+        self.fail_ping = fail_ping
+        self.listeners = {}
+        self.closed = False
+
+    def add_termination_listener(self, callback):
+        self.on_terminate = callback
+
+    async def add_listener(self, channel, callback):
+        self.listeners[channel] = callback
+
+    async def execute(self, query):
+        if self.fail_ping:
+            raise ConnectionResetError("conexión perdida")
+
+    def is_closed(self):
+        return self.closed
+
+    def terminate(self):
+        self.closed = True
+
+
+@pytest.mark.asyncio
+async def test_invalidations_are_sent_once_per_transaction():
+    session = AsyncMock()
+    session.info = {}
+
+    publish_invalidation(session, PRODUCT, 5)
+    publish_invalidation(session, USER, 2)
+    publish_invalidation(session, PRODUCT, 5)
+    session.execute.assert_not_called()
+    await send_pending_invalidations(session)
+
+    # Una sola sentencia, un pg_notify por evento distinto
+    session.execute.assert_awaited_once()
+    sql = session.execute.await_args.args[0].compile(dialect=postgresql.dialect())
+    assert str(sql).count("pg_notify(") == 2
+    assert CHANNEL in sql.params.values()
+    assert [json.loads(value) for value in sql.params.values() if value != CHANNEL] == [
+        {"entity": "product", "id": 5}, {"entity": "user", "id": 2}
+    ]
+
+
+def test_dispatch_routes_events_and_flushes_on_bad_payload():
+    listener = CacheInvalidationListener(dsn="postgresql://test")
+    products, users = MagicMock(), MagicMock()
+    listener.register(PRODUCT, products)
+    listener.register(USER, users)
+
+    listener.dispatch(json.dumps({"entity": "product", "id": 7}))
+    products.assert_called_once_with(7)
+    users.assert_not_called()
+
+    listener.dispatch("no es json")
+    products.assert_called_with(None)
+    users.assert_called_once_with(None)
+    assert listener.snapshot()["received"] == 2
+
+
+@pytest.mark.asyncio
+async def test_listener_flushes_and_reconnects_when_connection_drops():
+    listener = CacheInvalidationListener(dsn="postgresql://test", ping_interval=0.01, reconnect_max=0.01)
+    handler = MagicMock()
+    listener.register(PRODUCT, handler)
+    dropped, healthy = FakeConnection(fail_ping=True), FakeConnection(fail_ping=False)
+    connect = AsyncMock(side_effect=[dropped, healthy])
+
+    with patch("asyncpg.connect", connect):
+        listener.start()
+        assert await listener.wait_connected(1)
+        for _ in range(100):
+            if connect.await_count == 2 and listener.connected:
+                break
+            await asyncio.sleep(0.01)
+
+        healthy.listeners[CHANNEL](healthy, 1, CHANNEL, json.dumps({"entity": "product", "id": 3}))
+        await listener.stop()
+
+    assert dropped.closed
+    assert listener.disconnects == 1
+    handler.assert_any_call(3)
+    # La primera conexión no vacía (no hay nada cacheado sin escuchar);
+    # al caerse, al reconectar y al detenerse sí
+    assert [c.args for c in handler.call_args_list].count((None,)) == 3
+
+
+@pytest.mark.asyncio
+async def test_first_connection_flushes_only_if_startup_stopped_waiting():
+    listener = CacheInvalidationListener(dsn="postgresql://test", ping_interval=10)
+    handler = MagicMock()
+    listener.register(PRODUCT, handler)
+
+    assert not await listener.wait_connected(0.01)
+    with patch("asyncpg.connect", AsyncMock(return_value=FakeConnection(fail_ping=False))):
+        listener.start()
+        assert await listener.wait_connected(1)
+        handler.assert_called_once_with(None)
+        await listener.stop()
+
+
+@pytest.mark.asyncio
+async def test_pending_events_apply_locally_on_commit_only():
+    from sqlalchemy.orm import Session
+    from app.infrastructure.persistence import cache_bus
+
+    handler = MagicMock()
+    listener = CacheInvalidationListener(dsn="postgresql://test")
+    listener.register(PRODUCT, handler)
+    session = Session()
+    async_session = AsyncMock()
+    async_session.info = session.info
+
+    with patch.object(cache_bus, "cache_invalidation_listener", listener):
+        session.begin()
+        publish_invalidation(async_session, PRODUCT, 4)
+        session.rollback()
+        handler.assert_not_called()
+
+        session.begin()
+        publish_invalidation(async_session, PRODUCT, 5)
+        session.commit()
+
+    handler.assert_called_once_with(5)
+    assert listener.snapshot()["received"] == 0
@@ -0,0 +1,117 @@
+import json
+import pytest
+from datetime import date, datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi import HTTPException, Response
+from app.infrastructure.persistence.closed_count_cache import CachedBody, ClosedCountCache, ClosedCountSnapshot
+from app.infrastructure.persistence.models import InventoryCountStatus, UserRole
+from app.infrastructure.security.principal_cache import Principal
+from app.presentation.api.http_cache import REVALIDATE_CACHE_CONTROL, etag_matches, revalidating_response
+from app.presentation.api.routes import inventory_counts
+
+
+def make_snapshot(count_id, warehouse_id=1, created_by=1, size=10):
+    return ClosedCountSnapshot(
+        count_id=count_id, warehouse_id=warehouse_id, created_by=created_by,
+        detail=CachedBody.of(b"d" * size), items=CachedBody.of(b"[]")
+    )
+
+
+def make_count(status):
+    item = SimpleNamespace(
+        id=5, count_id=7, warehouse_id=2, product_id=3, packages_count=1, quantity=12,
+        created_at=datetime(2024, 1, 1), updated_at=datetime(2024, 1, 1)
+    )
+    return SimpleNamespace(
+        id=7, name="Cierre enero", cut_off_date=date(2024, 1, 31), warehouse_id=2,
+        warehouse=SimpleNamespace(name="Central"), status=status, created_by=1,
+        creator=SimpleNamespace(username="admin"), created_at=datetime(2024, 1, 1),
+        closed_at=datetime(2024, 2, 1), items=[item], version=3
+    )
+
+
+def make_uow(count):
+    uow = MagicMock()
+    uow.inventory.get_count_by_id = AsyncMock(return_value=count)
+    return uow
+
+
+def test_cache_is_bounded_by_bytes_and_invalidated_by_warehouse_or_creator():
+    cache = ClosedCountCache(max_bytes=30)
+    for count_id in (1, 2):
+        cache.put(make_snapshot(count_id, warehouse_id=count_id, created_by=count_id))
+    cache.put(make_snapshot(3, warehouse_id=1, created_by=2))
+    cache.put(make_snapshot(4, size=100))
+
+    assert cache.get(1) is None
+    assert cache.get(4) is None
+    cache.invalidate_warehouse(1)
+    assert cache.get(3) is None
+    cache.invalidate_creator(2)
+    assert cache.snapshot()["entries"] == 0
+    assert cache.snapshot()["bytes"] == 0
+
+
+def test_revalidating_response_uses_strong_etag_and_no_cache():
+    cached = CachedBody.of(b'{"id": 1}')
+
+    response = revalidating_response(cached)
+    not_modified = revalidating_response(cached, f'"otro", {cached.etag}')
+
+    assert response.body == b'{"id": 1}'
+    assert response.headers["Cache-Control"] == REVALIDATE_CACHE_CONTROL == "private, no-cache"
+    assert not cached.etag.startswith("W/")
+    assert not_modified.status_code == 304
+    assert not_modified.headers["ETag"] == cached.etag
+    assert not etag_matches(None, cached.etag)
+
+
+@pytest.mark.asyncio
+async def test_closed_count_is_served_without_database_after_first_view():
+    cache = ClosedCountCache()
+    uow = make_uow(make_count(InventoryCountStatus.CLOSED))
+    admin = Principal(id=1, username="admin", role=UserRole.ADMIN, warehouse_ids=frozenset())
+
+    with patch.object(inventory_counts, "closed_count_cache", cache):
+        first = await inventory_counts.get_inventory_count_detail(Response(), 7, None, uow, admin)
+        items = await inventory_counts.get_count_items(7, None, uow, admin)
+        again = await inventory_counts.get_inventory_count_detail(Response(), 7, first.headers["ETag"], uow, admin)
+
+    assert uow.inventory.get_count_by_id.await_count == 1
+    assert json.loads(first.body)["warehouse_name"] == "Central"
+    assert [item["id"] for item in json.loads(items.body)] == [5]
+    assert again.status_code == 304
+
+
+@pytest.mark.asyncio
+async def test_cached_closed_count_still_checks_warehouse_permissions():
+    cache = ClosedCountCache()
+    cache.put(make_snapshot(7, warehouse_id=2))
+    uow = make_uow(None)
+    user = Principal(id=9, username="ana", role=UserRole.USER, warehouse_ids=frozenset({1}))
+
+    with patch.object(inventory_counts, "closed_count_cache", cache):
+        with pytest.raises(HTTPException) as exc_info:
+            await inventory_counts.get_count_items(7, None, uow, user)
+
+    assert exc_info.value.status_code == 403
+    uow.inventory.get_count_by_id.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_open_count_is_not_cached():
+    cache = ClosedCountCache()
+    uow = make_uow(make_count(InventoryCountStatus.IN_PROGRESS))
+    admin = Principal(id=1, username="admin", role=UserRole.ADMIN, warehouse_ids=frozenset())
+
+    response = Response()
+
+    with patch.object(inventory_counts, "closed_count_cache", cache):
+        result = await inventory_counts.get_inventory_count_detail(response, 7, None, uow, admin)
+        await inventory_counts.get_inventory_count_detail(Response(), 7, None, uow, admin)
+
+    assert result.status == "in_progress"
+    assert response.headers["ETag"] == '"3"'
+    assert uow.inventory.get_count_by_id.await_count == 2
+    assert cache.snapshot()["entries"] == 0
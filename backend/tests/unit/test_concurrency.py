@@ -0,0 +1,33 @@
+import pytest
+from fastapi import HTTPException, Response
+from app.domain.exceptions import VersionConflictError
+from app.presentation.api.concurrency import conflict_exception, expected_version_from, set_etag
+
+
+@pytest.mark.parametrize("if_match,expected_version,result", [
+    (None, None, None),
+    (None, 4, 4),
+    ('"7"', None, 7),
+    ('W/"7"', 7, 7),
+    ("*", 2, 2),
+])
+def test_expected_version_from(if_match, expected_version, result):
+    assert expected_version_from(if_match, expected_version) == result
+
+
+@pytest.mark.parametrize("if_match,expected_version", [('"abc"', None), ('"3"', 4)])
+def test_expected_version_invalid(if_match, expected_version):
+    with pytest.raises(HTTPException) as exc:
+        expected_version_from(if_match, expected_version)
+    assert exc.value.status_code == 400
+
+
+def test_conflict_returns_409_with_current_version():
+    response = Response()
+    set_etag(response, 3)
+    assert response.headers["ETag"] == '"3"'
+    
+    exc = conflict_exception(VersionConflictError("Inventory item", 10, 5))
+    assert exc.status_code == 409
+    assert exc.detail["current_version"] == 5
+    assert exc.headers["ETag"] == '"5"'
@@ -0,0 +1,39 @@
+import io
+import pytest
+from app.infrastructure.files import iter_count_sheet_rows, CountSheetFormatError
+
+
+def test_csv_rows_with_bom_and_blank_lines():
+    content = "﻿Product_ID,nombre,packages_count\n1,Leche,10\n\n2,Arroz,\n".encode("utf-8")
+    
+    rows = list(iter_count_sheet_rows(io.BytesIO(content), "conteo.CSV"))
+    
+    assert rows == [
+        (2, {"product_id": "1", "packages_count": "10"}),
+        (4, {"product_id": "2", "packages_count": ""}),
+    ]
+
+
+def test_csv_missing_columns():
+    with pytest.raises(CountSheetFormatError):
+        list(iter_count_sheet_rows(io.BytesIO(b"product_id,cantidad\n1,2\n"), "conteo.csv"))
+
+
+def test_unsupported_extension():
+    with pytest.raises(CountSheetFormatError):
+        list(iter_count_sheet_rows(io.BytesIO(b""), "conteo.txt"))
+
+
+def test_xlsx_rows():
+    openpyxl = pytest.importorskip("openpyxl")
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(["product_id", "packages_count"])
+    sheet.append([7, 12.0])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    buffer.seek(0)
+    
+    rows = list(iter_count_sheet_rows(buffer, "conteo.xlsx"))
+    
+    assert rows == [(2, {"product_id": "7", "packages_count": "12"})]
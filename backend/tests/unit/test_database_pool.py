@@ -0,0 +1,37 @@
+import pytest
+from sqlalchemy.pool import NullPool
+from app.infrastructure.persistence.database import (
+    PoolCheckoutStats, InstrumentedQueuePool, build_engine
+)
+
+
+def test_pool_checkout_stats():
+    stats = PoolCheckoutStats()
+    stats.record(0.010)
+    stats.record(0.030)
+    stats.record(5.0, timed_out=True)
+
+    snapshot = stats.snapshot()
+
+    assert snapshot["checkouts"] == 2
+    assert snapshot["timeouts"] == 1
+    assert snapshot["avg_wait_ms"] == 20.0
+    assert snapshot["max_wait_ms"] == 30.0
+
+
+def test_build_engine_queue_mode():
+    engine = build_engine("queue")
+
+    assert isinstance(engine.pool, InstrumentedQueuePool)
+    assert engine.echo is False
+
+
+def test_build_engine_null_mode():
+    engine = build_engine("null")
+
+    assert isinstance(engine.pool, NullPool)
+
+
+def test_build_engine_invalid_mode():
+    with pytest.raises(ValueError):
+        build_engine("bogus")
@@ -0,0 +1,189 @@
+import pytest
+import threading
+from datetime import date, datetime
+from unittest.mock import AsyncMock
+from app.domain.entities.entities import Product
+from app.application.use_cases.inventory_count_use_cases import (
+    AddItemsBatchToCountUseCase, ImportCountSheetUseCase, GetInventoryCountsUseCase,
+    CloseInventoryCountUseCase
+)
+from app.application.dtos.dtos import InventoryItemCreateDTO
+from app.domain.exceptions import VersionConflictError
+from app.infrastructure.persistence.models import (
+    InventoryCountModel, InventoryCountStatus, InventoryItemModel
+)
+
+
+def open_count():
+    return InventoryCountModel(id=5, warehouse_id=3, status=InventoryCountStatus.IN_PROGRESS)
+
+
+def echo_created(rows):
+    return [
+        InventoryItemModel(id=index + 1, **row)
+        for index, row in enumerate(rows)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_add_items_batch_single_lookup_and_insert():
+    inventory_repo = AsyncMock()
+    inventory_repo.create_many.side_effect = echo_created
+    product_repo = AsyncMock()
+    product_repo.get_many.return_value = {
+        1: Product(id=1, name="Gaseosa", units_per_package=24),
+        2: Product(id=2, name="Jabón", units_per_package=6),
+    }
+    dtos = [
+        InventoryItemCreateDTO(warehouse_id=99, product_id=1, packages_count=10),
+        InventoryItemCreateDTO(warehouse_id=99, product_id=404, packages_count=1),
+        InventoryItemCreateDTO(warehouse_id=99, product_id=2, packages_count=3),
+        InventoryItemCreateDTO(warehouse_id=99, product_id=1, packages_count=-1),
+    ]
+    
+    use_case = AddItemsBatchToCountUseCase(inventory_repo, product_repo)
+    result = await use_case.execute(5, dtos, open_count())
+    
+    product_repo.get_many.assert_awaited_once()
+    product_repo.get_by_id.assert_not_called()
+    inventory_repo.create_many.assert_awaited_once()
+    inventory_repo.get_count_header.assert_not_called()
+    assert [item.quantity for item in result.created] == [240, 18]
+    assert all(item.warehouse_id == 3 and item.count_id == 5 for item in result.created)
+    assert [(error.index, error.product_id) for error in result.errors] == [(1, 404), (3, 1)]
+
+
+@pytest.mark.asyncio
+async def test_add_items_batch_closed_count():
+    count = open_count()
+    count.status = InventoryCountStatus.CLOSED
+    
+    use_case = AddItemsBatchToCountUseCase(AsyncMock(), AsyncMock())
+    
+    with pytest.raises(ValueError):
+        await use_case.execute(5, [InventoryItemCreateDTO(warehouse_id=3, product_id=1, packages_count=1)], count)
+
+
+@pytest.mark.asyncio
+async def test_import_count_sheet_chunks_with_cached_products():
+    inventory_repo = AsyncMock()
+    inventory_repo.bulk_insert_items.side_effect = lambda rows: len(rows)
+    product_repo = AsyncMock()
+    product_repo.get_many.side_effect = lambda ids: {
+        product_id: Product(id=product_id, units_per_package=12) for product_id in ids if product_id != 404
+    }
+    rows = [(n + 2, {"product_id": str(n % 3 + 1), "packages_count": "2"}) for n in range(7)]
+    rows.append((9, {"product_id": "404", "packages_count": "1"}))
+    rows.append((10, {"product_id": "x", "packages_count": "1"}))
+    
+    use_case = ImportCountSheetUseCase(inventory_repo, product_repo)
+    use_case.CHUNK_SIZE = 3
+    summary = await use_case.execute(5, rows, open_count())
+    
+    assert summary.total_rows == 9
+    assert summary.accepted == 7
+    assert summary.rejected == 2
+    assert sorted(error.row for error in summary.errors) == [9, 10]
+    # Los productos 1-3 se consultan una vez; luego solo el 404
+    assert product_repo.get_many.await_count == 2
+    assert inventory_repo.bulk_insert_items.await_count == 3
+    inserted = inventory_repo.bulk_insert_items.await_args_list[0].args[0]
+    assert inserted[0]["quantity"] == 24 and inserted[0]["warehouse_id"] == 3
+
+
+@pytest.mark.asyncio
+async def test_import_count_sheet_reads_rows_off_the_event_loop():
+    inventory_repo = AsyncMock()
+    inventory_repo.bulk_insert_items.side_effect = lambda rows: len(rows)
+    product_repo = AsyncMock()
+    product_repo.get_many.side_effect = lambda ids: {1: Product(id=1, units_per_package=6)}
+    reader_threads = set()
+    
+    def read_sheet():
+        for row_number in range(2, 6):
+            reader_threads.add(threading.get_ident())
+            yield row_number, {"product_id": "1", "packages_count": "1"}
+    
+    use_case = ImportCountSheetUseCase(inventory_repo, product_repo)
+    use_case.CHUNK_SIZE = 2
+    summary = await use_case.execute(5, read_sheet(), open_count())
+    
+    assert summary.accepted == 4
+    assert inventory_repo.bulk_insert_items.await_count == 2
+    assert threading.get_ident() not in reader_threads
+
+
+@pytest.mark.asyncio
+async def test_get_inventory_counts_uses_aggregates():
+    count = InventoryCountModel(
+        id=8, name="Cierre mes", cut_off_date=date(2024, 5, 31), warehouse_id=3,
+        status=InventoryCountStatus.IN_PROGRESS, created_by=1, created_at=datetime(2024, 5, 31)
+    )
+    inventory_repo = AsyncMock()
+    inventory_repo.get_counts.return_value = [(count, "Bodega Norte", "admin", 120, 4800)]
+    
+    use_case = GetInventoryCountsUseCase(inventory_repo)
+    result = await use_case.execute(warehouse_ids=[3], date_from=date(2024, 5, 1), before_id=20, limit=10)
+    
+    inventory_repo.get_counts.assert_awaited_once_with(
+        warehouse_id=None, status=None, warehouse_ids=[3], date_from=date(2024, 5, 1),
+        date_to=None, before_id=20, limit=10
+    )
+    assert result[0].items_count == 120
+    assert result[0].total_units == 4800
+    assert result[0].warehouse_name == "Bodega Norte"
+    assert result[0].creator_username == "admin"
+
+
+@pytest.mark.asyncio
+async def test_close_inventory_count_reconciles_with_lock():
+    count = InventoryCountModel(
+        id=8, name="Cierre mes", cut_off_date=date(2024, 5, 31), warehouse_id=3,
+        status=InventoryCountStatus.IN_PROGRESS, created_by=1, created_at=datetime(2024, 5, 31)
+    )
+    inventory_repo = AsyncMock()
+    inventory_repo.get_count_header.return_value = count
+    
+    async def reconcile(count, closed_at):
+        count.status = InventoryCountStatus.CLOSED
+        count.closed_at = closed_at
+        return {"items_count": 50000, "total_units": 600000, "adjusted_products": 12}
+    inventory_repo.close_and_reconcile_count.side_effect = reconcile
+    
+    use_case = CloseInventoryCountUseCase(inventory_repo)
+    result = await use_case.execute(8)
+    
+    inventory_repo.get_count_header.assert_awaited_once_with(8, lock="update", with_relations=True)
+    inventory_repo.get_count_by_id.assert_not_called()
+    assert result.status == "closed"
+    assert result.items_count == 50000
+    assert result.total_units == 600000
+
+
+@pytest.mark.asyncio
+async def test_close_inventory_count_already_closed():
+    inventory_repo = AsyncMock()
+    inventory_repo.get_count_header.return_value = InventoryCountModel(
+        id=8, warehouse_id=3, status=InventoryCountStatus.CLOSED
+    )
+    
+    use_case = CloseInventoryCountUseCase(inventory_repo)
+    
+    with pytest.raises(ValueError):
+        await use_case.execute(8)
+    inventory_repo.close_and_reconcile_count.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_close_inventory_count_version_conflict():
+    inventory_repo = AsyncMock()
+    inventory_repo.get_count_header.return_value = InventoryCountModel(
+        id=8, warehouse_id=3, status=InventoryCountStatus.IN_PROGRESS, version=4
+    )
+    
+    use_case = CloseInventoryCountUseCase(inventory_repo)
+    
+    with pytest.raises(VersionConflictError) as exc:
+        await use_case.execute(8, expected_version=3)
+    assert exc.value.current_version == 4
+    inventory_repo.close_and_reconcile_count.assert_not_called()
@@ -0,0 +1,375 @@
+import json
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock
+from sqlalchemy.dialects import postgresql
+from app.infrastructure.persistence.models import (
+    WarehouseModel, InventoryCountModel, InventoryCountStatus, InventoryItemModel, ProductModel,
+    StockCheckpointModel, StockItemModel
+)
+from app.application.dtos.dtos import InventoryItemCreateDTO
+from app.domain.exceptions import VersionConflictError
+from app.infrastructure.persistence.cache_bus import STOCK
+from app.infrastructure.persistence.repositories import InventoryRepository
+from app.application.use_cases.inventory_use_cases import (
+    AddInventoryItemUseCase, GetWarehouseInventoryUseCase, GetAllWarehouseInventoryUseCase,
+    UpdateInventoryQuantityUseCase,
+    ExportInventoryUseCase, GetWarehouseStockAsOfUseCase
+)
+
+
+def build_rows(warehouses_count, products_count):
+    products = [
+        ProductModel(id=p, name=f"Producto {p}", description="", price=10.0 * p,
+                     packaging_unit="Caja", units_per_package=12)
+        for p in range(1, products_count + 1)
+    ]
+    rows = []
+    item_id = 1
+    for w in range(1, warehouses_count + 1):
+        warehouse = WarehouseModel(id=w, name=f"Bodega {w}", location="Centro", capacity=1000)
+        for product in products:
+            item = StockItemModel(id=item_id, warehouse_id=w, product_id=product.id, quantity=5)
+            rows.append((warehouse, item, product))
+            item_id += 1
+    # Bodega sin inventario (outer join)
+    empty = WarehouseModel(id=warehouses_count + 1, name="Vacía", location="Norte", capacity=10)
+    rows.append((empty, None, None))
+    return rows
+
+
+def mock_session(rows):
+    session = AsyncMock()
+    result = MagicMock()
+    result.all.return_value = rows
+    session.execute.return_value = result
+    return session
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("warehouses_count,products_count", [(1, 1), (5, 20), (40, 250)])
+async def test_get_all_warehouse_inventory_constant_queries(warehouses_count, products_count):
+    session = mock_session(build_rows(warehouses_count, products_count))
+    
+    use_case = GetAllWarehouseInventoryUseCase(InventoryRepository(session))
+    result = await use_case.execute()
+    
+    assert session.execute.await_count == 1
+    assert len(result) == warehouses_count + 1
+    assert len(result[0].items) == products_count
+    assert result[0].total_products_count == 5 * products_count
+    assert result[-1].items == []
+    assert result[-1].total_products_count == 0
+
+
+@pytest.mark.asyncio
+async def test_get_warehouse_inventory_single_query():
+    session = mock_session([row for row in build_rows(1, 30) if row[1] is not None])
+    
+    use_case = GetWarehouseInventoryUseCase(InventoryRepository(session))
+    result = await use_case.execute(1)
+    
+    assert session.execute.await_count == 1
+    assert result.warehouse_id == 1
+    assert len(result.items) == 30
+    assert result.items[0].product_name == "Producto 1"
+
+
+@pytest.mark.asyncio
+async def test_get_warehouse_inventory_not_found():
+    mock_repository = AsyncMock()
+    mock_repository.get_warehouse_inventory.return_value = []
+    
+    use_case = GetWarehouseInventoryUseCase(mock_repository)
+    
+    with pytest.raises(ValueError):
+        await use_case.execute(99)
+
+
+@pytest.mark.asyncio
+async def test_update_inventory_quantity_keyed_update():
+    mock_repository = AsyncMock()
+    mock_repository.update_quantity.return_value = StockItemModel(
+        id=150, warehouse_id=1, product_id=2, quantity=40, version=3,
+        created_at=datetime(2024, 1, 1), updated_at=datetime(2024, 1, 2)
+    )
+    
+    use_case = UpdateInventoryQuantityUseCase(mock_repository)
+    result = await use_case.execute(150, 40)
+    
+    mock_repository.update_quantity.assert_awaited_once_with(150, 40, None)
+    mock_repository.get_all.assert_not_called()
+    assert result.id == 150
+    assert result.quantity == 40
+    assert result.version == 3
+
+
+@pytest.mark.asyncio
+async def test_update_quantity_conditional_on_version():
+    session = AsyncMock()
+    no_row = MagicMock()
+    no_row.one_or_none.return_value = None
+    current = MagicMock()
+    current.scalar_one_or_none.return_value = 8
+    session.execute.side_effect = [MagicMock(), no_row, current]
+    
+    with pytest.raises(VersionConflictError) as exc:
+        await InventoryRepository(session).update_quantity(150, 40, expected_version=7)
+    
+    assert exc.value.current_version == 8
+    sql = str(session.execute.await_args_list[1].args[0].compile(dialect=postgresql.dialect()))
+    assert "AND stock_items.version = %(version_2)s" in sql
+    assert "FOR UPDATE" not in sql
+
+
+@pytest.mark.asyncio
+async def test_update_quantities_batch_reports_conflicts():
+    session = AsyncMock()
+    session.add = MagicMock()
+    updated = MagicMock()
+    updated.all.return_value = [
+        (StockItemModel(id=1, warehouse_id=1, product_id=1, quantity=30, version=3), 10)
+    ]
+    current = MagicMock()
+    current.__iter__.return_value = iter([MagicMock(id=2, quantity=7, version=5)])
+    session.info = {}
+    session.execute.side_effect = [MagicMock(), updated, current, MagicMock(), MagicMock()]
+    
+    results = await InventoryRepository(session).update_quantities([
+        {"id": 1, "quantity": 30, "expected_version": 2},
+        {"id": 2, "quantity": 9, "expected_version": 4},
+        {"id": 3, "quantity": 1, "expected_version": 1},
+    ])
+    
+    assert [r["status"] for r in results] == ["updated", "conflict", "not_found"]
+    assert results[1] == {"id": 2, "status": "conflict", "quantity": 7, "version": 5}
+    sql = str(session.execute.await_args_list[1].args[0].compile(dialect=postgresql.dialect()))
+    assert "JOIN (VALUES" in sql
+    assert "stock_items.version = anon_1.expected_version" in sql
+    # El commit lo hace la unidad de trabajo del request
+    session.flush.assert_awaited_once()
+    session.commit.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_update_inventory_quantity_not_found():
+    mock_repository = AsyncMock()
+    mock_repository.update_quantity.return_value = None
+    
+    use_case = UpdateInventoryQuantityUseCase(mock_repository)
+    
+    with pytest.raises(ValueError):
+        await use_case.execute(999, 10)
+
+
+def add_item_repositories():
+    now = datetime(2024, 1, 1)
+    inventory_repo = AsyncMock()
+    inventory_repo.upsert_stock.side_effect = lambda warehouse_id, product_id, quantity, increment: StockItemModel(
+        id=20, warehouse_id=warehouse_id, product_id=product_id,
+        quantity=24 + quantity if increment else quantity, created_at=now, updated_at=now
+    )
+    inventory_repo.create.side_effect = lambda item: InventoryItemModel(
+        id=30, count_id=item.count_id, warehouse_id=item.warehouse_id, product_id=item.product_id,
+        packages_count=item.packages_count, quantity=item.quantity, created_at=now, updated_at=now
+    )
+    product_repo = AsyncMock()
+    product_repo.get_by_id.return_value = ProductModel(id=2, name="Leche", units_per_package=12)
+    warehouse_repo = AsyncMock()
+    warehouse_repo.get_by_id.return_value = WarehouseModel(id=1, name="Bodega 1")
+    return inventory_repo, product_repo, warehouse_repo
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode,increment,expected", [("increment", True, 60), ("set", False, 36)])
+async def test_add_inventory_item_upserts_stock(mode, increment, expected):
+    inventory_repo, product_repo, warehouse_repo = add_item_repositories()
+    
+    use_case = AddInventoryItemUseCase(inventory_repo, product_repo, warehouse_repo)
+    result = await use_case.execute(
+        InventoryItemCreateDTO(warehouse_id=1, product_id=2, packages_count=3, mode=mode)
+    )
+    
+    inventory_repo.upsert_stock.assert_awaited_once_with(1, 2, 36, increment=increment)
+    inventory_repo.get_by_warehouse_and_product.assert_not_called()
+    assert result.id == 20
+    assert result.quantity == expected
+    assert result.count_id is None
+
+
+@pytest.mark.asyncio
+async def test_add_inventory_item_count_line_does_not_touch_stock():
+    inventory_repo, product_repo, warehouse_repo = add_item_repositories()
+    inventory_repo.get_count_header.return_value = InventoryCountModel(
+        id=5, warehouse_id=1, status=InventoryCountStatus.IN_PROGRESS
+    )
+    
+    use_case = AddInventoryItemUseCase(inventory_repo, product_repo, warehouse_repo)
+    result = await use_case.execute(
+        InventoryItemCreateDTO(count_id=5, warehouse_id=1, product_id=2, packages_count=1)
+    )
+    
+    assert result.count_id == 5
+    assert result.quantity == 12
+    inventory_repo.get_count_header.assert_awaited_once_with(5, lock="share")
+    inventory_repo.upsert_stock.assert_not_called()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("warehouse_id,status", [
+    (1, InventoryCountStatus.CLOSED), (2, InventoryCountStatus.IN_PROGRESS)
+])
+async def test_add_inventory_item_rejects_closed_or_foreign_count(warehouse_id, status):
+    inventory_repo, product_repo, warehouse_repo = add_item_repositories()
+    inventory_repo.get_count_header.return_value = InventoryCountModel(id=5, warehouse_id=warehouse_id, status=status)
+    
+    use_case = AddInventoryItemUseCase(inventory_repo, product_repo, warehouse_repo)
+    with pytest.raises(ValueError):
+        await use_case.execute(InventoryItemCreateDTO(count_id=5, warehouse_id=1, product_id=2, packages_count=1))
+    
+    inventory_repo.create.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_upsert_stock_single_statement_increment():
+    session = AsyncMock()
+    session.add = MagicMock()
+    upsert_result = MagicMock()
+    upsert_result.one.return_value = (
+        StockItemModel(id=20, warehouse_id=1, product_id=2, quantity=60), False
+    )
+    session.info = {}
+    session.execute.side_effect = [MagicMock(), upsert_result, MagicMock()]
+    
+    stock_item = await InventoryRepository(session).upsert_stock(1, 2, 36)
+    
+    assert stock_item.quantity == 60
+    lock = str(session.execute.await_args_list[0].args[0].compile(dialect=postgresql.dialect()))
+    assert "pg_advisory_xact_lock_shared" in lock
+    statement = session.execute.await_args_list[1].args[0]
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+    assert "ON CONFLICT (warehouse_id, product_id) DO UPDATE" in sql
+    assert "quantity = (stock_items.quantity + excluded.quantity)" in sql
+    assert "RETURNING" in sql
+    # Lock de la bodega, upsert y movimiento en la misma transacción; el aviso
+    # de generación queda anotado para el commit
+    assert session.execute.await_count == 3
+    assert session.info["cache_invalidation_events"] == [(STOCK, 1)]
+    session.flush.assert_awaited_once()
+    session.commit.assert_not_called()
+
+
+class StreamingRepository:
+    """Repositorio falso que entrega el inventario en lotes"""
+    
+    def __init__(self, batches):
+        self.batches = batches
+        self.requested = None
+    
+    async def stream_inventory_rows(self, warehouse_ids=None, batch_size=1000):
+        self.requested = (warehouse_ids, batch_size)
+        for batch in self.batches:
+            yield batch
+
+
+def export_row(item_id):
+    return {
+        "item_id": item_id, "count_id": None, "warehouse_id": 1, "warehouse_name": "Bodega, Centro",
+        "product_id": 7, "product_name": "Leche", "packages_count": 2, "quantity": 24, "version": 3
+    }
+
+
+@pytest.mark.asyncio
+async def test_export_inventory_ndjson_one_chunk_per_batch():
+    repository = StreamingRepository([[export_row(1), export_row(2)], [export_row(3)]])
+    
+    use_case = ExportInventoryUseCase(repository, batch_size=2)
+    chunks = [chunk async for chunk in use_case.execute("ndjson", [1])]
+    
+    assert repository.requested == ([1], 2)
+    assert len(chunks) == 2
+    lines = "".join(chunks).splitlines()
+    assert [json.loads(line)["item_id"] for line in lines] == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_export_inventory_csv_header_and_quoting():
+    repository = StreamingRepository([[export_row(1)]])
+    
+    use_case = ExportInventoryUseCase(repository)
+    output = "".join([chunk async for chunk in use_case.execute("csv")])
+    
+    header, line = output.splitlines()
+    assert header.split(",") == ExportInventoryUseCase.COLUMNS
+    assert line == '1,,1,"Bodega, Centro",7,Leche,2,24,3'
+
+
+@pytest.mark.asyncio
+async def test_stock_as_of_replays_only_movements_after_checkpoint():
+    checkpoint = StockCheckpointModel(
+        id=3, warehouse_id=1, last_movement_id=900, balances={"1": 8, "2": 5},
+        taken_at=datetime(2024, 5, 31, 18, 0)
+    )
+    checkpoint_result = MagicMock()
+    checkpoint_result.scalar_one_or_none.return_value = checkpoint
+    session = AsyncMock()
+    # (product_id, suma de deltas, movimientos) posteriores al checkpoint
+    session.execute.side_effect = [checkpoint_result, [(1, 4, 2), (2, -5, 1), (7, 3, 1)]]
+    
+    found, balances, replayed = await InventoryRepository(session).get_stock_as_of(1, datetime(2024, 6, 2))
+    
+    assert found is checkpoint
+    assert balances == {1: 12, 7: 3}
+    assert replayed == 4
+    replay_sql = str(session.execute.await_args_list[1].args[0].compile(compile_kwargs={"literal_binds": True}))
+    assert "stock_movements.id > 900" in replay_sql
+
+
+@pytest.mark.asyncio
+async def test_get_warehouse_stock_as_of_use_case():
+    inventory_repo = AsyncMock()
+    inventory_repo.get_stock_as_of.return_value = (None, {1: 12, 2: 3}, 6)
+    product_repo = AsyncMock()
+    product_repo.get_many.return_value = {
+        1: ProductModel(id=1, name="Producto 1"), 2: ProductModel(id=2, name="Producto 2")
+    }
+    warehouse_repo = AsyncMock()
+    warehouse_repo.get_by_id.return_value = WarehouseModel(id=1, name="Bodega 1")
+    
+    use_case = GetWarehouseStockAsOfUseCase(inventory_repo, product_repo, warehouse_repo)
+    result = await use_case.execute(1, datetime(2024, 6, 2))
+    
+    assert result.checkpoint_at is None
+    assert result.replayed_movements == 6
+    assert result.total_units == 15
+    assert [(i.product_name, i.quantity) for i in result.items] == [("Producto 1", 12), ("Producto 2", 3)]
+    
+    warehouse_repo.get_by_id.return_value = None
+    with pytest.raises(ValueError):
+        await use_case.execute(99, datetime(2024, 6, 2))
+
+
+@pytest.mark.asyncio
+async def test_close_count_locks_warehouse_writes_before_checkpoint():
+    session = AsyncMock()
+    session.add = MagicMock()
+    session.info = {}
+    result = MagicMock()
+    result.one.return_value = (2, 24)
+    result.rowcount = 1
+    result.scalar_one.return_value = 0
+    result.__iter__.return_value = iter([])
+    session.execute.return_value = result
+    count = MagicMock(id=7, warehouse_id=3, version=1)
+    
+    await InventoryRepository(session).close_and_reconcile_count(count, datetime(2024, 2, 1))
+    
+    statements = [
+        str(call.args[0].compile(dialect=postgresql.dialect()))
+        for call in session.execute.await_args_list
+    ]
+    lock = next(i for i, sql in enumerate(statements) if "pg_advisory_xact_lock(" in sql)
+    checkpoint = next(i for i, sql in enumerate(statements) if "max(stock_movements.id)" in sql)
+    # El lock exclusivo se toma antes de bloquear filas y de leer el último movimiento
+    assert "FOR UPDATE" in statements[lock + 1]
+    assert lock < checkpoint
@@ -0,0 +1,95 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from sqlalchemy import create_engine, select, text
+from app.infrastructure.persistence.database import Base
+from app.infrastructure.persistence.models import (
+    InventoryItemModel, InventoryCountModel, InventoryCountStatus
+)
+from app.infrastructure.persistence.migrations import apply_migrations, MIGRATIONS
+
+INDEXES = [
+    "ix_inventory_items_count_id",
+    "ix_inventory_counts_warehouse_status",
+]
+
+HOT_QUERIES = {
+    "selectinload_items": (
+        select(InventoryItemModel).where(InventoryItemModel.count_id.in_([1, 2, 3])),
+        "ix_inventory_items_count_id"
+    ),
+    "get_counts": (
+        select(InventoryCountModel).where(
+            (InventoryCountModel.warehouse_id == 1) &
+            (InventoryCountModel.status == InventoryCountStatus.IN_PROGRESS)
+        ),
+        "ix_inventory_counts_warehouse_status"
+    ),
+}
+
+
+@pytest.fixture
+def legacy_engine():
+    """Base de datos creada antes de que existieran los índices"""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for name in INDEXES:
+            conn.execute(text(f"DROP INDEX {name}"))
+    yield engine
+    engine.dispose()
+
+
+def query_plan(conn, query) -> str:
+    sql = str(query.compile(conn, compile_kwargs={"literal_binds": True}))
+    rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+    return " | ".join(row[-1] for row in rows)
+
+
+def test_migrations_add_indexes_used_by_hot_queries(legacy_engine):
+    with legacy_engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        for query, index_name in HOT_QUERIES.values():
+            assert index_name not in query_plan(conn, query)
+        
+        applied = apply_migrations(conn)
+        
+        assert applied == [m.version for m in MIGRATIONS]
+        for name, (query, index_name) in HOT_QUERIES.items():
+            assert index_name in query_plan(conn, query), name
+        # _0001 lo crea y _0007 lo elimina: ninguna consulta lo usa
+        indexes = conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'")).scalars().all()
+        assert "ix_inventory_items_warehouse_product_count" not in indexes
+
+
+def test_migrations_are_recorded_once(legacy_engine):
+    with legacy_engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        apply_migrations(conn)
+        
+        assert apply_migrations(conn) == []
+        versions = conn.execute(text("SELECT version FROM schema_migrations")).scalars().all()
+        assert sorted(versions) == [m.version for m in MIGRATIONS]
+
+
+def test_postgres_runner_reads_versions_under_advisory_lock():
+    conn = MagicMock()
+    conn.dialect.name = "postgresql"
+    versions = MagicMock()
+    versions.__iter__.return_value = iter([(m.version,) for m in MIGRATIONS])
+    # Otro worker tiene el lock en el primer intento
+    attempts = iter([False, True])
+
+    def execute(statement, params=None):
+        if "pg_try_advisory_lock" in str(statement):
+            return MagicMock(scalar=MagicMock(return_value=next(attempts)))
+        return versions if "SELECT version" in str(statement) else MagicMock()
+
+    conn.execute.side_effect = execute
+
+    with patch("app.infrastructure.persistence.migrations.time.sleep") as sleep:
+        assert apply_migrations(conn) == []
+    sleep.assert_called_once()
+    statements = [str(call.args[0]) for call in conn.execute.call_args_list]
+    assert "pg_try_advisory_lock" in statements[0] and "pg_try_advisory_lock" in statements[1]
+    assert statements.index("SELECT version FROM schema_migrations") > 1
+    assert "pg_advisory_unlock" in statements[-1]
@@ -0,0 +1,63 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from app.domain.entities.entities import Warehouse
+from app.infrastructure.persistence.models import ProductModel, WarehouseModel, utcnow
+from app.infrastructure.persistence.repositories import WarehouseRepository
+
+
+def test_utcnow_compiles_per_dialect():
+    query = select(utcnow())
+
+    assert "TIMEZONE('utc', CURRENT_TIMESTAMP)" in str(query.compile(dialect=postgresql.dialect()))
+    assert "CURRENT_TIMESTAMP" in str(query.compile(dialect=sqlite.dialect()))
+
+
+def test_timestamps_are_server_generated_and_returned():
+    insert_sql = str(
+        ProductModel.__table__.insert().values(name="P", price=1.0)
+        .returning(ProductModel.created_at)
+        .compile(dialect=postgresql.dialect())
+    )
+
+    assert ProductModel.__mapper__.eager_defaults is True
+    assert ProductModel.__table__.c.updated_at.server_default is not None
+    assert "RETURNING products.created_at" in insert_sql
+
+
+@pytest.mark.asyncio
+async def test_warehouse_update_single_statement_without_refresh():
+    model = WarehouseModel(id=3, name="Central", location="Norte", capacity=10)
+    result = MagicMock()
+    result.scalar_one_or_none.return_value = model
+    session = AsyncMock()
+    session.execute.return_value = result
+    session.add = MagicMock()
+    session.info = {}
+
+    updated = await WarehouseRepository(session).update(3, Warehouse(name="Central", location="Norte", capacity=10))
+
+    assert updated.id == 3
+    # Un solo UPDATE ... RETURNING; el aviso entre procesos sale con el commit
+    session.execute.assert_awaited_once()
+    update_statement = session.execute.await_args.args[0]
+    assert "RETURNING" in str(update_statement.compile(dialect=postgresql.dialect()))
+    assert session.info["cache_invalidation_events"] == [("warehouse", 3)]
+    session.refresh.assert_not_called()
+    session.commit.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_warehouse_delete_invalidates_only_assigned_users():
+    found = MagicMock()
+    found.scalar_one_or_none.return_value = WarehouseModel(id=3, name="Central", location="Norte", capacity=10)
+    assigned = MagicMock()
+    assigned.scalars.return_value = iter([4, 9])
+    session = AsyncMock()
+    session.execute.side_effect = [found, assigned]
+    session.info = {}
+
+    assert await WarehouseRepository(session).delete(3)
+
+    assert session.info["cache_invalidation_events"] == [("user", 4), ("user", 9), ("warehouse", 3)]
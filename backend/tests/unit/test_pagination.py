@@ -0,0 +1,47 @@
+import pytest
+from fastapi import HTTPException, Response
+from sqlalchemy import create_engine, select, text
+from app.domain.entities.entities import Product
+from app.infrastructure.persistence.database import Base
+from app.infrastructure.persistence.models import ProductModel
+from app.infrastructure.persistence.repositories import paginate
+from app.presentation.api.pagination import (
+    encode_cursor, decode_cursor, set_next_cursor, NEXT_CURSOR_HEADER
+)
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(10_000)) == 10_000
+    assert decode_cursor(None) is None
+
+
+@pytest.mark.parametrize("cursor", ["basura", encode_cursor(1)[:-2] + "!!", "eyJpZCI6ICJ4In0"])
+def test_invalid_cursor(cursor):
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor(cursor)
+    assert exc.value.status_code == 400
+
+
+def test_set_next_cursor_only_on_full_page():
+    items = [Product(id=i) for i in (3, 7, 9)]
+
+    response = Response()
+    set_next_cursor(response, items, limit=3)
+    assert decode_cursor(response.headers[NEXT_CURSOR_HEADER]) == 9
+
+    response = Response()
+    set_next_cursor(response, items, limit=10)
+    assert NEXT_CURSOR_HEADER not in response.headers
+
+
+def test_keyset_page_seeks_primary_key():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with engine.connect() as conn:
+        keyset = paginate(select(ProductModel), ProductModel, limit=50, after_id=500_000)
+        sql = str(keyset.compile(conn, compile_kwargs={"literal_binds": True}))
+        plan = " ".join(row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+
+        assert "products.id > 500000" in sql
+        assert "SEARCH" in plan and "PRIMARY KEY" in plan
+    engine.dispose()
@@ -0,0 +1,42 @@
+import asyncio
+import pytest
+from app.infrastructure.security import password
+from app.infrastructure.security.password import (
+    hash_password, hash_password_async, needs_rehash, verify_password_async
+)
+
+
+def test_needs_rehash_compares_work_factor():
+    hashed = hash_password("secreto", rounds=4)
+
+    assert needs_rehash(hashed, rounds=4) is False
+    assert needs_rehash(hashed, rounds=5) is True
+    assert needs_rehash("no-es-bcrypt") is True
+
+
+@pytest.mark.asyncio
+async def test_async_hash_and_verify_roundtrip():
+    hashed = await hash_password_async("secreto", rounds=4)
+
+    assert hashed.startswith("$2b$04$")
+    assert await verify_password_async("secreto", hashed) is True
+    assert await verify_password_async("otro", hashed) is False
+
+
+@pytest.mark.asyncio
+async def test_async_hash_does_not_block_event_loop():
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.001)
+
+    task = asyncio.create_task(ticker())
+    await asyncio.gather(*(hash_password_async("secreto", rounds=10) for _ in range(4)))
+    task.cancel()
+
+    # Si bcrypt corriera en el event loop el ticker no avanzaría durante los hashes
+    assert ticks > 5
+    password.shutdown_password_executor()
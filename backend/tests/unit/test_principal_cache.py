@@ -0,0 +1,109 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from app.infrastructure.persistence.models import UserRole
+from app.infrastructure.persistence.unit_of_work import UnitOfWork
+from app.infrastructure.security import dependencies
+from app.infrastructure.security.principal_cache import Principal, PrincipalCache
+
+
+def make_principal(user_id=1, warehouses=(1, 2)):
+    return Principal(id=user_id, username="user", role=UserRole.USER, warehouse_ids=frozenset(warehouses))
+
+
+def test_principal_cache_hit_miss_and_invalidate():
+    cache = PrincipalCache(ttl=60)
+    principal = make_principal()
+
+    assert cache.get(1) is None
+    cache.set(principal)
+    assert cache.get(1) is principal
+
+    cache.invalidate(1)
+    assert cache.get(1) is None
+
+    snapshot = cache.snapshot()
+    assert snapshot["hits"] == 1
+    assert snapshot["misses"] == 2
+
+
+def test_principal_cache_drops_principal_read_before_invalidation():
+    cache = PrincipalCache(ttl=60)
+    generation = cache.generation(1)
+    other_user = cache.generation(2)
+
+    cache.invalidate(1)
+    cache.set(make_principal(1), generation)
+    cache.set(make_principal(2), other_user)
+    assert cache.get(1) is None
+    assert cache.get(2) is not None
+
+    generation = cache.generation(2)
+    cache.clear()
+    cache.set(make_principal(2), generation)
+    assert cache.get(2) is None
+
+
+def test_principal_cache_expires_entries():
+    cache = PrincipalCache(ttl=10)
+    with patch("app.infrastructure.security.principal_cache.time.monotonic", return_value=100.0):
+        cache.set(make_principal())
+    with patch("app.infrastructure.security.principal_cache.time.monotonic", return_value=111.0):
+        assert cache.get(1) is None
+    assert cache.snapshot()["entries"] == 0
+
+
+def test_principal_cache_evicts_oldest_and_can_be_disabled():
+    cache = PrincipalCache(ttl=60, max_size=2)
+    for user_id in (1, 2, 3):
+        cache.set(make_principal(user_id))
+
+    assert cache.get(1) is None
+    assert cache.get(3) is not None
+
+    disabled = PrincipalCache(ttl=0)
+    disabled.set(make_principal())
+    assert disabled.get(1) is None
+
+
+@pytest.mark.asyncio
+async def test_get_current_user_uses_cache_without_database():
+    cache = PrincipalCache(ttl=60)
+    user = SimpleNamespace(
+        id=7, username="ana", role=UserRole.USER,
+        assigned_warehouses=[SimpleNamespace(id=3), SimpleNamespace(id=5)]
+    )
+    result = MagicMock()
+    result.scalar_one_or_none.return_value = user
+    session = AsyncMock()
+    session.execute.return_value = result
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials="token")
+
+    with patch.object(dependencies, "principal_cache", cache), \
+            patch.object(dependencies, "decode_access_token", return_value={"sub": "7"}):
+        first = await dependencies.get_current_user(credentials, UnitOfWork(session))
+        second = await dependencies.get_current_user(credentials, UnitOfWork(session))
+
+    assert first == second
+    assert first.warehouse_ids == frozenset({3, 5})
+    assert session.execute.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_get_current_user_unknown_user_is_not_cached():
+    cache = PrincipalCache(ttl=60)
+    result = MagicMock()
+    result.scalar_one_or_none.return_value = None
+    session = AsyncMock()
+    session.execute.return_value = result
+    credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials="token")
+
+    with patch.object(dependencies, "principal_cache", cache), \
+            patch.object(dependencies, "decode_access_token", return_value={"sub": "9"}):
+        with pytest.raises(HTTPException) as exc_info:
+            await dependencies.get_current_user(credentials, UnitOfWork(session))
+
+    assert exc_info.value.status_code == 401
+    assert cache.snapshot()["entries"] == 0
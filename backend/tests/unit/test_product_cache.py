@@ -0,0 +1,116 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+from app.domain.entities.entities import Product
+from app.infrastructure.persistence import unit_of_work
+from app.infrastructure.persistence.product_cache import CachedProductRepository, ProductCache
+from app.infrastructure.persistence.unit_of_work import UnitOfWork
+
+
+def make_product(product_id, name="Producto"):
+    return Product(id=product_id, name=name, units_per_package=12)
+
+
+def make_repository(products):
+    repository = AsyncMock()
+    repository.get_many.side_effect = lambda ids: {i: make_product(i) for i in ids if i in products}
+    return repository
+
+
+def test_product_cache_hit_miss_and_copies():
+    cache = ProductCache(ttl=60)
+    cache.put_many([make_product(1)])
+
+    found, missing = cache.get_many([1, 2])
+    found[1].name = "modificado"
+
+    assert missing == {2}
+    assert cache.get_many([1])[0][1].name == "Producto"
+    snapshot = cache.snapshot()
+    assert snapshot["hits"] == 2
+    assert snapshot["misses"] == 1
+
+
+def test_product_cache_evicts_least_recently_used_and_expires():
+    cache = ProductCache(ttl=10, max_size=2)
+    with patch("app.infrastructure.persistence.product_cache.time.monotonic", return_value=100.0):
+        cache.put_many([make_product(1), make_product(2)])
+        cache.get_many([1])
+        cache.put_many([make_product(3)])
+        assert cache.get_many([1, 2, 3])[1] == {2}
+    assert cache.snapshot()["evictions"] == 1
+
+    with patch("app.infrastructure.persistence.product_cache.time.monotonic", return_value=111.0):
+        assert cache.get_many([1, 3])[1] == {1, 3}
+
+
+@pytest.mark.asyncio
+async def test_cached_repository_loads_only_misses():
+    cache = ProductCache(ttl=60)
+    repository = make_repository({1, 2, 3})
+    cached = CachedProductRepository(repository, cache, lambda action: None)
+
+    await cached.get_many([1, 2])
+    products = await cached.get_many([1, 2, 3])
+
+    assert set(products) == {1, 2, 3}
+    assert repository.get_many.await_args_list[1].args[0] == {3}
+    assert await cached.get_by_id(2) == make_product(2)
+    assert repository.get_many.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_invalidation_during_load_is_not_overwritten():
+    cache = ProductCache(ttl=60)
+    repository = AsyncMock()
+
+    async def load_while_updated(ids):
+        # Otro proceso confirma un cambio del producto 1 durante la consulta
+        cache.invalidate([1])
+        return {i: make_product(i) for i in ids}
+
+    repository.get_many.side_effect = load_while_updated
+    cached = CachedProductRepository(repository, cache, lambda action: None)
+
+    await cached.get_many([1, 2])
+
+    assert cache.get_many([1, 2])[1] == {1}
+
+
+@pytest.mark.asyncio
+async def test_update_bypasses_cache_until_commit():
+    cache = ProductCache(ttl=60)
+    repository = make_repository({1})
+    session = AsyncMock()
+    session.info = {}
+    with patch.object(unit_of_work, "product_cache", cache), \
+            patch.object(unit_of_work, "ProductRepository", return_value=repository):
+        uow = UnitOfWork(session)
+        await uow.products.get_by_id(1)
+
+        await uow.products.update(1, make_product(1, "Nuevo"))
+        assert cache.snapshot()["entries"] == 0
+        # Dentro de la transacción se lee de la base y no se repuebla la caché
+        await uow.products.get_by_id(1)
+        assert cache.snapshot()["entries"] == 0
+
+        cache.put_many([make_product(1, "Viejo")])
+        await uow.commit()
+
+    session.commit.assert_awaited_once()
+    assert cache.snapshot()["entries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_rollback_discards_pending_invalidations():
+    cache = ProductCache(ttl=60)
+    session = AsyncMock()
+    session.info = {}
+    with patch.object(unit_of_work, "product_cache", cache), \
+            patch.object(unit_of_work, "ProductRepository", return_value=make_repository({1})):
+        uow = UnitOfWork(session)
+        await uow.products.delete(1)
+        await uow.rollback()
+        cache.put_many([make_product(1)])
+        await uow.commit()
+
+    assert cache.snapshot()["entries"] == 1
@@ -1,10 +1,14 @@
 import pytest
-from unittest.mock import AsyncMock
+from unittest.mock import AsyncMock, MagicMock
+from sqlalchemy.dialects import postgresql
 from app.domain.entities.entities import Product
 from app.application.use_cases.product_use_cases import (
-    CreateProductUseCase, GetProductByIdUseCase, GetAllProductsUseCase
+    CreateProductUseCase, GetProductByIdUseCase, GetAllProductsUseCase, BulkUpsertProductsUseCase,
+    UpdateProductUseCase
 )
-from app.application.dtos.dtos import ProductCreateDTO
+from app.infrastructure.persistence.models import ProductModel
+from app.infrastructure.persistence.repositories import ProductRepository
+from app.application.dtos.dtos import ProductCreateDTO, ProductUpsertDTO
 
 
 @pytest.mark.asyncio
@@ -68,3 +72,66 @@ async def test_get_all_products():
     assert len(result) == 2
     assert result[0].name == "Laptop"
     assert result[1].name == "Mouse"
+
+
+@pytest.mark.asyncio
+async def test_bulk_upsert_products_in_chunks():
+    mock_repository = AsyncMock()
+    mock_repository.upsert_many.side_effect = [(2, 0), (0, 1)]
+    
+    use_case = BulkUpsertProductsUseCase(mock_repository)
+    use_case.CHUNK_SIZE = 2
+    product_dtos = [
+        ProductUpsertDTO(sku="A-1", name="Laptop", description="", price=999.99),
+        ProductUpsertDTO(sku="B-2", name="Mouse", description="", price=29.99),
+        ProductUpsertDTO(sku="C-3", name="Teclado", description="", price=49.99),
+        ProductUpsertDTO(sku="D-4", name="Monitor", description="", price=199.99),
+        ProductUpsertDTO(sku="C-3", name="Teclado", description="Mecánico", price=59.99),
+    ]
+    
+    result = await use_case.execute(product_dtos)
+    
+    assert mock_repository.upsert_many.await_count == 2
+    last_chunk = mock_repository.upsert_many.await_args_list[1].args[0]
+    assert [p.sku for p in last_chunk] == ["C-3", "D-4"]
+    assert last_chunk[0].description == "Mecánico"
+    assert result.received == 5
+    assert result.inserted == 2
+    assert result.updated == 1
+    assert result.unchanged == 1
+
+
+@pytest.mark.asyncio
+async def test_update_product_without_sku_keeps_it():
+    model = ProductModel(id=4, name="Café", description="Molido", price=3.5, units_per_package=12, sku="ERP-4")
+    result = MagicMock()
+    result.scalar_one_or_none.return_value = model
+    session = AsyncMock()
+    session.execute.return_value = result
+    session.info = {}
+
+    dto = ProductCreateDTO.model_validate({"name": "Café", "description": "Molido", "price": 3.5})
+    updated = await UpdateProductUseCase(ProductRepository(session)).execute(4, dto)
+
+    statement = session.execute.await_args_list[0].args[0]
+    set_clause = str(statement.compile(dialect=postgresql.dialect())).split(" WHERE ")[0]
+    assert "sku" not in set_clause
+    # El resto de los campos se reemplaza como siempre, con sus valores por defecto
+    assert "units_per_package=" in set_clause
+    assert "name=" in set_clause
+    assert updated.sku == "ERP-4"
+
+
+@pytest.mark.asyncio
+async def test_update_product_with_sku_writes_it():
+    result = MagicMock()
+    result.scalar_one_or_none.return_value = ProductModel(id=4, name="Café", description="", price=1.0, units_per_package=1, sku=None)
+    session = AsyncMock()
+    session.execute.return_value = result
+    session.info = {}
+
+    dto = ProductCreateDTO.model_validate({"name": "Café", "description": "", "price": 1.0, "sku": None})
+    await UpdateProductUseCase(ProductRepository(session)).execute(4, dto)
+
+    statement = session.execute.await_args_list[0].args[0]
+    assert "sku=" in str(statement.compile(dialect=postgresql.dialect())).split(" WHERE ")[0]
@@ -0,0 +1,101 @@
+import json
+import pytest
+from contextlib import ExitStack
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.domain.entities.entities import InventoryItem, Product, Warehouse
+from app.infrastructure.persistence.cache_bus import STOCK
+from app.infrastructure.persistence.models import StockMovementReason
+from app.infrastructure.persistence.report_cache import CachedReport, ReportCache
+from app.infrastructure.persistence.repositories import InventoryRepository
+from app.presentation.api.routes import inventory
+
+
+def patch_report_sources(cache, repo):
+    """Caché aislada y repositorio simulado para los reportes de inventario"""
+    session_factory = MagicMock()
+    session_factory.return_value.__aenter__ = AsyncMock()
+    session_factory.return_value.__aexit__ = AsyncMock(return_value=False)
+    stack = ExitStack()
+    stack.enter_context(patch.object(inventory, "report_cache", cache))
+    stack.enter_context(patch.object(inventory, "AsyncSessionLocal", session_factory))
+    stack.enter_context(patch.object(inventory, "InventoryRepository", return_value=repo))
+    return stack
+
+
+def test_generation_changes_only_for_written_warehouse():
+    cache = ReportCache()
+    cache.set(("warehouse", 1), cache.generation(1), CachedReport(body=b"uno"))
+    cache.set(("warehouse", 2), cache.generation(2), CachedReport(body=b"dos"))
+    all_before = cache.generation()
+
+    cache.bump(2)
+
+    assert cache.get(("warehouse", 1), cache.generation(1)).body == b"uno"
+    assert cache.get(("warehouse", 2), cache.generation(2)) is None
+    assert cache.generation() != all_before
+    snapshot = cache.snapshot()
+    assert (snapshot["hits"], snapshot["stale"]) == (1, 1)
+
+
+def test_bump_without_warehouse_invalidates_everything():
+    cache = ReportCache()
+    cache.set(("warehouse", 1), cache.generation(1), CachedReport(body=b"uno"))
+
+    cache.bump()
+
+    assert cache.get(("warehouse", 1), cache.generation(1)) is None
+    assert cache.snapshot()["entries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_warehouse_report_is_computed_once_per_generation():
+    cache = ReportCache()
+    repo = AsyncMock()
+    repo.get_warehouse_inventory.return_value = [(
+        Warehouse(id=1, name="Central", location="Norte"),
+        [(InventoryItem(id=9, warehouse_id=1, product_id=3, quantity=5), Product(id=3, name="Café", price=2.0))]
+    )]
+
+    with patch_report_sources(cache, repo):
+        first = await inventory.warehouse_inventory_report(1)
+        second = await inventory.warehouse_inventory_report(1)
+        cache.bump(1)
+        await inventory.warehouse_inventory_report(1)
+
+    assert first is second
+    assert json.loads(first.body)["total_products_count"] == 5
+    assert json.loads(first.body)["items"][0]["version"] == 1
+    assert repo.get_warehouse_inventory.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_write_during_render_leaves_entry_stale():
+    cache = ReportCache()
+    repo = AsyncMock()
+
+    async def render_during_write(after_id=None, limit=None):
+        cache.bump(1)
+        return [(Warehouse(id=1, name="Central", location="Norte"), [])]
+
+    repo.get_warehouse_inventory.side_effect = render_during_write
+
+    with patch_report_sources(cache, repo):
+        report = await inventory.all_warehouses_inventory_report(limit=1)
+        await inventory.all_warehouses_inventory_report(limit=1)
+
+    assert repo.get_warehouse_inventory.await_count == 2
+    assert inventory.NEXT_CURSOR_HEADER in report.headers
+
+
+@pytest.mark.asyncio
+async def test_stock_movements_publish_warehouse_generation():
+    session = AsyncMock()
+    session.info = {}
+    item = InventoryItem(id=1, warehouse_id=4, product_id=2, quantity=0)
+
+    await InventoryRepository(session)._record_movements([
+        InventoryRepository._stock_movement(item, 0, StockMovementReason.ADJUSTMENT)
+    ])
+
+    # Sin diferencia no hay movimiento, pero la fila cambió de versión
+    assert session.info["cache_invalidation_events"] == [(STOCK, 4)]
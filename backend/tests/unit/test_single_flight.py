@@ -0,0 +1,87 @@
+import asyncio
+import pytest
+from app.presentation.api.single_flight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_requests_share_one_execution():
+    flight = SingleFlight(enabled=True)
+    release = asyncio.Event()
+    calls = []
+
+    async def query():
+        calls.append(1)
+        await release.wait()
+        return ["resultado"]
+
+    waiters = [asyncio.create_task(flight.do("counts", ("a", 1), query)) for _ in range(5)]
+    other = asyncio.create_task(flight.do("counts", ("b", 1), query))
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*waiters, other)
+
+    assert len(calls) == 2
+    assert all(result == ["resultado"] for result in results)
+    assert flight.snapshot()["endpoints"]["counts"] == {
+        "executions": 2, "coalesced": 4, "cancelled": 0, "abandoned": 0
+    }
+    assert flight.snapshot()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_errors_are_shared_and_key_is_released():
+    flight = SingleFlight(enabled=True)
+
+    async def failing():
+        await asyncio.sleep(0)
+        raise ValueError("bodega no encontrada")
+
+    results = await asyncio.gather(
+        flight.do("report", 1, failing), flight.do("report", 1, failing), return_exceptions=True
+    )
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flight.snapshot()["endpoints"]["report"]["executions"] == 1
+
+    async def ok():
+        return 42
+
+    assert await flight.do("report", 1, ok) == 42
+
+
+@pytest.mark.asyncio
+async def test_cancelled_request_does_not_cancel_shared_query_until_last_waiter():
+    flight = SingleFlight(enabled=True)
+    release = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def query():
+        try:
+            await release.wait()
+            return "ok"
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    first = asyncio.create_task(flight.do("counts", 1, query))
+    second = asyncio.create_task(flight.do("counts", 1, query))
+    await asyncio.sleep(0)
+
+    first.cancel()
+    await asyncio.sleep(0)
+    assert not cancelled.is_set()
+    release.set()
+    assert await second == "ok"
+
+    release.clear()
+    third = asyncio.create_task(flight.do("counts", 2, query))
+    await asyncio.sleep(0)
+    third.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await third
+    await asyncio.sleep(0)
+
+    assert cancelled.is_set()
+    counters = flight.snapshot()["endpoints"]["counts"]
+    assert (counters["cancelled"], counters["abandoned"]) == (2, 1)
+    assert flight.snapshot()["in_flight"] == 0
@@ -0,0 +1,28 @@
+import pytest
+from unittest.mock import AsyncMock
+from app.infrastructure.persistence.unit_of_work import UnitOfWork
+
+
+@pytest.mark.asyncio
+async def test_unit_of_work_shares_session_and_commits_once():
+    session = AsyncMock()
+    session.info = {}
+
+    async with UnitOfWork(session) as uow:
+        assert uow.users.session is session
+        assert uow.inventory.session is session
+
+    session.commit.assert_awaited_once()
+    session.rollback.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_unit_of_work_rolls_back_on_error():
+    session = AsyncMock()
+
+    with pytest.raises(ValueError):
+        async with UnitOfWork(session):
+            raise ValueError("Producto no encontrado")
+
+    session.commit.assert_not_called()
+    session.rollback.assert_awaited_once()
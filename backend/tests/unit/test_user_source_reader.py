@@ -0,0 +1,46 @@
+import io
+import pytest
+from app.infrastructure.files import iter_user_rows, UserSourceFormatError
+
+
+def test_csv_rows_keep_known_columns():
+    content = (
+        "﻿Username,email,first_name,last_name,area,password\n"
+        "ana,ana@example.com,Ana,Pérez,Bodega,\n"
+        "\n"
+        "luis,luis@example.com,Luis,Soto,Ventas,secreto1\n"
+    ).encode("utf-8")
+
+    rows = list(iter_user_rows(io.BytesIO(content), "personal.CSV"))
+
+    assert rows == [
+        (2, {"username": "ana", "email": "ana@example.com", "first_name": "Ana",
+             "last_name": "Pérez", "password": None}),
+        (4, {"username": "luis", "email": "luis@example.com", "first_name": "Luis",
+             "last_name": "Soto", "password": "secreto1"}),
+    ]
+
+
+def test_csv_missing_columns():
+    with pytest.raises(UserSourceFormatError):
+        list(iter_user_rows(io.BytesIO(b"username,email\nana,ana@example.com\n"), "personal.csv"))
+
+
+def test_jsonl_and_json_rows():
+    jsonl = b'{"username": "ana", "email": "ana@example.com", "phone": 123}\n\n{"username": "luis"}\n'
+    assert list(iter_user_rows(io.BytesIO(jsonl), "personal.jsonl")) == [
+        (1, {"username": "ana", "email": "ana@example.com", "phone": "123"}),
+        (3, {"username": "luis"}),
+    ]
+
+    array = b'[{"username": "ana", "extra": true}]'
+    assert list(iter_user_rows(io.BytesIO(array), "personal.json")) == [(1, {"username": "ana"})]
+
+
+def test_invalid_json_and_extension():
+    with pytest.raises(UserSourceFormatError):
+        list(iter_user_rows(io.BytesIO(b'{"username": "ana"}'), "personal.json"))
+    with pytest.raises(UserSourceFormatError):
+        list(iter_user_rows(io.BytesIO(b"{oops}\n"), "personal.jsonl"))
+    with pytest.raises(UserSourceFormatError):
+        list(iter_user_rows(io.BytesIO(b""), "personal.txt"))
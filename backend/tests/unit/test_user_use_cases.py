@@ -1,10 +1,15 @@
+import asyncio
+import threading
 import pytest
-from unittest.mock import AsyncMock, MagicMock
+from unittest.mock import AsyncMock, MagicMock, patch
+from sqlalchemy.dialects import postgresql
 from app.domain.entities.entities import User
 from app.application.use_cases.user_use_cases import (
-    CreateUserUseCase, GetUserByIdUseCase, GetAllUsersUseCase
+    CreateUserUseCase, GetUserByIdUseCase, GetAllUsersUseCase, LoadUsersUseCase
 )
 from app.application.dtos.dtos import UserCreateDTO
+from app.infrastructure.persistence.models import UserRole
+from app.infrastructure.persistence.repositories import MAX_BIND_PARAMS, UserRepository
 
 
 @pytest.mark.asyncio
@@ -85,3 +90,115 @@ async def test_get_all_users():
     assert len(result) == 2
     assert result[0].first_name == "John"
     assert result[1].first_name == "Jane"
+
+
+def staff_row(username, **extra):
+    return {
+        "username": username, "email": f"{username}@example.com",
+        "first_name": username.title(), "last_name": "Staff", **extra
+    }
+
+
+@pytest.mark.asyncio
+async def test_load_users_chunks_and_reports_outcomes():
+    mock_repository = AsyncMock()
+    # "bea" ya existe en la base: ON CONFLICT DO NOTHING no la devuelve
+    mock_repository.create_many_skip_existing.side_effect = lambda users: [
+        u["username"] for u in users if u["username"] != "bea"
+    ]
+    rows = [
+        (2, staff_row("ana")),
+        (3, staff_row("bea")),
+        (4, staff_row("ana")),
+        (5, staff_row("carla", email="no-es-email")),
+        (6, staff_row("dani", password="secreto1")),
+    ]
+    reported = []
+    
+    async def hash_password(password):
+        # Cede el turno como el pool real: las filas del gather se intercalan
+        await asyncio.sleep(0)
+        return f"hash:{password}"
+    
+    hash_mock = AsyncMock(side_effect=hash_password)
+    
+    use_case = LoadUsersUseCase(mock_repository, on_row=reported.append)
+    use_case.CHUNK_SIZE = 3
+    with patch("app.application.use_cases.user_use_cases.hash_password_async", hash_mock):
+        result = await use_case.execute(rows)
+    
+    assert result.total_rows == 5
+    assert result.total_loaded == 2
+    assert result.skipped == 2
+    assert result.rejected == 1
+    assert {r.row: r.status for r in reported} == {
+        2: "created", 3: "skipped", 4: "skipped", 5: "rejected", 6: "created"
+    }
+    assert sorted(r.row for r in result.results) == [3, 4, 5]
+    assert mock_repository.create_many_skip_existing.await_count == 2
+    # La contraseña por defecto se hashea una sola vez para toda la carga
+    assert sorted(call.args[0] for call in hash_mock.await_args_list) == ["password123", "secreto1"]
+    inserted = mock_repository.create_many_skip_existing.await_args_list[1].args[0]
+    assert inserted[0]["hashed_password"] == "hash:secreto1"
+    assert inserted[0]["phone"] == ""
+
+
+@pytest.mark.asyncio
+async def test_load_users_accepts_async_source():
+    mock_repository = AsyncMock()
+    mock_repository.create_many_skip_existing.return_value = ["ana"]
+    
+    async def source():
+        yield 1, staff_row("ana")
+    
+    use_case = LoadUsersUseCase(mock_repository)
+    with patch("app.application.use_cases.user_use_cases.hash_password_async", AsyncMock(return_value="h")):
+        result = await use_case.execute(source())
+    
+    assert result.total_loaded == 1
+    assert result.results == []
+
+
+@pytest.mark.asyncio
+async def test_load_users_reads_file_rows_off_the_event_loop():
+    mock_repository = AsyncMock()
+    mock_repository.create_many_skip_existing.side_effect = lambda users: [u["username"] for u in users]
+    reader_threads = set()
+    
+    def read_file():
+        for row_number, username in enumerate(("ana", "bea", "carla"), start=2):
+            reader_threads.add(threading.get_ident())
+            yield row_number, staff_row(username)
+    
+    use_case = LoadUsersUseCase(mock_repository)
+    use_case.CHUNK_SIZE = 2
+    with patch("app.application.use_cases.user_use_cases.hash_password_async", AsyncMock(return_value="h")):
+        result = await use_case.execute(read_file())
+    
+    assert result.total_loaded == 3
+    assert mock_repository.create_many_skip_existing.await_count == 2
+    assert threading.get_ident() not in reader_threads
+
+
+@pytest.mark.asyncio
+async def test_create_many_splits_statements_under_bind_limit():
+    session = AsyncMock()
+    result = MagicMock()
+    result.scalars.return_value.all.return_value = ["u"]
+    session.execute.return_value = result
+    # Las 11 columnas que arma LoadUsersUseCase, más las dos fechas
+    users = [
+        {
+            **staff_row(f"u{n}"), "phone": "", "gender": "", "nationality": "", "nat": "",
+            "picture_url": None, "hashed_password": "h", "role": UserRole.USER
+        }
+        for n in range(3000)
+    ]
+    
+    inserted = await UserRepository(session).create_many_skip_existing(users)
+    
+    assert session.execute.await_count == 2
+    assert inserted == ["u", "u"]
+    for call in session.execute.await_args_list:
+        params = call.args[0].compile(dialect=postgresql.dialect()).params
+        assert len(params) <= MAX_BIND_PARAMS